@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+Benchmarks for Gladius on synthetic engagement data.
+
+For every scenario (a Responder NTLMv1/v2 log, smart_hashdump output, and
+secretsdump output from a host or a domain controller) and every account
+count, measures:
+
+    parse     Throughput and peak memory of the handler reading, parsing
+              and registering the whole file
+    dispatch  Time from the file being written to its hashes reaching the
+              crack scheduler, through watchdog and the debouncer
+    crack     Time from a hash being seen to it being reported cracked,
+              with bench/fake_cracker.py standing in for hashcat
+
+Each measurement runs in a fresh process, so state and memory of one
+does not leak into the next.
+
+    python bench/bench_gladius.py --accounts 10 1000 100000
+    python bench/bench_gladius.py --scenarios secretsdump --accounts 500000 --skip crack
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(bench_dir))
+sys.path.insert(0, bench_dir)
+
+import gladius
+import synth
+
+from watchdog.observers import Observer
+
+
+class Event(object):
+    def __init__(self, src_path):
+        self.src_path = src_path
+
+
+class RecordingScheduler(gladius.CrackScheduler):
+    """Crack scheduler that notes when hashes arrive instead of cracking them"""
+
+    def __init__(self):
+        super(RecordingScheduler, self).__init__()
+        self.submitted = []
+        self.arrived = threading.Event()
+
+    def submit(self, mode, hashes, outpath):
+        self.submitted.append((time.time(), str(mode), len(hashes)))
+        self.arrived.set()
+
+
+def quiet():
+    """Keep Gladius from printing every hash and credential"""
+    silent = lambda string: None
+    for name in ('output', 'success', 'warning', 'error', 'info', 'debug', 'verbose'):
+        setattr(gladius, name, silent)
+    gladius.art = False
+
+
+def max_rss():
+    """Peak resident memory of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def isolated(function, *args):
+    """Run function(*args) in a child process inside a scratch directory"""
+    results = multiprocessing.Queue()
+
+    def child():
+        workdir = tempfile.mkdtemp(prefix='gladius-bench-')
+        os.chdir(workdir)
+        quiet()
+        try:
+            results.put(function(workdir, *args))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    proc = multiprocessing.Process(target=child)
+    proc.start()
+    result = results.get()
+    proc.join()
+    return result
+
+
+def handler_for(name):
+    return getattr(gladius, name)()
+
+
+################################################################################
+# Measurements
+################################################################################
+
+def bench_parse(workdir, scenario, accounts, ratio):
+    handler_name, path, answers = synth.generate(scenario, workdir, accounts, ratio)
+    size = os.path.getsize(path)
+    gladius.scheduler = RecordingScheduler()
+    handler = handler_for(handler_name)
+
+    rss = max_rss()
+    start = time.time()
+    handler.handle_event(Event(path), final=True)
+    elapsed = max(time.time() - start, 1e-6)
+
+    with open(path, 'r') as f:
+        lines = sum(1 for line in f)
+
+    return {
+        'lines': lines,
+        'bytes': size,
+        'seconds': elapsed,
+        'hashes': sum(count for when, mode, count in gladius.scheduler.submitted),
+        'memory': max_rss() - rss,
+    }
+
+
+def bench_dispatch(workdir, scenario, accounts, ratio, rounds, quiet_period):
+    gladius.scheduler = RecordingScheduler()
+    gladius.debouncer = gladius.Debouncer(quiet=quiet_period, max_latency=10)
+
+    watched = os.path.join(workdir, 'watch')
+    os.makedirs(watched)
+    observer = Observer()
+    dispatcher = gladius.Dispatcher([handler_for(name) for name in ('ResponderHandler', 'SecretsdumpHandler')])
+    observer.schedule(dispatcher, path=watched, recursive=False)
+    observer.start()
+    debouncer = threading.Thread(target=gladius.debouncer.run, args=(0.01,))
+    debouncer.daemon = True
+    debouncer.start()
+
+    latencies = []
+    try:
+        for round in range(rounds):
+            # A new file per round, written in place like Responder does
+            gladius.scheduler.arrived.clear()
+            synth.generate(scenario, watched, accounts, ratio, prefix='{}-'.format(round), seed=round)
+            written = time.time()
+            if not gladius.scheduler.arrived.wait(quiet_period + 10):
+                # Nothing to crack was found, later rounds would not do better
+                break
+            latencies.append(gladius.scheduler.submitted[-1][0] - written)
+    finally:
+        observer.stop()
+        observer.join()
+
+    return {'latencies': latencies, 'rounds': rounds}
+
+
+def bench_crack(workdir, scenario, accounts, ratio, delay, window):
+    handler_name, path, answers = synth.generate(scenario, workdir, accounts, ratio)
+    answers_path = os.path.join(workdir, 'answers.txt')
+    synth.write_answers(answers_path, answers)
+
+    # The fake cracker goes in the scratch directory, where the EULA can be accepted.
+    # Run it with this interpreter, whatever python is on the PATH
+    hashcat = os.path.join(workdir, 'hashcat')
+    with open(hashcat, 'w') as f:
+        f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, os.path.join(bench_dir, 'fake_cracker.py')))
+    os.chmod(hashcat, 0755)
+    for name in ('rules', 'wordlist'):
+        open(os.path.join(workdir, name), 'w').close()
+    os.environ['FAKE_CRACKER_ANSWERS'] = answers_path
+    os.environ['FAKE_CRACKER_DELAY'] = str(delay)
+
+    gladius.scheduler = gladius.CrackScheduler(hashcat, os.path.join(workdir, 'rules'),
+                                               os.path.join(workdir, 'wordlist'),
+                                               window=window, status_timer=1)
+
+    # Time every credential as the scheduler hands it over
+    latencies = []
+    deliver_result = gladius.deliver_result
+
+    def timed_deliver_result(hash, password):
+        entry = gladius.captures.get(hash.lower())
+        if entry is not None:
+            seen = entry['time']
+        elif hash in gladius.ntlm_hashes and 'time' in gladius.ntlm_hashes[hash]:
+            seen = time.mktime(gladius.ntlm_hashes[hash]['time'].timetuple())
+            seen += gladius.ntlm_hashes[hash]['time'].microsecond / 1e6
+        else:
+            seen = None
+
+        cred = deliver_result(hash, password)
+        if cred and seen is not None:
+            latencies.append(time.time() - seen)
+        return cred
+
+    gladius.deliver_result = timed_deliver_result
+
+    # A cracker that fails to run cracks nothing, which is not a result
+    failures = []
+    finish_job = gladius.scheduler.finish_job
+
+    def checked_finish_job(job):
+        returncode = gladius.scheduler.backend(job).returncode(job)
+        if returncode not in (0, 1):
+            failures.append(returncode)
+        finish_job(job)
+
+    gladius.scheduler.finish_job = checked_finish_job
+
+    handler_for(handler_name).handle_event(Event(path), final=True)
+
+    # Answers can only crack if the parser found their hash
+    expected = len([hash for hash in answers if hash.lower() in gladius.captures or
+                    'users' in gladius.ntlm_hashes.get(hash, {})])
+    deadline = time.time() + window + 60 + delay * accounts
+    while time.time() < deadline:
+        gladius.scheduler.tick()
+        scheduler = gladius.scheduler
+        if not (scheduler.batches or scheduler.queue or scheduler.running):
+            break
+        time.sleep(0.05)
+
+    return {'latencies': latencies, 'expected': expected, 'failures': failures}
+
+
+################################################################################
+# Reporting
+################################################################################
+
+def report(line, output):
+    print line
+    if output:
+        output.write(line + '\n')
+
+
+def format_latencies(latencies):
+    if not latencies:
+        return 'no samples'
+    return 'p50 {:.3f}s  p95 {:.3f}s  max {:.3f}s'.format(
+        percentile(latencies, 50), percentile(latencies, 95), max(latencies))
+
+
+if __name__ == '__main__':
+    names = [scenario[0] for scenario in synth.scenarios]
+
+    parser = argparse.ArgumentParser(description="Benchmark Gladius on synthetic engagement data")
+    parser.add_argument('--accounts', type=int, nargs='+', default=[10, 1000, 100000], help="Account counts to generate for each scenario")
+    parser.add_argument('--scenarios', nargs='+', default=names, choices=names, metavar='SCENARIO', help="Scenarios to run: {}".format(', '.join(names)))
+    parser.add_argument('--skip', nargs='+', default=[], choices=['parse', 'dispatch', 'crack'], help="Measurements to leave out")
+    parser.add_argument('--crack-ratio', type=float, default=0.1, help="Share of accounts whose password the fake cracker finds")
+    parser.add_argument('--crack-delay', type=float, default=0.0, help="Seconds the fake cracker spends on each hash")
+    parser.add_argument('--batch-window', type=float, default=0.5, help="Crack scheduler batch window for the crack measurement")
+    parser.add_argument('--quiet-period', type=float, default=0.1, help="Debouncer quiet period for the dispatch measurement")
+    parser.add_argument('--rounds', type=int, default=5, help="Files to drop in for each dispatch measurement")
+    parser.add_argument('--output', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    output = open(args.output, 'w') if args.output else None
+    failed = False
+
+    report('{:<18} {:>8} {:<9} {}'.format('scenario', 'accounts', 'measure', 'result'), output)
+    for scenario in args.scenarios:
+        for accounts in args.accounts:
+            row = lambda measure: '{:<18} {:>8} {:<9} '.format(scenario, accounts, measure)
+
+            if 'parse' not in args.skip:
+                result = isolated(bench_parse, scenario, accounts, args.crack_ratio)
+                report(row('parse') + '{:.3f}s  {:.0f} lines/s  {:.2f} MB/s  {} hashes  +{:.1f} MB'.format(
+                       result['seconds'], result['lines'] / result['seconds'],
+                       result['bytes'] / 1048576.0 / result['seconds'], result['hashes'], result['memory']), output)
+
+            if 'dispatch' not in args.skip:
+                result = isolated(bench_dispatch, scenario, accounts, args.crack_ratio, args.rounds, args.quiet_period)
+                report(row('dispatch') + '{}  ({}/{} dispatched)'.format(
+                       format_latencies(result['latencies']), len(result['latencies']), result['rounds']), output)
+
+            if 'crack' not in args.skip:
+                result = isolated(bench_crack, scenario, accounts, args.crack_ratio, args.crack_delay, args.batch_window)
+                if result['failures']:
+                    failed = True
+                    report(row('crack') + 'error: the cracker exited with {}'.format(
+                           ', '.join(str(code) for code in sorted(set(result['failures'])))), output)
+                    continue
+                report(row('crack') + '{}  ({}/{} cracked)'.format(
+                       format_latencies(result['latencies']), len(result['latencies']), result['expected']), output)
+
+    if output:
+        output.close()
+    if failed:
+        sys.exit(1)
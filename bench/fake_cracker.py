@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Stand-in for hashcat and john, for benchmarks and tests.
+
+Takes the same arguments Gladius passes to hashcat (or john) and "cracks"
+the hashes listed in an answers file, one hash<TAB>password per line, instead
+of doing any real work. Behaviour is set through the environment:
+
+    FAKE_CRACKER_ANSWERS  Answers file, no hash cracks without one
+    FAKE_CRACKER_DELAY    Seconds spent on each hash in the hash list (0)
+    FAKE_CRACKER_SPEED    Hashes per second to report in status lines (1000000)
+    FAKE_CRACKER_VERSION  Version to report for --version (v3.6.0)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def load_answers(path):
+    answers = {}
+    if not path or not os.path.exists(path):
+        return answers
+
+    with open(path, 'r') as f:
+        for line in f:
+            hash, sep, password = line.rstrip('\n').partition('\t')
+            if sep:
+                answers[hash.lower()] = password
+    return answers
+
+
+def status_line(state, done, total, recovered, hashes, speed):
+    return '\t'.join(str(x) for x in ['STATUS', state, 'SPEED', int(speed), 1000, 'EXEC_RUNTIME', 0, 'CURKU', done,
+                                      'PROGRESS', done, total, 'RECHASH', recovered, hashes, 'RECSALT', recovered,
+                                      hashes, 'TEMP', 60, 'REJECTED', 0, 'UTIL', 100])
+
+
+def crack(hashfile, outfile, write, status_timer=None):
+    """Work through hashfile, writing answers with write(hash, password)"""
+    answers = load_answers(os.environ.get('FAKE_CRACKER_ANSWERS'))
+    delay = float(os.environ.get('FAKE_CRACKER_DELAY', '0'))
+    speed = float(os.environ.get('FAKE_CRACKER_SPEED', '1000000'))
+
+    with open(hashfile, 'r') as f:
+        hashes = [line.rstrip('\n') for line in f if line.strip()]
+
+    recovered = 0
+    last_status = time.time()
+    with open(outfile, 'a') as out:
+        for done, hash in enumerate(hashes, 1):
+            if delay:
+                time.sleep(delay)
+
+            password = answers.get(hash.lower())
+            if password is not None:
+                out.write(write(hash, password) + '\n')
+                out.flush()
+                recovered += 1
+
+            if status_timer is not None and time.time() - last_status >= status_timer:
+                print status_line(3, done, len(hashes), recovered, len(hashes), speed)
+                sys.stdout.flush()
+                last_status = time.time()
+
+    if status_timer is not None:
+        print status_line(6 if recovered == len(hashes) else 5, len(hashes), len(hashes), recovered, len(hashes), speed)
+        sys.stdout.flush()
+
+    # hashcat exits 0 when everything cracked and 1 when the keyspace ran out
+    return 0 if recovered == len(hashes) else 1
+
+
+def hashcat(argv):
+    parser = argparse.ArgumentParser(prog='hashcat')
+    parser.add_argument('--version', action='store_true')
+    parser.add_argument('--session')
+    parser.add_argument('--restore', action='store_true')
+    parser.add_argument('--restore-file-path')
+    parser.add_argument('--status', action='store_true')
+    parser.add_argument('--status-timer', type=float, default=10)
+    parser.add_argument('--machine-readable', action='store_true')
+    parser.add_argument('--outfile-format', default='3')
+    parser.add_argument('-m', '--hash-type')
+    parser.add_argument('-r', '--rules-file')
+    parser.add_argument('-a', '--attack-mode')
+    parser.add_argument('-o', '--outfile')
+    parser.add_argument('hashfile', nargs='?')
+    parser.add_argument('wordlist', nargs='*')
+    args, unknown = parser.parse_known_args(argv)
+
+    if args.version:
+        print os.environ.get('FAKE_CRACKER_VERSION', 'v3.6.0')
+        return 0
+
+    # The restore file holds the original arguments, like hashcat's does
+    if args.restore:
+        with open(args.restore_file_path, 'r') as f:
+            return hashcat(json.load(f))
+
+    if args.restore_file_path:
+        with open(args.restore_file_path, 'w') as f:
+            json.dump(argv, f)
+
+    if not args.hashfile or not args.outfile:
+        sys.stderr.write('Usage: hashcat [options] hashfile [wordlist]\n')
+        return 255
+
+    hex_output = args.outfile_format in ('5', '1,3')
+
+    def write(hash, password):
+        return '{}:{}'.format(hash, password.encode('hex') if hex_output else password)
+
+    result = crack(args.hashfile, args.outfile, write, args.status_timer if args.status else None)
+    if args.restore_file_path and os.path.exists(args.restore_file_path):
+        os.remove(args.restore_file_path)
+    return result
+
+
+def john(argv):
+    options = dict(arg[2:].split('=', 1) for arg in argv if arg.startswith('--') and '=' in arg)
+    hashfiles = [arg for arg in argv if not arg.startswith('-')]
+    if not hashfiles or 'pot' not in options:
+        sys.stderr.write('Usage: john --pot=FILE [options] hashfile\n')
+        return 1
+
+    crack(hashfiles[0], options['pot'], lambda hash, password: '{}:{}'.format(hash, password))
+    return 0
+
+
+def main(argv):
+    if any(arg.startswith('--format=') or arg.startswith('--pot=') for arg in argv):
+        return john(argv)
+    return hashcat(argv)
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
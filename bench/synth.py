@@ -0,0 +1,157 @@
+"""
+Synthetic engagement data for the Gladius benchmarks.
+
+Every generator writes a file shaped like the real tool's output and
+returns the answers for the share of accounts that should
+crack, for the fake cracker to "find".
+"""
+import os
+import random
+
+domains = ['CORP', 'LAB', 'DEV', 'FINANCE']
+passwords = ['Password1', 'Summer2018!', 'Welcome1', 'Passw0rd', 'Company123', 'Winter2019', 'Letmein!', 'P@ss:word']
+
+empty_lm = 'aad3b435b51404eeaad3b435b51404ee'
+
+
+def random_hex(rand, length):
+    return '%0*x' % (length, rand.getrandbits(length * 4))
+
+
+def username(index):
+    return 'user{:06d}'.format(index)
+
+
+def cracks(rand, ratio):
+    """Pick whether an account's password is in the wordlist"""
+    return rand.random() < ratio
+
+
+def ntlmv2_capture(rand, user, domain):
+    # user::domain:server challenge:NTProofStr:blob
+    blob = '0101000000000000' + random_hex(rand, 16) + random_hex(rand, 16) + '00000000' + random_hex(rand, 200)
+    return '{}::{}:{}:{}:{}'.format(user, domain, random_hex(rand, 16), random_hex(rand, 32), blob)
+
+
+def ntlmv1_capture(rand, user, domain):
+    # user::domain:LM response:NT response:server challenge
+    return '{}::{}:{}:{}:{}'.format(user, domain, random_hex(rand, 48), random_hex(rand, 48), random_hex(rand, 16))
+
+
+def responder_log(path, accounts, version='v2', ratio=0.1, seed=0):
+    """
+    Write a Responder capture log, as in SMB-NTLMv2-SSP-10.0.0.5.txt
+
+    Returns:
+        dict of capture to password for the captures that crack
+    """
+    rand = random.Random(seed)
+    capture = ntlmv2_capture if version == 'v2' else ntlmv1_capture
+    answers = {}
+    with open(path, 'w') as f:
+        for index in range(accounts):
+            line = capture(rand, username(index), rand.choice(domains))
+            f.write(line + '\n')
+            if cracks(rand, ratio):
+                answers[line] = rand.choice(passwords)
+    return answers
+
+
+def smart_hashdump(path, accounts, ratio=0.1, seed=0):
+    """
+    Write smart_hashdump output, user:rid:lmhash:nthash:::
+
+    Returns:
+        dict of NTLM hash to password for the hashes that crack
+    """
+    rand = random.Random(seed)
+    answers = {}
+    with open(path, 'w') as f:
+        for index in range(accounts):
+            nthash = random_hex(rand, 32)
+            f.write('{}:{}:{}:{}:::\n'.format(username(index), 1000 + index, empty_lm, nthash))
+            if cracks(rand, ratio):
+                answers[nthash] = rand.choice(passwords)
+        # Machine accounts are skipped by the parser
+        f.write('HOST$:{}:{}:{}:::\n'.format(1000 + accounts, empty_lm, random_hex(rand, 32)))
+    return answers
+
+
+def secretsdump(path, accounts, ratio=0.1, seed=0, ntds=False):
+    """
+    Write secretsdump.py output against a host, or a domain controller's
+    NTDS.dit with ntds. A tenth of the accounts also have a cached logon.
+
+    Returns:
+        dict of NTLM hash to password for the hashes that crack
+    """
+    rand = random.Random(seed)
+    answers = {}
+    domain = rand.choice(domains)
+    with open(path, 'w') as f:
+        f.write('Impacket v0.9.15 - Copyright 2002-2016 Core Security Technologies\n\n')
+        f.write('[*] Target system bootKey: 0x{}\n'.format(random_hex(rand, 32)))
+
+        if ntds:
+            f.write('[*] Dumping Domain Credentials (domain\\uid:rid:lmhash:nthash)\n')
+            f.write('[*] Using the DRSUAPI method to get NTDS.DIT secrets\n')
+            prefix = '{}.LOCAL\\'.format(domain)
+        else:
+            f.write('[*] Dumping local SAM hashes (uid:rid:lmhash:nthash)\n')
+            prefix = ''
+
+        for index in range(accounts):
+            nthash = random_hex(rand, 32)
+            f.write('{}{}:{}:{}:{}:::\n'.format(prefix, username(index), 1000 + index, empty_lm, nthash))
+            if cracks(rand, ratio):
+                answers[nthash] = rand.choice(passwords)
+
+        if ntds:
+            f.write('[*] Kerberos keys grabbed\n')
+            for index in range(accounts):
+                f.write('{}{}:aes256-cts-hmac-sha1-96:{}\n'.format(prefix, username(index), random_hex(rand, 64)))
+        else:
+            f.write('[*] Dumping cached domain logon information (uid:encryptedHash:longDomain:domain)\n')
+            for index in range(0, accounts, 10):
+                f.write('{}:{}:{}.LOCAL:{}:::\n'.format(username(index), random_hex(rand, 32), domain, domain))
+
+            f.write('[*] Dumping LSA Secrets\n')
+            f.write('[*] $MACHINE.ACC \n')
+            f.write('{}\\HOST$:{}:{}:::\n'.format(domain, empty_lm, random_hex(rand, 32)))
+            f.write('[*] DefaultPassword \n')
+            f.write('(Unknown User):{}\n'.format(rand.choice(passwords)))
+            f.write('[*] _SC_BackupService \n')
+            f.write('{}\\svc_backup:{}\n'.format(domain, rand.choice(passwords)))
+
+        f.write('[*] Cleaning up... \n')
+    return answers
+
+
+def write_answers(path, answers):
+    with open(path, 'w') as f:
+        for hash, password in answers.items():
+            f.write('{}\t{}\n'.format(hash, password))
+
+
+# (name, handler, file name, generator)
+scenarios = [
+    ('responder-ntlmv2', 'ResponderHandler', 'SMB-NTLMv2-SSP-10.0.0.5.txt', lambda path, n, ratio, seed: responder_log(path, n, 'v2', ratio, seed)),
+    ('responder-ntlmv1', 'ResponderHandler', 'SMB-NTLMv1-10.0.0.5.txt', lambda path, n, ratio, seed: responder_log(path, n, 'v1', ratio, seed)),
+    ('smart_hashdump', 'ResponderHandler', '10.0.0.5_hashes.txt', smart_hashdump),
+    ('secretsdump', 'SecretsdumpHandler', 'secretsdump_10.0.0.5', secretsdump),
+    ('secretsdump-ntds', 'SecretsdumpHandler', 'secretsdump_10.0.0.1', lambda path, n, ratio, seed: secretsdump(path, n, ratio, seed, ntds=True)),
+]
+
+
+def generate(name, directory, accounts, ratio=0.1, prefix='', seed=0):
+    """
+    Write the input of a scenario into directory, with prefix on the file name.
+
+    Returns:
+        (handler name, path, answers)
+    """
+    for scenario, handler, filename, generator in scenarios:
+        if scenario == name:
+            path = os.path.join(directory, prefix + filename)
+            return handler, path, generator(path, accounts, ratio, seed)
+    raise KeyError(name)
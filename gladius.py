@@ -5,10 +5,27 @@ import subprocess
 import argparse
 import struct
 import md5
+import hashlib
+import hmac
 import datetime
+import json
+import threading
+import heapq
+import bisect
+import BaseHTTPServer
+import SocketServer
+import socket
+import Queue
+import fnmatch
+import re
+import shutil
+import csv
+import sys
+import multiprocessing
 
 from collections import namedtuple
 from collections import defaultdict
+from collections import OrderedDict
 
 try:
     from watchdog.observers import Observer
@@ -17,11 +34,28 @@ except ImportError:
     raise Exception("Watchdog is needed for Gladius: pip install watchdog.")
     exit(0)
 
+# Only needed to check NetNTLMv1 captures in-process
+try:
+    from Crypto.Cipher import DES
+except ImportError:
+    DES = None
+
 verbosity = False
 art = True
 
+# Check new passwords against the hashes of every user, not just the same one
+verify_all_users = False
+
 Cred = namedtuple('Cred', ['domain', 'username', 'password'])
 
+# A line of interest found by a parser. kind is one of:
+#   hash     - NTLM hash of username
+#   capture  - NetNTLMv1/v2 capture line
+#   cached   - DCC2 cached domain logon
+#   default  - DefaultPassword LSA secret
+#   service  - Service account credentials from an _SC_ LSA secret
+Parsed = namedtuple('Parsed', ['kind', 'mode', 'hash', 'username'])
+
 colors = {
     'normal'         : "\x1b[0m",
     'black'          : "\x1b[30m",
@@ -38,6 +72,36 @@ colors = {
 
 ntlm_hashes = defaultdict(dict)
 
+# NetNTLMv1/v2 captures, keyed by the lowercased capture line
+captures = {}
+
+# (domain, user) lowercased -> every capture of that account
+capture_accounts = defaultdict(list)
+
+# (domain, user) lowercased -> the one capture of the account being cracked
+representatives = {}
+
+# (domain, user) lowercased -> (capture, outpath) held back while the representative cracks
+held_captures = defaultdict(list)
+
+# Username without its domain, lowercased -> keys in captures of the user's captures
+capture_users = defaultdict(list)
+
+# DCC2 cached domain logons, keyed by the lowercased $DCC2$10240#user#hash.
+# The username is the salt, so this key is the same for the same logon
+# dumped from any host.
+cached_logons = {}
+
+# Username without its domain, lowercased -> keys in cached_logons of the user's logons
+cached_users = defaultdict(list)
+
+hash_names = {
+    '1000': 'NTLM',
+    '2100': 'DCC2',
+    '5500': 'NetNTLMv1',
+    '5600': 'NetNTLMv2',
+}
+
 ################################################################################
 # Helper functions
 ################################################################################
@@ -53,22 +117,448 @@ def print_banner():
     print(data)
 
 def get_cracked_stats():
-    total_hashes = len(ntlm_hashes)
-
-    total_hashes = []
-    for hash in ntlm_hashes:
-        total_hashes.extend(ntlm_hashes[hash]['users'])
-    total_hashes = len(total_hashes)
-
-    cracked_hashes = []
-    for hash in ntlm_hashes:
-        if ntlm_hashes[hash]['password']:
-            cracked_hashes.extend(ntlm_hashes[hash]['users'])
-    total_cracked = len(cracked_hashes)
-    # total_cracked = len([hash for hash in ntlm_hashes if ntlm_hashes[hash]['password']])
-    percentage = "{:.2f}".format(((total_cracked * 1.0) / total_hashes)*100)
-    result = "({}/{} {}%)".format(total_cracked, total_hashes, percentage)
-    return result
+    return stats.format()
+
+def encode_password(password):
+    """
+    Return password the way hashcat writes it to a potfile: as it is if it
+    is printable ASCII, otherwise as $HEX[..]. Cracked passwords are raw
+    bytes, which a potfile line or a JSON record can not always hold.
+    """
+    if isinstance(password, unicode):
+        password = password.encode('utf-8')
+    if all(' ' <= char <= '~' for char in password) and ':' not in password and not password.startswith('$HEX['):
+        return password
+    return '$HEX[{}]'.format(password.encode('hex'))
+
+def decode_password(password):
+    """Return the raw bytes of a password written by encode_password"""
+    if password.startswith('$HEX[') and password.endswith(']'):
+        try:
+            return password[5:-1].decode('hex')
+        except TypeError:
+            pass
+    return password
+
+def register_hash(hash, username, source=None, seen=None):
+    """
+    Track an NTLM hash and a user it belongs to.
+
+    Args:
+        source (str): File the hash was found in
+        seen (float): When the hash was first seen, defaults to now
+
+    Returns:
+        True if the user is new for this hash
+    """
+    seen = seen or time.time()
+    if 'users' not in ntlm_hashes[hash]:
+        ntlm_hashes[hash]['time'] = datetime.datetime.fromtimestamp(seen)
+        ntlm_hashes[hash]['users'] = []
+        ntlm_hashes[hash]['sources'] = {}
+        ntlm_hashes[hash]['password'] = ''
+
+    # Every user of the hash has a source, the dict finds them without scanning the list
+    if username in ntlm_hashes[hash]['sources']:
+        return False
+
+    ntlm_hashes[hash]['users'].append(username)
+    ntlm_hashes[hash]['sources'][username] = source
+    first_seen = time.mktime(ntlm_hashes[hash]['time'].timetuple())
+    stats.add('1000', source, first_seen, cracked=bool(ntlm_hashes[hash]['password']))
+    journal.write('hash', hash=hash, user=username, source=source, time=seen)
+    return True
+
+def mark_cracked(hash, password):
+    """Record the password of a cracked NTLM hash"""
+    entry = ntlm_hashes[hash]
+    if not entry.get('password') and 'users' in entry:
+        first_seen = time.mktime(entry['time'].timetuple())
+        for username in entry['users']:
+            stats.crack('1000', entry['sources'].get(username), first_seen)
+
+    entry['password'] = password
+    journal.write('crack', sync=True, hash=hash, password=password)
+    potcache.add(hash, password)
+    for username in entry.get('users', []):
+        ledger.record(username, password, hash=hash, mode='1000', source=entry['sources'].get(username))
+
+def register_capture(capture, mode, source=None, seen=None):
+    """
+    Track a NetNTLMv1/v2 capture (user::domain:...) from Responder.
+
+    Returns:
+        True if the capture has not been seen before
+    """
+    key = capture.lower()
+    if key in captures:
+        return False
+
+    seen = seen or time.time()
+    fields = capture.split(':')
+    captures[key] = {
+        'hash': capture,
+        'mode': str(mode),
+        'user': fields[0],
+        'domain': fields[2] if len(fields) > 2 else '',
+        'source': source,
+        'time': seen,
+        'password': '',
+    }
+    capture_accounts[account_key(captures[key])].append(captures[key])
+    capture_users[user_key(fields[0])].append(key)
+    stats.add(str(mode), source, seen)
+    journal.write('capture', hash=capture, mode=str(mode), source=source, time=seen)
+    return True
+
+def register_cached(hash, username, source=None, seen=None):
+    """
+    Track a DCC2 cached domain logon ($DCC2$10240#user#hash) from secretsdump.
+
+    Args:
+        username (str): Account of the logon, as DOMAIN\\user when the domain is known
+
+    Returns:
+        True if the logon has not been seen before, on this host or another
+    """
+    key = hash.lower()
+    if key in cached_logons:
+        return False
+
+    seen = seen or time.time()
+    cached_logons[key] = {
+        'hash': hash,
+        'mode': '2100',
+        'user': username,
+        'source': source,
+        'time': seen,
+        'password': '',
+    }
+    cached_users[user_key(username)].append(key)
+    stats.add('2100', source, seen)
+    journal.write('cached', hash=hash, user=username, source=source, time=seen)
+    return True
+
+def mark_cached_cracked(hash, password):
+    """
+    Record the password of a cracked DCC2 cached logon.
+
+    Returns:
+        False if the logon is unknown or was already cracked
+    """
+    entry = cached_logons.get(hash.lower())
+    if entry is None or entry['password']:
+        return False
+
+    entry['password'] = password
+    stats.crack('2100', entry['source'], entry['time'])
+    journal.write('cached_crack', sync=True, hash=entry['hash'], password=password)
+    ledger.record(entry['user'], password, hash=entry['hash'], mode='2100', source=entry['source'])
+    return True
+
+def account_key(entry):
+    return entry['domain'].lower(), entry['user'].lower()
+
+def user_key(username):
+    """Lowercased username without its DOMAIN\\ prefix"""
+    return username.split('\\')[-1].lower()
+
+def verify_capture(entry, nt):
+    """
+    Check a password against a capture or cached logon in-process.
+
+    Args:
+        entry (dict): Capture or cached logon as tracked in captures or cached_logons
+        nt (str): NT hash of the password, see ntlm_hash
+
+    Returns:
+        True or False, or None if the capture's mode can not be checked here
+    """
+    try:
+        return nt_checkers[entry['mode']](entry['hash'])(nt)
+    except KeyError:
+        return None
+    except (ValueError, TypeError, IndexError):
+        return False
+
+def should_crack_capture(capture, outpath):
+    """
+    Decide whether a new capture needs cracking.
+
+    Clients retrying authentication give Responder many captures of the
+    same account. Only one of them, the account's representative, is
+    cracked at a time and the rest are held back. Once the account is
+    cracked, held and later captures are checked against its password
+    instead.
+
+    Args:
+        capture (str): Registered NetNTLMv1/v2 capture
+        outpath (str): Output directory of the handler that found it
+
+    Returns:
+        True to queue the capture for cracking
+    """
+    entry = captures[capture.lower()]
+    account = account_key(entry)
+
+    cracked = [other['password'] for other in capture_accounts[account] if other['password']]
+    if cracked:
+        matches = verify_capture(entry, ntlm_hash(cracked[0]))
+        if matches:
+            mark_capture_cracked(capture, cracked[0])
+            return False
+        # A different password than before is worth cracking, an unknown one is not
+        return matches is False
+
+    representative = representatives.get(account)
+    if representative is not None and representative is not entry:
+        held_captures[account].append((capture, outpath))
+        journal.write('held', hash=capture, outpath=outpath)
+        return False
+
+    representatives[account] = entry
+    journal.write('representative', hash=capture)
+    return True
+
+def promote_held(hashes):
+    """
+    Once the attack plan has run out on an account's representative without
+    cracking it, crack the next capture held back for the account instead.
+    The client may have sent it after a password change.
+
+    Args:
+        hashes (list): Hashes the attack plan is done with
+    """
+    for hash in hashes:
+        entry = captures.get(hash.lower())
+        if entry is None or entry['password']:
+            continue
+        account = account_key(entry)
+        if representatives.get(account) is not entry:
+            continue
+
+        held = held_captures.get(account, [])
+        while held:
+            capture, outpath = held.pop(0)
+            next_entry = captures[capture.lower()]
+            if next_entry['password']:
+                continue
+
+            verbose("Trying another capture of {}\\{}".format(entry['domain'], entry['user']))
+            representatives[account] = next_entry
+            journal.write('representative', hash=capture)
+            scheduler.submit(next_entry['mode'], [capture], outpath)
+            break
+
+        if not held:
+            held_captures.pop(account, None)
+
+def settle_account(capture, password):
+    """
+    Once a capture is cracked, mark the account's other captures that share
+    its password as cracked and stop cracking them. Held captures with
+    another password are queued after all.
+    """
+    entry = captures[capture.lower()]
+    account = account_key(entry)
+    nt = ntlm_hash(password)
+    redundant = []
+    for other in capture_accounts[account]:
+        if other['password']:
+            continue
+
+        matches = verify_capture(other, nt)
+        if matches:
+            mark_capture_cracked(other['hash'], password)
+        if matches is not False:
+            redundant.append(other['hash'])
+
+    if redundant:
+        verbose("Dropping {} more captures of {}\\{}".format(len(redundant), entry['domain'], entry['user']))
+        scheduler.withdraw(redundant)
+
+    for held, outpath in held_captures.pop(account, []):
+        held_entry = captures[held.lower()]
+        if not held_entry['password'] and held not in redundant:
+            scheduler.submit(held_entry['mode'], [held], outpath)
+
+def settle_password(password, usernames):
+    """
+    Check a newly cracked password against the outstanding hashes of the
+    same users, or of every user with verify_all_users. Users tend to
+    reuse one password for their local, domain and cached logons, so
+    hashes of other types it opens are marked cracked and withdrawn from
+    their crack jobs.
+
+    Args:
+        password (str): Cracked password
+        usernames (list): Users the password was cracked for
+    """
+    users = set(user_key(username) for username in usernames)
+    nt = ntlm_hash(password)
+    matched = []
+
+    # Any user's NTLM hash is opened by the password, whoever it belongs to
+    nthash = nt.encode('hex')
+    entry = ntlm_hashes.get(nthash)
+    if entry and 'users' in entry and not entry['password']:
+        info("{} shares the password of {}".format(', '.join(entry['users']), ', '.join(usernames)))
+        report_cracked(nthash, password)
+        matched.append(nthash)
+
+    # Look the users' captures up rather than checking every capture of the engagement
+    if verify_all_users:
+        keys = list(captures)
+    else:
+        keys = [key for user in users for key in capture_users.get(user, [])]
+    for key in keys:
+        entry = captures.get(key)
+        if entry is None or entry['password']:
+            continue
+        if verify_capture(entry, nt):
+            info("{}\\{} shares the password of {}".format(entry['domain'], entry['user'], ', '.join(usernames)))
+            mark_capture_cracked(entry['hash'], password)
+            matched.append(entry['hash'])
+            settle_account(entry['hash'], password)
+
+    # Cached logons are salted by username, only the same user's can match
+    for key in [key for user in users for key in cached_users.get(user, [])]:
+        entry = cached_logons.get(key)
+        if entry is None or entry['password']:
+            continue
+        if verify_capture(entry, nt):
+            info("Cached logon of {} shares the password of {}".format(entry['user'], ', '.join(usernames)))
+            mark_cached_cracked(entry['hash'], password)
+            matched.append(entry['hash'])
+
+    if matched:
+        scheduler.withdraw(matched)
+
+def mark_capture_cracked(capture, password):
+    """
+    Record the password of a cracked NetNTLMv1/v2 capture.
+
+    Returns:
+        False if the capture is unknown or was already cracked
+    """
+    entry = captures.get(capture.lower())
+    if entry is None or entry['password']:
+        return False
+
+    entry['password'] = password
+    stats.crack(entry['mode'], entry['source'], entry['time'])
+    journal.write('capture_crack', sync=True, hash=entry['hash'], password=password)
+    ledger.add(entry['domain'], entry['user'], password, hash=entry['hash'], mode=entry['mode'], source=entry['source'])
+    return True
+
+def report_cracked(hash, password):
+    """
+    Announce the password of a newly cracked NTLM hash and record it.
+
+    Returns:
+        The credential line to write out
+    """
+    cracked_stats = get_cracked_stats()
+    usernames = ', '.join(ntlm_hashes[hash]['users'])
+    crack_time = datetime.datetime.now() - ntlm_hashes[hash]['time']
+    crack_seconds.observe(crack_time.total_seconds(), mode='1000')
+
+    cred = '[{}] {} {} : {}'.format(crack_time, cracked_stats, usernames, password)
+    success("New creds: {}".format(cred))
+    mark_cracked(hash, password)
+    return cred
+
+def deliver_result(hash, password):
+    """
+    Announce and record a hash cracked by any cracker.
+
+    Args:
+        hash (str): NTLM hash or NetNTLMv1/v2 capture as given to the cracker
+        password (str): Cracked password
+
+    Returns:
+        The credential line announced, or None if there was nothing new
+    """
+    if not password:
+        return None
+
+    if hash.lower().startswith('$dcc2$'):
+        if not mark_cached_cracked(hash, password):
+            return None
+        entry = cached_logons[hash.lower()]
+        crack_seconds.observe(time.time() - entry['time'], mode='2100')
+        settle_password(password, [entry['user']])
+        feedback.add(password)
+
+        domain, sep, user = entry['user'].rpartition('\\')
+        cred = '{} {} {}'.format(domain, user, password)
+        if art:
+            print create_sword(cred)
+        else:
+            success("New creds: {}".format(cred))
+        return cred
+
+    fields = hash.split(':')
+    if len(fields) == 1:
+        entry = ntlm_hashes.get(hash)
+        if entry is None or 'users' not in entry:
+            # Not one of ours, but worth remembering
+            mark_cracked(hash, password)
+            return None
+        if entry['password']:
+            return None
+        cred = report_cracked(hash, password)
+        settle_password(password, entry['users'])
+        feedback.add(password)
+        return cred
+
+    if mark_capture_cracked(hash, password):
+        entry = captures[hash.lower()]
+        crack_seconds.observe(time.time() - entry['time'], mode=entry['mode'])
+        settle_account(hash, password)
+        settle_password(password, [entry['user']])
+        feedback.add(password)
+    elif hash.lower() in captures:
+        # Already cracked it
+        return None
+
+    try:
+        cred = '{} {} {}'.format(fields[2], fields[0], password)
+    except IndexError:
+        return None
+
+    if art:
+        print create_sword(cred)
+    else:
+        success("New creds: {}".format(cred))
+    return cred
+
+def is_cracked(hash):
+    """True if the password of an NTLM hash, NetNTLMv1/v2 capture or DCC2 logon is known"""
+    if ':' in hash:
+        entry = captures.get(hash.lower())
+    elif hash.lower().startswith('$dcc2$'):
+        entry = cached_logons.get(hash.lower())
+    else:
+        entry = ntlm_hashes.get(hash)
+    return bool(entry and entry.get('password'))
+
+def resolve_cached(hashes):
+    """
+    Report the NTLM hashes whose password is already in the pot cache.
+
+    Returns:
+        The hashes that still need cracking
+    """
+    remaining = []
+    for hash in hashes:
+        password = potcache.get(hash)
+        if password is None:
+            remaining.append(hash)
+        elif not ntlm_hashes[hash].get('password'):
+            verbose("Found {} in the pot cache".format(hash))
+            report_cracked(hash, password)
+    return remaining
 
 def get_sword_art():
     with open('gladius.ascii', 'r') as f:
@@ -136,404 +626,3494 @@ def verbose(string):
     if verbosity:
         print color(string, color="cyan", graphic='[.] ')
 
+def hashcat_outfile_format():
+    """
+    Return the --outfile-format that makes hashcat write hash:hex(password).
+    hashcat 6 replaced the numbered formats with combinable fields.
+    """
+    proc = subprocess.Popen([args.hashcat, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    version = proc.communicate()[0].strip().lstrip('v')
+    try:
+        major = int(version.split('.')[0])
+    except ValueError:
+        major = 0
+    return '1,3' if major >= 6 else '5'
+
 def outdated_hashcat():
     import subprocess
     proc = subprocess.Popen([args.hashcat], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     return 'this copy of hashcat is outdated' in proc.communicate()[1]
 
-################################################################################
-# Watchdog Handler classes
-################################################################################
-
-class GladiusHandler(PatternMatchingEventHandler):
+class FileTail(object):
     """
-    Base Class for Handlers in Gladius
+    Remember how far into each watched file we have read, so that only the
+    data appended since the last read is returned.
 
-    Attributes:
-        output: Directory to write temporary files specific to the handler
-        junkpath: Directory to write junk files for intermediate use
+    A changed inode or a file smaller than the saved offset means the file was
+    rotated or truncated, in which case reading starts over from the top.
+    A trailing line without a newline is still being written and is left for
+    the next read.
     """
 
     def __init__(self):
-        self.cache = []
-        self.outpath = os.path.join('engagement', "{}_out".format(self.__class__.__name__.lower()))
-        self.junkpath = os.path.join('engagement', "junk")
-
-        if not os.path.exists(self.outpath):
-            os.makedirs(self.outpath)
-
-        if not os.path.exists(self.junkpath):
-            os.makedirs(self.junkpath)
+        # path -> (inode, offset of the first unread byte)
+        self.positions = {}
+
+    def read(self, path, stat=None, final=False, limit=None):
+        """
+        Return the complete lines appended to path since the last read.
+        With final, a trailing line without a newline is returned as well.
+        With limit, read only about that many bytes, ending at a whole line,
+        and leave the rest for the next read.
+        """
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            self.positions.pop(path, None)
+            return []
+
+        inode, offset = self.positions.get(path, (stat.st_ino, 0))
+        if inode != stat.st_ino or stat.st_size < offset:
+            verbose("{} was truncated or rotated, reading from the start".format(path))
+            offset = 0
+
+        if stat.st_size == offset:
+            return []
+
+        with open(path, 'r') as f:
+            f.seek(offset)
+            if limit is None or stat.st_size - offset <= limit:
+                data = f.read()
+            else:
+                # Finish the line the limit cut through
+                data = f.read(limit) + f.readline()
+                final = False
 
-        super(GladiusHandler, self).__init__()
+        end = len(data) if final else data.rfind('\n') + 1
+        self.positions[path] = (stat.st_ino, offset + end)
 
-    def process(self, event):
-        pass
+        data = data[:end]
+        if data.endswith('\n'):
+            data = data[:-1]
+        return data.split('\n') if data else []
 
-    def get_outfile(self, suffix=''):
-        return tempfile.NamedTemporaryFile(delete=False, dir=self.outpath, suffix=suffix)
+    def unread(self, path, stat):
+        """Is part of path left for the next read"""
+        inode, offset = self.positions.get(path, (stat.st_ino, 0))
+        return inode == stat.st_ino and offset < stat.st_size
 
-    def get_junkfile(self, suffix=''):
-        return tempfile.NamedTemporaryFile(delete=False, dir=self.junkpath, suffix=suffix)
+class FingerprintIndex(object):
+    """
+    Remember which files and which content Gladius has already processed.
 
-    def get_lines(self, event):
-        """Given an event, return the lines of the event file"""
-        with open(event.src_path, 'r') as f:
-            data = f.read().split('\n')
-        return data
+    Files are keyed by path and remember the inode, size and mtime they had
+    when last read, along with how far they were read. An unchanged file is
+    skipped from a stat() alone. Content digests catch the same data showing
+    up under another name. Both tables are bounded LRUs and can be
+    snapshotted to disk so that a restart skips what was already processed.
 
-    def on_modified(self, event):
-        self.on_created(event)
+    A file can also keep the state its handler needs to carry on parsing
+    from the recorded offset, such as the secretsdump section it was in.
+    """
 
-    def on_created(self, event):
-        # Ignore events that flag on the directory itself
-        if os.path.isdir(event.src_path):
+    def __init__(self, max_files=10000, max_digests=100000):
+        self.max_files = max_files
+        self.max_digests = max_digests
+        # key -> (inode, size, mtime, offset)
+        self.files = OrderedDict()
+        # key -> parser state at the offset, for the files that have one
+        self.states = {}
+        # digest -> None, only the keys matter
+        self.digests = OrderedDict()
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def unchanged(self, key, stat):
+        """Was the file behind key read to the end and not changed since"""
+        with self.lock:
+            record = self.files.get(key)
+            if record is None:
+                return False
+
+            # Refresh its place in the LRU
+            del self.files[key]
+            self.files[key] = record
+
+        return record == (stat.st_ino, stat.st_size, stat.st_mtime, stat.st_size)
+
+    def position(self, key):
+        """Return the (inode, offset) reached in the file behind key, if known"""
+        record = self.files.get(key)
+        if record is None:
+            return None
+        return record[0], record[3]
+
+    def state(self, key):
+        """Return the parser state recorded with the file behind key, if any"""
+        return self.states.get(key)
+
+    def record(self, key, stat, offset, state=None):
+        with self.lock:
+            self.files.pop(key, None)
+            self.files[key] = (stat.st_ino, stat.st_size, stat.st_mtime, offset)
+            if state is None:
+                self.states.pop(key, None)
+            else:
+                self.states[key] = state
+            while len(self.files) > self.max_files:
+                self.states.pop(self.files.popitem(last=False)[0], None)
+            self.dirty = True
+
+    def seen(self, digest):
+        """Add digest to the index, returning True if it was already there"""
+        with self.lock:
+            if digest in self.digests:
+                del self.digests[digest]
+                self.digests[digest] = None
+                return True
+
+            self.digests[digest] = None
+            while len(self.digests) > self.max_digests:
+                self.digests.popitem(last=False)
+            self.dirty = True
+            return False
+
+    def save(self, path):
+        """Atomically snapshot the index to path, oldest entries first"""
+        with self.lock:
+            snapshot = {
+                'files': [[key] + list(record) for key, record in self.files.items()],
+                'states': dict(self.states),
+                'digests': list(self.digests),
+            }
+            self.dirty = False
+
+        temp = path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(snapshot, f)
+        os.rename(temp, path)
+
+    def load(self, path):
+        if not os.path.exists(path):
             return
 
-        # In order to prevent duplication between created and modified
-        # Check the md5 of the contents of the file
-        # If cached file, ignore
-        with open(event.src_path, 'r') as f:
-            data = f.read()
-
-        md5sum = md5.new(data).hexdigest()
-        if md5sum in self.cache:
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except ValueError:
+            warning("Ignoring unreadable fingerprint snapshot: {}".format(path))
             return
 
-        self.cache.append(md5sum)
-        verbose("New data in {} path".format(self.__class__.__name__))
-        self.process(event)
+        with self.lock:
+            for entry in snapshot.get('files', [])[-self.max_files:]:
+                self.files[entry[0]] = tuple(entry[1:])
+            for key, state in snapshot.get('states', {}).items():
+                if key in self.files:
+                    self.states[key] = state
+            for digest in snapshot.get('digests', [])[-self.max_digests:]:
+                self.digests[digest] = None
 
+fingerprints = FingerprintIndex()
 
-class ResponderHandler(GladiusHandler):
-    """
-    Watch for new hash files and run hashcat against them
+class Debouncer(object):
     """
+    Hold file events back until the file has settled.
 
-    patterns = ["*NTLM*.txt", "*hashes*"]
+    Responder and a redirected secretsdump.py fire a stream of created and
+    modified events while they write. A file is handed to its handler once
+    no event has arrived for `quiet` seconds, or `max_latency` seconds after
+    the first held event if the writer never pauses, whichever comes first.
+
+    Going quiet does not mean the writer is done. `secretsdump.py > file`
+    is block buffered and can pause in the middle of a line, so a trailing
+    line without a newline is only taken once the writer closed the file.
+    """
 
-    # Add to this list to add new hashcat crack types
-    # NOTE: If the type isn't NTLM, be sure to add a regex pattern to patterns
-    types = [
-                ('ntlmv1', '5500'),
-                ('ntlmv2', '5600'),
-                ('hashes', '1000'),
-            ]
+    def __init__(self, quiet=1, max_latency=10):
+        self.quiet = quiet
+        self.max_latency = max_latency
+        # (handler, path) -> [first event time, last event time, last event, closed]
+        self.held = OrderedDict()
+        self.lock = threading.Lock()
+
+    def touch(self, handler, event, now=None, closed=False):
+        """
+        Hold event for handler. closed is set when the event is the writer
+        closing the file, and cleared again by any later write.
+        """
+        now = now or time.time()
+        key = (handler, event.src_path)
+        with self.lock:
+            if key in self.held:
+                self.held[key][1:] = [now, event, closed]
+            else:
+                self.held[key] = [now, now, event, closed]
+
+    def due(self, now=None):
+        """
+        Remove and return the settled events as (handler, event, final).
+        final is set when the writer closed the file after its last write.
+        """
+        now = now or time.time()
+        ready = []
+        with self.lock:
+            for key, (first, last, event, closed) in self.held.items():
+                if now - last >= self.quiet or now - first >= self.max_latency:
+                    del self.held[key]
+                    ready.append((key[0], event, closed))
+        return ready
+
+    def tick(self, now=None):
+        for handler, event, final in self.due(now):
+            handler.handle_event(event, final=final)
+
+    def run(self, interval=0.2):
+        while True:
+            self.tick()
+            time.sleep(interval)
 
-    cache = set()
+    def start(self):
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
 
-    '''
-    def accept_eula(self, hashcat):
-        """Ensure we sign the EULA so that we don't have spinning hashcats"""
+debouncer = Debouncer()
 
-        eula = os.path.join(os.path.dirname(hashcat), 'eula.accepted')
-        with open(eula, 'w') as f:
-            f.write('1\0\0\0')
-    '''
+################################################################################
+# Metrics
+################################################################################
 
-    def call_hashcat(self, hash_num, hashes):
-        """Run hashcat against a list of hashes"""
+class Metric(object):
+    """
+    A Prometheus counter or gauge with a value per set of label values
 
-        hashcat, ruleset, wordlist = args.hashcat, args.ruleset, args.wordlist
+    Attributes:
+        name: Metric name, e.g. gladius_events_total
+        help: One line description shown with the metric
+        kind: counter or gauge
+        labels: Names of the labels the metric is broken down by
+    """
 
-        # self.accept_eula(hashcat)
+    def __init__(self, name, help, kind, labels=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        # tuple of label values -> value
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def inc(self, amount=1, **labels):
+        with self.lock:
+            self.values[self.key(labels)] += amount
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def format_labels(self, values, extra=()):
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for name, value in pairs) + '}'
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return ['{}{} {}'.format(self.name, self.format_labels(key), repr(float(value))) for key, value in values]
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} {}'.format(self.name, self.kind)]
+        return lines + self.samples()
+
+class CallbackGauge(Metric):
+    """A gauge whose values are read from a function at scrape time"""
+
+    def __init__(self, name, help, labels, callback):
+        super(CallbackGauge, self).__init__(name, help, 'gauge', labels)
+        self.callback = callback
+
+    def samples(self):
+        with self.lock:
+            self.values.clear()
+            for key, value in self.callback().items():
+                self.values[key] = value
+        return super(CallbackGauge, self).samples()
+
+class Histogram(Metric):
+    """A Prometheus histogram with cumulative buckets per set of label values"""
+
+    def __init__(self, name, help, buckets, labels=()):
+        super(Histogram, self).__init__(name, help, 'histogram', labels)
+        self.buckets = sorted(buckets)
+        # tuple of label values -> [counts per bucket..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts = self.values[key]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = sorted((key, list(counts)) for key, counts in self.values.items())
+
+        lines = []
+        for key, counts in values:
+            total = 0
+            for bound, count in zip(self.buckets + ['+Inf'], counts[:-1]):
+                total += count
+                lines.append('{}_bucket{} {}'.format(self.name, self.format_labels(key, [('le', bound)]), total))
+            lines.append('{}_sum{} {}'.format(self.name, self.format_labels(key), repr(counts[-1])))
+            lines.append('{}_count{} {}'.format(self.name, self.format_labels(key), total))
+        return lines
+
+class Metrics(object):
+    """Registry of every metric Gladius exposes, rendered in Prometheus text format"""
 
-        temp = self.get_junkfile()
-        for curr_hash in hashes:
-            temp.write(curr_hash + '\n')
-        temp.close()
+    def __init__(self):
+        self.metrics = []
 
-        outfile = self.get_outfile(suffix='ntlm')
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
 
-        # Spawn hashcat
-        command = [hashcat, '-m', hash_num, '-r', ruleset, '-o', outfile.name, temp.name, wordlist]
-        verbose(' '.join([str(x) for x in command]))
-        verbose("Hashcat command: {}".format([str(x) for x in command]))
-        res = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    def counter(self, name, help, labels=()):
+        return self.register(Metric(name, help, 'counter', labels))
 
-    def process(self, event):
-        data = self.get_lines(event)
+    def histogram(self, name, help, buckets, labels=()):
+        return self.register(Histogram(name, help, buckets, labels))
 
-        new_hashes = []
-        hash_type = 0
+    def gauge(self, name, help, labels, callback):
+        return self.register(CallbackGauge(name, help, labels, callback))
 
-        for line in data:
-            verbose("Responder: {}".format(line))
-            # Ignore blank lines
-            if not line:
-                continue
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
 
-            for curr_hash, curr_type in self.types:
-                if hash_type == 0:
-                    hash_type = curr_type
+class MetricsRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
 
-                if 'hashes' in event.src_path:
-                    # Handle smart_hash output
-                    hash_type = curr_type
+        body = metrics.render()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        verbose("Metrics: " + format % args)
+
+class MetricsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+def serve_metrics(port, address='127.0.0.1'):
+    """Serve the metrics over HTTP on a background thread"""
+    server = MetricsServer((address, port), MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+metrics = Metrics()
+
+events_received = metrics.counter('gladius_events_total', 'Filesystem events received', ['handler'])
+files_parsed = metrics.counter('gladius_files_parsed_total', 'Files (or appended parts of files) parsed', ['handler'])
+lines_parsed = metrics.counter('gladius_lines_parsed_total', 'Lines parsed', ['handler'])
+parse_seconds = metrics.histogram('gladius_parse_seconds', 'Time spent parsing new data from a file',
+                                  [0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30], ['handler'])
+hashes_queued = metrics.counter('gladius_hashes_queued_total', 'Hashes queued for cracking', ['mode'])
+quick_hashes = metrics.counter('gladius_quick_pass_hashes_total', 'Captures tried in the quick pass, by whether they cracked or went on to the cracker', ['mode', 'result'])
+jobs_started = metrics.counter('gladius_crack_jobs_started_total', 'Cracker processes started', ['mode'])
+crack_seconds = metrics.histogram('gladius_seen_to_cracked_seconds', 'Time from a hash being seen to it being cracked',
+                                  [1, 10, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600, 7 * 24 * 3600], ['mode'])
+
+metrics.gauge('gladius_cracker_processes', 'Cracker processes running', [],
+              lambda: {(): len(scheduler.running)})
+metrics.gauge('gladius_crack_jobs_queued', 'Crack jobs waiting for a free cracker', [],
+              lambda: {(): len(scheduler.queue) + len(scheduler.batches)})
+metrics.gauge('gladius_cracker_speed', 'Hashes per second of each running crack job', ['session', 'mode'],
+              lambda: dict(((session, mode), status.speed) for session, mode, status in scheduler.status()
+                           if status.updated))
+metrics.gauge('gladius_hashes', 'Hashes tracked, by type', ['type'],
+              lambda: dict(((name,), total) for name, (total, cracked) in stats.snapshot()['types'].items()))
+metrics.gauge('gladius_hashes_cracked', 'Hashes cracked, by type', ['type'],
+              lambda: dict(((name,), cracked) for name, (total, cracked) in stats.snapshot()['types'].items()))
 
-                    # Check for hashdump output
-                    if line.count(':') != 3 and line.count(':') != 6:
-                        continue
+################################################################################
+# Engagement state
+################################################################################
 
-                    # Ignore service accounts
-                    if '$' in line:
-                        continue
+class CrackStats(object):
+    """
+    Running totals of the hashes Gladius tracks and how many are cracked,
+    kept up to date as hashes are registered and cracked so nothing has to
+    rescan ntlm_hashes. NTLM hashes count once per user, as the same hash
+    can belong to many accounts.
 
-                    # If we receive spooled output, remove the color
-                    line = line.replace('\x1b[1m\x1b[32m[+]\x1b[0m \t', '')
-                    username = line.split(':')[0]
-                    hash = line.split(':')[3]
+    Totals are broken down by hash type, source file and the hour the hash
+    was first seen.
+    """
 
-                    if hash not in new_hashes:
-                        new_hashes.append(hash)
+    def __init__(self):
+        self.total = 0
+        self.cracked = 0
+        # key -> [total, cracked]
+        self.types = defaultdict(lambda: [0, 0])
+        self.sources = defaultdict(lambda: [0, 0])
+        self.hours = defaultdict(lambda: [0, 0])
+        self.changed = False
+        self.lock = threading.Lock()
+
+    def buckets(self, mode, source, seen):
+        hour = datetime.datetime.fromtimestamp(seen).strftime('%Y-%m-%d %H:00')
+        return (self.types[hash_names.get(mode, mode)],
+                self.sources[os.path.basename(source) if source else 'unknown'],
+                self.hours[hour])
+
+    def add(self, mode, source, seen, cracked=False):
+        with self.lock:
+            self.total += 1
+            self.cracked += cracked
+            for bucket in self.buckets(mode, source, seen):
+                bucket[0] += 1
+                bucket[1] += cracked
+            self.changed = True
+
+    def crack(self, mode, source, seen):
+        with self.lock:
+            self.cracked += 1
+            for bucket in self.buckets(mode, source, seen):
+                bucket[1] += 1
+            self.changed = True
+
+    def format(self, cracked=None, total=None):
+        """Format totals as (cracked/total percentage%)"""
+        cracked = self.cracked if cracked is None else cracked
+        total = self.total if total is None else total
+        percentage = (cracked * 100.0 / total) if total else 0
+        return "({}/{} {:.2f}%)".format(cracked, total, percentage)
+
+    def snapshot(self):
+        """Return a copy of the totals for other consumers"""
+        with self.lock:
+            return {
+                'total': self.total,
+                'cracked': self.cracked,
+                'types': dict((key, tuple(value)) for key, value in self.types.items()),
+                'sources': dict((key, tuple(value)) for key, value in self.sources.items()),
+                'hours': dict((key, tuple(value)) for key, value in self.hours.items()),
+            }
+
+    def summary(self):
+        """Return the breakdown as lines for the console"""
+        snapshot = self.snapshot()
+        self.changed = False
+        lines = ['Cracked {}'.format(self.format(snapshot['cracked'], snapshot['total']))]
+        for title, key in [('Type', 'types'), ('Source', 'sources'), ('First seen', 'hours')]:
+            for name, (total, cracked) in sorted(snapshot[key].items()):
+                lines.append('  {:<10} {:<40} {}'.format(title, name, self.format(cracked, total)))
+        return lines
+
+stats = CrackStats()
+
+class Journal(object):
+    """
+    Append-only log of the engagement state: every hash and user seen, every
+    password cracked and every state change of a crack job. Replaying it
+    after a restart or crash rebuilds ntlm_hashes and finds the crack jobs
+    that still need to run.
+    """
 
-                    if hash not in ntlm_hashes:
-                        ntlm_hashes[hash]['time'] = datetime.datetime.now()
-                        ntlm_hashes[hash]['users'] = []
-                        ntlm_hashes[hash]['password'] = ''
+    def __init__(self):
+        self.path = None
+        self.journal = None
+        self.lock = threading.Lock()
+
+    def open(self, path):
+        self.path = path
+        self.journal = open(path, 'a')
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def dumps(self, fields):
+        """JSON encode a record, with its password in $HEX[..] notation if need be"""
+        if fields.get('password'):
+            fields = dict(fields, password=encode_password(fields['password']))
+        return json.dumps(fields)
+
+    def write(self, op, sync=False, **fields):
+        """Append a record. With sync, make sure it is on disk before returning"""
+        if self.journal is None:
+            return
 
-                    if username not in ntlm_hashes[hash]['users']:
-                        info("New hash to crack: {}:{}".format(username, hash))
-                        ntlm_hashes[hash]['users'].append(username)
+        fields['op'] = op
+        with self.lock:
+            self.journal.write(self.dumps(fields) + '\n')
+            self.journal.flush()
+            if sync:
+                os.fsync(self.journal.fileno())
 
-                elif curr_hash.lower() in event.src_path.lower():
-                    hash_type = curr_type
-                    info("New hash to crack: {}".format(line))
-                    new_hashes.append(line)
+    def replay(self, path):
+        """Yield the records of a journal, skipping a torn final line"""
+        if not os.path.exists(path):
+            return
 
-        if new_hashes and hash_type != 0:
-            self.call_hashcat(hash_type, new_hashes)
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    warning("Skipping damaged journal record: {}".format(line.strip()))
+                    continue
 
-class SecretsdumpHandler(GladiusHandler):
-    """
-    Watch for new secretsdump files and run john against them
+                if record.get('password'):
+                    record['password'] = decode_password(record['password'])
+                yield record
+
+    def restore(self, path):
+        """
+        Rebuild ntlm_hashes from the journal at path and compact it down to the
+        current state. Returns the journal records of the unfinished crack jobs.
+        """
+        jobs = OrderedDict()
+        for record in self.replay(path):
+            op = record.get('op')
+            if op == 'hash':
+                register_hash(record['hash'], record['user'], source=record.get('source'), seen=record['time'])
+            elif op == 'crack':
+                mark_cracked(record['hash'], record['password'])
+            elif op == 'capture':
+                register_capture(record['hash'], record['mode'], source=record.get('source'), seen=record['time'])
+            elif op == 'capture_crack':
+                mark_capture_cracked(record['hash'], record['password'])
+            elif op == 'representative':
+                entry = captures.get(record['hash'].lower())
+                if entry is not None:
+                    account = account_key(entry)
+                    representatives[account] = entry
+                    # A promoted capture is no longer held
+                    held_captures[account] = [held for held in held_captures[account]
+                                              if held[0].lower() != record['hash'].lower()]
+            elif op == 'held':
+                entry = captures.get(record['hash'].lower())
+                if entry is not None:
+                    held_captures[account_key(entry)].append((record['hash'], record['outpath']))
+            elif op == 'cached':
+                register_cached(record['hash'], record['user'], source=record.get('source'), seen=record['time'])
+            elif op == 'cached_crack':
+                mark_cached_cracked(record['hash'], record['password'])
+            elif op == 'job':
+                jobs[record['session']] = record
+
+        unfinished = [job for job in jobs.values() if job['state'] not in ('done', 'failed', 'cancelled')]
+
+        # Held captures of an account that cracked were settled along with it
+        for account in list(held_captures):
+            if not held_captures[account] or any(other['password'] for other in capture_accounts[account]):
+                del held_captures[account]
+
+        temp = path + '.tmp'
+        with open(temp, 'w') as f:
+            for hash, entry in ntlm_hashes.items():
+                for username in entry.get('users', []):
+                    seen = time.mktime(entry['time'].timetuple())
+                    f.write(json.dumps({'op': 'hash', 'hash': hash, 'user': username,
+                                        'source': entry['sources'].get(username), 'time': seen}) + '\n')
+                if entry.get('password'):
+                    f.write(self.dumps({'op': 'crack', 'hash': hash, 'password': entry['password']}) + '\n')
+            for entry in captures.values():
+                f.write(json.dumps({'op': 'capture', 'hash': entry['hash'], 'mode': entry['mode'],
+                                    'source': entry['source'], 'time': entry['time']}) + '\n')
+                if entry['password']:
+                    f.write(self.dumps({'op': 'capture_crack', 'hash': entry['hash'],
+                                        'password': entry['password']}) + '\n')
+            for entry in cached_logons.values():
+                f.write(json.dumps({'op': 'cached', 'hash': entry['hash'], 'user': entry['user'],
+                                    'source': entry['source'], 'time': entry['time']}) + '\n')
+                if entry['password']:
+                    f.write(self.dumps({'op': 'cached_crack', 'hash': entry['hash'],
+                                        'password': entry['password']}) + '\n')
+            for entry in representatives.values():
+                f.write(json.dumps({'op': 'representative', 'hash': entry['hash']}) + '\n')
+            for held in held_captures.values():
+                for capture, outpath in held:
+                    f.write(json.dumps({'op': 'held', 'hash': capture, 'outpath': outpath}) + '\n')
+            for job in unfinished:
+                f.write(json.dumps(job) + '\n')
+        os.rename(temp, path)
+
+        return unfinished
+
+journal = Journal()
+
+class PotCache(object):
     """
+    Hash to password cache for unsalted NTLM hashes, kept across engagements.
 
-    patterns = ["*secretsdump*"]
+    Default local admin passwords and golden images mean the same NTLM
+    hashes show up on host after host. Hashes found here are reported
+    straight away instead of being sent to hashcat again. The cache is
+    stored in hashcat potfile format, so existing potfiles can be imported.
+    """
 
-    cache = set()
+    def __init__(self):
+        self.passwords = {}
+        self.potfile = None
+        self.lock = threading.Lock()
+
+    def open(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.load(path)
+        self.potfile = open(path, 'a')
+
+    def close(self):
+        if self.potfile is not None:
+            self.potfile.close()
+            self.potfile = None
+
+    def entries(self, path):
+        """Yield the (hash, password) NTLM entries of a potfile, skipping other hash types"""
+        with open(path, 'r') as f:
+            for line in f:
+                hash, sep, password = line.rstrip('\r\n').partition(':')
+                if not password or len(hash) != 32:
+                    continue
 
-    john_counter = 0
+                try:
+                    int(hash, 16)
+                except ValueError:
+                    continue
 
-    def accept_eula(self, hashcat):
-        """Ensure we sign the EULA so that we don't have spinning hashcats"""
+                # hashcat writes passwords with special characters as $HEX[..]
+                yield hash, decode_password(password)
 
-        eula = os.path.join(os.path.dirname(hashcat), 'eula.accepted')
-        with open(eula, 'w') as f:
-            f.write('1\0\0\0')
+    def load(self, path):
+        if not os.path.exists(path):
+            return
 
-    def call_hashcat(self, hash_num, hashes):
-        """Run hashcat against a list of hashes"""
+        for hash, password in self.entries(path):
+            self.add(hash, password, persist=False)
 
-        hashcat, ruleset, wordlist = args.hashcat, args.ruleset, args.wordlist
+    def import_potfile(self, path):
+        """
+        Add the NTLM entries of an existing potfile to the cache.
 
-        self.accept_eula(hashcat)
+        Returns:
+            Number of entries that were not already cached
+        """
+        return len([hash for hash, password in self.entries(path) if self.add(hash, password)])
 
-        temp = self.get_junkfile()
-        for curr_hash in hashes:
-            temp.write(curr_hash + '\n')
-        temp.close()
+    def get(self, hash):
+        return self.passwords.get(hash.lower())
 
-        outfile = self.get_outfile(suffix='ntlm')
+    def add(self, hash, password, persist=True):
+        """Cache a cracked hash, returning True if it was not already cached"""
+        hash = hash.lower()
+        with self.lock:
+            if hash in self.passwords:
+                return False
 
-        # Spawn hashcat
-        command = [hashcat, '-m', hash_num, '-r', ruleset, '-o', outfile.name, temp.name, wordlist]
-        verbose(' '.join([str(x) for x in command]))
-        verbose("Hashcat command: {}".format([str(x) for x in command]))
-        res = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.passwords[hash] = password
+            if persist and self.potfile is not None:
+                self.potfile.write('{}:{}\n'.format(hash, encode_password(password)))
+                self.potfile.flush()
+        return True
 
-    def call_john(self, hashes):
-        """Run john against a list of cached hashes"""
+potcache = PotCache()
 
-        wordlist = args.wordlist
+class CredentialLedger(object):
+    """
+    Every credential of the engagement, appended once to a JSON lines file
+    and indexed by user, domain, hash and source.
 
-        temp = self.get_junkfile()
-        for curr_hash in hashes:
-            temp.write(curr_hash + '\n')
-        temp.close()
-
-        outfile = self.get_outfile(suffix='john')
-        junkfile = self.get_junkfile()
-
-        # Spawn hashcat
-        command = ['john', '--format=mscash2', 
-                           '--wordlist={}'.format(wordlist), 
-                           '--pot={}'.format(outfile.name), temp.name,
-                           '--session={}'.format(junkfile)] # Sesssion necessary to run multiple johns
-        self.john_counter += 1
-        verbose(' '.join([str(x) for x in command]))
-        verbose("John command: {}".format([str(x) for x in command]))
-        res = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    A credential is kept once per account and hash, however often it is
+    cracked, reported or replayed from the journal, so finding a user's
+    password is a lookup instead of a search through result files.
+    """
 
-    def process(self, event):
-        data = self.get_lines(event)
+    fields = ['domain', 'user', 'password', 'hash', 'mode', 'source', 'time']
+    indexed = ['user', 'domain', 'hash', 'source']
 
-        mode = ''
-        new_hashes = []
-        cached_hashes = []
-        sc_creds = []
-        defaults = []
-        for line in data:
-            verbose("Secretsdump: {}".format(line))
-            # Ignore blank lines
-            if not line:
-                continue
+    def __init__(self):
+        self.entries = []
+        self.keys = set()
+        # field -> lowercased value -> entries
+        self.indexes = dict((field, defaultdict(list)) for field in self.indexed)
+        self.ledger = None
+        self.lock = threading.Lock()
+
+    def open(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.load(path)
+        self.ledger = open(path, 'a')
+
+    def close(self):
+        if self.ledger is not None:
+            self.ledger.close()
+            self.ledger = None
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
 
-            if 'Dumping local SAM hashes' in line:
-                mode = 'ntlm'
-                continue
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn by a crash mid-write
+                    continue
+                if entry.get('password'):
+                    self.add(entry.get('domain'), entry.get('user'), decode_password(entry['password']),
+                             hash=entry.get('hash'), mode=entry.get('mode'), source=entry.get('source'),
+                             seen=entry.get('time'), persist=False)
+
+    def add(self, domain, user, password, hash=None, mode=None, source=None, seen=None, persist=True):
+        """
+        Record a credential, returning True if it was not already in the ledger.
+
+        Args:
+            domain (str): Domain of the account, empty for local accounts
+            hash (str): Hash or capture the password was cracked from, if any
+            mode (str): Hashcat mode of the hash, or where a cleartext password came from
+            source (str): File the hash or password was found in
+        """
+        entry = {
+            'domain': domain or '',
+            'user': user or '',
+            'password': password,
+            'hash': hash,
+            'mode': mode,
+            'source': source,
+            'time': seen or time.time(),
+        }
+        key = (entry['domain'].lower(), entry['user'].lower(), (hash or '').lower(), password)
+
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            self.entries.append(entry)
+            for field in self.indexed:
+                if entry[field]:
+                    self.indexes[field][entry[field].lower()].append(entry)
+
+            if persist and self.ledger is not None:
+                self.ledger.write(self.dumps(entry) + '\n')
+                self.ledger.flush()
+        return True
+
+    def dumps(self, entry):
+        """JSON encode an entry, with its password in $HEX[..] notation if need be"""
+        return json.dumps(dict(entry, password=encode_password(entry['password'])))
+
+    def record(self, username, password, hash=None, mode=None, source=None):
+        """Record the credential of a DOMAIN\\user or plain username"""
+        domain, sep, user = username.rpartition('\\')
+        return self.add(domain, user, password, hash=hash, mode=mode, source=source)
+
+    def query(self, **filters):
+        """
+        Return the credentials matching every given field, case insensitively,
+        such as query(user='alice', domain='corp.local'). Without filters, all of them.
+        """
+        filters = dict((field, value.lower()) for field, value in filters.items() if value)
+        with self.lock:
+            if not filters:
+                return list(self.entries)
+
+            unknown = set(filters) - set(self.indexed)
+            if unknown:
+                raise ValueError("Can not look credentials up by {}".format(', '.join(sorted(unknown))))
+
+            # Start from the smallest index match and check the rest against it
+            field = min(filters, key=lambda field: len(self.indexes[field].get(filters[field], [])))
+            return [entry for entry in self.indexes[field].get(filters[field], [])
+                    if all((entry[other] or '').lower() == value for other, value in filters.items())]
+
+    def export(self, entries, out, format='text'):
+        """Write entries to out as Domain Username Password lines, csv or JSON lines"""
+        if format == 'csv':
+            writer = csv.writer(out)
+            writer.writerow(self.fields)
+            for entry in entries:
+                writer.writerow([entry[field] if entry[field] is not None else '' for field in self.fields])
+        elif format == 'json':
+            for entry in entries:
+                out.write(self.dumps(entry) + '\n')
+        else:
+            for entry in entries:
+                out.write('{} {} {}\n'.format(entry['domain'], entry['user'], entry['password']))
 
-            if 'Dumping cached domain logon' in line:
-                self.call_hashcat(hash_num='1000', hashes=new_hashes)
-                mode = 'mscash'
-                continue
+ledger = CredentialLedger()
 
-            if 'Dumping LSA Secrets' in line:
-                # self.call_john(hashes=cached_hashes)
-                mode = ''
-                continue
+################################################################################
+# Crack scheduling
+################################################################################
 
-            if '_SC_' in line:
-                mode = 'sc'
-                continue
+# Jobs with a lower priority run first. Fast unsalted hashes finish quickly,
+# so run them before tying the GPU up with the slow salted ones.
+hash_priorities = {
+    '1000': 0,  # NTLM
+    '5500': 1,  # NetNTLMv1
+    '5600': 2,  # NetNTLMv2
+    '2100': 3,  # DCC2, by far the slowest
+}
 
-            if 'DefaultPassword' in line:
-                mode = 'default'
-                continue
-            
-            if mode == 'default':
-                if line in defaults:
-                    continue
-                success("Default password: {}".format(line))
-                defaults.append(line)
-                mode = ''
-                continue
+# Values of the STATUS field in hashcat --machine-readable status lines
+hashcat_states = {
+    0: 'init',
+    1: 'autotune',
+    2: 'selftest',
+    3: 'running',
+    4: 'paused',
+    5: 'exhausted',
+    6: 'cracked',
+    7: 'aborted',
+    8: 'quit',
+    9: 'bypass',
+}
 
-            if mode == 'sc':
-                # Catch the '[*]' if it accidently goes by
-                if line in sc_creds or '[' in line:
-                    continue
-                outfile = self.get_outfile(suffix='sc_')
-                outfile.write(line + '\n')
-                success(line)
-                mode = ''
-                sc_creds.append(line)
-                continue
+# One tier of an attack plan: a wordlist, optionally with a hashcat rule
+# file, or a hashcat mask
+Attack = namedtuple('Attack', ['wordlist', 'ruleset', 'mask'])
 
-            if mode == 'ntlm' and line.count(':') == 6:
-                username = line.split(':')[0]
-                hash = line.split(':')[3]
+def describe_attack(attack):
+    if attack.mask:
+        return 'mask {}'.format(attack.mask)
+    if not attack.wordlist:
+        return 'default wordlist'
+    if attack.ruleset:
+        return '{} + {}'.format(os.path.basename(attack.wordlist), os.path.basename(attack.ruleset))
+    return os.path.basename(attack.wordlist)
 
-                if hash not in new_hashes:
-                    new_hashes.append(hash)
+def load_attack_plan(path):
+    """
+    Read an attack plan: a JSON object of hash mode, or "default" for every
+    other mode, to a list of tiers tried in order, such as
 
-                if hash not in ntlm_hashes:
-                    ntlm_hashes[hash]['time'] = datetime.datetime.now()
-                    ntlm_hashes[hash]['users'] = []
-                    ntlm_hashes[hash]['password'] = ''
+        {"default": [{"wordlist": "top1000.txt"},
+                     {"wordlist": "rockyou.txt", "ruleset": "hob064.rule"},
+                     {"mask": "?u?l?l?l?l?l?d?d"}]}
 
-                if username not in ntlm_hashes[hash]['users']:
-                    info("New hash to crack: {}:{}".format(username, hash))
-                    ntlm_hashes[hash]['users'].append(username)
+    Returns:
+        dict of hash mode to a list of Attack
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    plans = {}
+    for mode, tiers in data.items():
+        plan = []
+        for tier in tiers:
+            attack = Attack(tier.get('wordlist'), tier.get('ruleset'), tier.get('mask'))
+            if not attack.wordlist and not attack.mask:
+                raise ValueError("Tier {} for mode {} needs a wordlist or a mask".format(len(plan) + 1, mode))
+            plan.append(attack)
+        if plan:
+            plans[str(mode)] = plan
+    return plans
+
+class JobStatus(object):
+    """
+    Live progress of a crack job, taken from the status lines hashcat prints
+    with --status --machine-readable:
 
-            if mode == 'mscash' and line.count(':') == 6:
-                user_pass = '#'.join(line.split(':')[:2])
-                curr_hash = '$DCC2$10240#{}'.format(user_pass)
-                verbose("New cache hash to crack: {}".format(user_pass))
-                if curr_hash not in cached_hashes:
-                    cached_hashes.append(curr_hash)
+        STATUS 3 SPEED 1024 1000 2048 1000 ... PROGRESS 100 1000 RECHASH 1 5 ...
 
-class CredsHandler(GladiusHandler):
+    Each field name is followed by its values. SPEED holds a
+    (hashes, milliseconds) pair for every device.
     """
-    Watch for new hash files and run hashcat against them
-    """
-    patterns = ['*ntlm*']
 
-    def process(self, event):
-        with open(event.src_path, 'r') as f:
-            data = f.read().split('\n')
+    fields = ['STATUS', 'SPEED', 'EXEC_RUNTIME', 'CURKU', 'PROGRESS', 'RECHASH',
+              'RECSALT', 'TEMP', 'REJECTED', 'UTIL']
 
-        outfile = self.get_outfile()
+    def __init__(self):
+        self.state = 'queued'
+        # Hashes per second of every device
+        self.speeds = []
+        self.progress = (0, 0)
+        self.recovered = (0, 0)
+        # Progress per second, from the last two status lines
+        self.rate = None
+        self.updated = None
+
+    def update(self, line, now=None):
+        """Update from a status line, returning False if it is not one"""
+        tokens = line.split()
+        if not tokens or tokens[0] != 'STATUS':
+            return False
+
+        values = defaultdict(list)
+        field = None
+        for token in tokens:
+            if token in self.fields:
+                field = token
+            elif field:
+                try:
+                    values[field].append(int(token))
+                except ValueError:
+                    pass
+
+        now = now or time.time()
+        if values['STATUS']:
+            self.state = hashcat_states.get(values['STATUS'][0], str(values['STATUS'][0]))
+
+        speed = values['SPEED']
+        self.speeds = [hashes * 1000.0 / ms if ms else 0.0 for hashes, ms in zip(speed[::2], speed[1::2])]
+
+        if len(values['PROGRESS']) == 2:
+            self.update_progress(tuple(values['PROGRESS']), now)
+
+        if len(values['RECHASH']) == 2:
+            self.recovered = tuple(values['RECHASH'])
+        return True
+
+    def update_progress(self, progress, now=None):
+        """Record (done, total) progress and the rate it is being made at"""
+        now = now or time.time()
+        if self.updated and now > self.updated and progress[0] >= self.progress[0]:
+            self.rate = (progress[0] - self.progress[0]) / (now - self.updated)
+        self.progress = progress
+        self.updated = now
+
+    @property
+    def speed(self):
+        return sum(self.speeds)
+
+    @property
+    def percent(self):
+        done, total = self.progress
+        return done * 100.0 / total if total else 0.0
+
+    @property
+    def eta(self):
+        """Seconds until the keyspace is exhausted, or None if unknown"""
+        done, total = self.progress
+        if not self.rate:
+            return None
+        return int((total - done) / self.rate)
+
+    def format(self):
+        eta = self.eta
+        eta = str(datetime.timedelta(seconds=eta)) if eta is not None else '?'
+        devices = ' '.join(['{:.0f}'.format(speed) for speed in self.speeds])
+        return '{:<9} {:>6.2f}% {:>14.0f} H/s [{}] ETA {} recovered {}/{}'.format(
+            self.state, self.percent, self.speed, devices, eta, self.recovered[0], self.recovered[1])
+
+class CrackJob(object):
+    """
+    A batch of hashes of a single hashcat mode to crack in one run
 
-        for line in data:
-            verbose("Creds: {}".format(line))
-            line = line.split(':')
-            if len(line) == 2:
-                hash, password = line
-                if not line[1]:
-                    continue
-                if ntlm_hashes[hash].get('password', ''):
-                    # Already cracked it
-                    continue
+    Attributes:
+        mode: Hashcat hash mode of every hash in the job
+        hashes: Hashes to crack, in the order they were submitted
+        submitted: Lowercased hash -> the hash as submitted, to match what
+            a cracker writes back in its own case
+        outpath: Output directory of the handler the hashes came from
+        session: Session name, used to restore the job after a restart
+        hashfile: File the hashes are written to once the job is queued
+        outfile: File the cracker writes the cracked results to
+        restore: Resume the job from its hashcat restore file
+        tier: Position of the job's attack in the attack plan for its mode
+        attack: Attack the job runs, taken from the attack plan when it is started unless given
+        planned: The attack comes from the attack plan, and uncracked hashes move on to its next tier
+        part: (index, count) to only try that part of the attack's candidates, or None for all of them
+        results: Tail of the outfile, read as hashcat writes to it
+        status: Live progress reported by the cracker
+        backend: CrackerBackend cracking the job once it is started
+        proc: Cracker process, or anything with Popen's poll, returncode and terminate
+        cancelled: The job was cancelled and is not to be resumed
+    """
 
-                cracked_stats = get_cracked_stats()
-                usernames = ', '.join(ntlm_hashes[hash]['users'])
-                crack_time = datetime.datetime.now() - ntlm_hashes[hash]['time']
+    def __init__(self, mode, outpath, session=None, tier=0, attack=None):
+        self.mode = str(mode)
+        self.outpath = outpath
+        self.session = session
+        self.tier = tier
+        self.attack = attack
+        self.planned = attack is None
+        self.part = None
+        self.hashes = []
+        self.seen = set()
+        self.submitted = {}
+        self.created = time.time()
+        self.hashfile = None
+        self.outfile = None
+        self.restore = False
+        self.results = FileTail()
+        self.status = JobStatus()
+        self.backend = None
+        self.proc = None
+        self.cancelled = False
+
+    def add(self, hashes):
+        for curr_hash in hashes:
+            if curr_hash in self.seen:
+                continue
+            self.seen.add(curr_hash)
+            self.submitted.setdefault(curr_hash.lower(), curr_hash)
+            self.hashes.append(curr_hash)
+
+    def remove(self, hashes):
+        """Drop hashes from the job, returning True if any were in it"""
+        if self.seen.isdisjoint(hashes):
+            return False
+        self.hashes = [curr_hash for curr_hash in self.hashes if curr_hash not in hashes]
+        self.seen.difference_update(hashes)
+        self.submitted = dict((curr_hash.lower(), curr_hash) for curr_hash in reversed(self.hashes))
+        return True
+
+    @property
+    def priority(self):
+        # Every cheap first attack runs before the expensive later ones
+        return self.tier, hash_priorities.get(self.mode, len(hash_priorities))
 
-                cred = '[{}] {} {} : {}'.format(crack_time, cracked_stats, usernames, password)
-                success("New creds: {}".format(cred))
-                ntlm_hashes[line[0]]['password'] = password
-            else:
-                try:
-                    cred = '{} {} {}'.format(line[2], line[0], line[-1])
-                except IndexError:
-                    continue
+################################################################################
+# Cracker backends
+################################################################################
 
-                if art:
-                    print create_sword(cred)
-                else:
-                    success("New creds: {}".format(cred))
+def md4(data):
+    """MD4 digest of data, in pure python where OpenSSL no longer offers it"""
+    try:
+        return hashlib.new('md4', data).digest()
+    except ValueError:
+        pass
 
+    mask = 0xffffffff
+    rotl = lambda x, n: ((x << n) | (x >> (32 - n))) & mask
+
+    length = len(data) * 8
+    data += '\x80' + '\x00' * ((55 - len(data)) % 64) + struct.pack('<Q', length)
+
+    state = [0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476]
+    for offset in range(0, len(data), 64):
+        x = struct.unpack('<16I', data[offset:offset + 64])
+        a, b, c, d = state
+
+        for i in (0, 4, 8, 12):
+            a = rotl((a + ((b & c) | (~b & d)) + x[i]) & mask, 3)
+            d = rotl((d + ((a & b) | (~a & c)) + x[i + 1]) & mask, 7)
+            c = rotl((c + ((d & a) | (~d & b)) + x[i + 2]) & mask, 11)
+            b = rotl((b + ((c & d) | (~c & a)) + x[i + 3]) & mask, 19)
+
+        for i in (0, 1, 2, 3):
+            a = rotl((a + ((b & c) | (b & d) | (c & d)) + x[i] + 0x5a827999) & mask, 3)
+            d = rotl((d + ((a & b) | (a & c) | (b & c)) + x[i + 4] + 0x5a827999) & mask, 5)
+            c = rotl((c + ((d & a) | (d & b) | (a & b)) + x[i + 8] + 0x5a827999) & mask, 9)
+            b = rotl((b + ((c & d) | (c & a) | (d & a)) + x[i + 12] + 0x5a827999) & mask, 13)
+
+        for i in (0, 2, 1, 3):
+            a = rotl((a + (b ^ c ^ d) + x[i] + 0x6ed9eba1) & mask, 3)
+            d = rotl((d + (a ^ b ^ c) + x[i + 8] + 0x6ed9eba1) & mask, 9)
+            c = rotl((c + (d ^ a ^ b) + x[i + 4] + 0x6ed9eba1) & mask, 11)
+            b = rotl((b + (c ^ d ^ a) + x[i + 12] + 0x6ed9eba1) & mask, 15)
+
+        state = [(value + new) & mask for value, new in zip(state, [a, b, c, d])]
+
+    return struct.pack('<4I', *state)
+
+def widen(string):
+    """UTF-16LE the way hashcat does it, each byte followed by a zero byte"""
+    return ''.join(char + '\x00' for char in string)
+
+def ntlm_hash(password):
+    return md4(widen(password))
+
+def ntlm_checker(hash):
+    target = hash.lower().decode('hex')
+    return lambda nt: nt == target
+
+def netntlmv2_checker(capture):
+    # user::domain:server challenge:NTProofStr:blob
+    fields = capture.split(':')
+    identity = widen(fields[0].upper() + fields[2])
+    challenge = fields[3].decode('hex') + fields[5].decode('hex')
+    proof = fields[4].lower().decode('hex')
+
+    def check(nt):
+        key = hmac.new(nt, identity, hashlib.md5).digest()
+        return hmac.new(key, challenge, hashlib.md5).digest() == proof
+    return check
+
+def dcc2_checker(hash):
+    # $DCC2$iterations#user#hash, salted twice with the lowercased username
+    iterations, user, digest = hash[len('$DCC2$'):].split('#')
+    salt = widen(user.lower())
+    target = digest.lower().decode('hex')
+
+    def check(nt):
+        return hashlib.pbkdf2_hmac('sha1', md4(nt + salt), salt, int(iterations), 16) == target
+    return check
+
+def des_key(key):
+    """Spread 7 key bytes over the 8 bytes DES takes, leaving the parity bits out"""
+    bits = int(key.encode('hex'), 16)
+    return ''.join(chr(((bits >> (49 - 7 * i)) & 0x7f) << 1) for i in range(8))
+
+def netntlmv1_checker(capture):
+    # user::domain:LM response:NT response:server challenge
+    fields = capture.split(':')
+    lm_response = fields[3].decode('hex')
+    nt_response = fields[4].lower().decode('hex')
+    challenge = fields[5].decode('hex')
+    if len(nt_response) != 24:
+        raise ValueError("NT response is not 24 bytes")
+
+    # With extended session security the LM response holds the client
+    # challenge, which is mixed into the challenge that was encrypted
+    if len(lm_response) == 24 and lm_response[8:] == '\x00' * 16:
+        challenge = hashlib.md5(challenge + lm_response[:8]).digest()[:8]
+
+    def check(nt):
+        key = nt + '\x00' * 5
+        for i in range(3):
+            if DES.new(des_key(key[i * 7:i * 7 + 7]), DES.MODE_ECB).encrypt(challenge) != nt_response[i * 8:i * 8 + 8]:
+                return False
+        return True
+    return check
+
+# Hash modes the in-process backend cracks. Each takes a hash and returns a
+# check of a candidate's NTLM hash against it.
+nt_checkers = {
+    '1000': ntlm_checker,
+    '2100': dcc2_checker,
+    '5600': netntlmv2_checker,
+}
 
-            outfile.write(cred + '\n')
+if DES is not None:
+    nt_checkers['5500'] = netntlmv1_checker
 
-class CashCredsHandler(GladiusHandler):
+class CrackerBackend(object):
     """
-    Watch for new cached hash files and extract password
+    Something that cracks the hashes of a CrackJob. The scheduler writes the
+    job's hashes to job.hashfile, if the backend reads them from there, and
+    then drives the backend:
+
+        start(job, restore_file)  Start cracking, from restore_file if job.restore
+        poll(job)                 None while cracking, else the exit code
+        results(job, final)       (hash, password) pairs found since the last call
+        cancel(job)               Stop cracking
+        cleanup(job, restore_file) Remove what the backend left on disk
+
+    Exit codes follow hashcat: 0 is every hash cracked, 1 is the candidates
+    ran out, 255 is a failure and anything else was cut short. The job's
+    progress is kept in job.status.
+
+    The base class runs job.proc, anything with Popen's poll(), returncode
+    and terminate(), and reads hash:hex(password) lines from job.outfile.
+
+    Backends that take the hashes from job.hashes instead of job.hashfile
+    set hashfile to False, so that where no restore is needed the hashes
+    never have to be written to disk.
     """
-    patterns = ['*john*']
 
-    def process(self, event):
-        data = self.get_lines(event)
-        outfile = self.get_outfile()
+    name = None
+    hashfile = True
 
-        for line in data:
-            verbose("Cached creds: {}".format(line))
-            try:
-                username = line.split('#')[1]
-                password = line.split(':')[1]
-            except IndexError:
-                continue
+    def start(self, job, restore_file):
+        raise NotImplementedError
 
-            cred = '{} {}'.format(username, password)
-            if art:
-                print create_sword(cred)
-            else:
-                success("New creds: {}".format(cred))
+    def poll(self, job):
+        return job.proc.poll()
 
-            outfile.write(cred + '\n')
+    def returncode(self, job):
+        return job.proc.returncode
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-v', '--verbose', action="store_true", default=False, help="Increased output verbosity")
-    parser.add_argument('--responder-dir', default="/usr/share/responder", help="Directory to watch for Responder output")
-    parser.add_argument('--hashcat', default="/usr/share/hashcat/hashcat.bin", help="Path to hashcat binary")
-    parser.add_argument('-r', '--ruleset', default="hob064.rule", help="Ruleset to use with hashcat")
-    parser.add_argument('-w', '--wordlist', default="/usr/share/wordlists/rockyou.txt", help="Wordlist to use with hashcat")
-    parser.add_argument('--no-art', action="store_true", default=False, help="Disable the sword ascii art for displaying credentials and default to only text.")
-    args = parser.parse_args()
+    def results(self, job, final=False):
+        found = []
+        for line in job.results.read(job.outfile, final=final):
+            hash, sep, password = line.rpartition(':')
+            if not sep:
+                continue
 
-    for curr_arg in [args.hashcat, args.ruleset, args.wordlist]:
-        if not os.path.exists(curr_arg):
-            warning("Argument not found: {}. Ensure the file exists.".format(curr_arg))
-            exit(1)
+            try:
+                found.append((hash, password.decode('hex')))
+            except TypeError:
+                warning("Unexpected {} result: {}".format(self.name, line))
+        return found
 
-    verbosity = args.verbose
-    if args.no_art:
-        print color('Awe, no swords? Okay, fine..', color='yellow')
-        art = False
+    def cancel(self, job):
+        if job.proc is not None and job.proc.poll() is None:
+            job.proc.terminate()
 
-    print_banner()
+    def cleanup(self, job, restore_file):
+        pass
+
+    def attack(self, job):
+        """The job's attack, or the backend's own wordlist and rules if it has none"""
+        if job.attack and (job.attack.wordlist or job.attack.mask):
+            return job.attack
+        return Attack(getattr(self, 'wordlist', None), getattr(self, 'ruleset', None), None)
+
+    def spawn(self, job, command):
+        verbose(' '.join([str(x) for x in command]))
+        verbose("{} command: {}".format(self.name.capitalize(), [str(x) for x in command]))
+
+        with open(os.devnull, 'w') as devnull:
+            job.proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=devnull)
+
+        thread = threading.Thread(target=self.watch, args=(job,))
+        thread.daemon = True
+        thread.start()
+
+    def watch(self, job):
+        """Read the cracker's output until it exits. Reading also keeps the pipe from filling up"""
+        for line in iter(job.proc.stdout.readline, ''):
+            job.status.update(line)
+
+class HashcatBackend(CrackerBackend):
+    """
+    Crack with hashcat, as a named session that can be restored.
+
+    hashcat prints a machine readable status line every `status_timer`
+    seconds, which is read into the job's JobStatus.
+    """
+
+    name = 'hashcat'
+
+    def __init__(self, hashcat, ruleset, wordlist, outfile_format='5', status_timer=10):
+        self.hashcat = hashcat
+        self.ruleset = ruleset
+        self.wordlist = wordlist
+        self.outfile_format = outfile_format
+        self.status_timer = status_timer
+
+    def accept_eula(self):
+        """Ensure we sign the EULA so that we don't have spinning hashcats"""
+
+        eula = os.path.join(os.path.dirname(self.hashcat), 'eula.accepted')
+        with open(eula, 'w') as f:
+            f.write('1\0\0\0')
+
+    def start(self, job, restore_file):
+        # Only old hashcats ask for it, next to the binary
+        if os.path.isdir(os.path.dirname(self.hashcat)):
+            self.accept_eula()
+
+        attack = self.attack(job)
+        if job.restore and os.path.exists(restore_file):
+            command = [self.hashcat, '--session', job.session, '--restore', '--restore-file-path', restore_file]
+        else:
+            command = [self.hashcat, '--session', job.session, '--restore-file-path', restore_file,
+                       '--status', '--status-timer', str(self.status_timer), '--machine-readable',
+                       '-m', job.mode]
+            if attack.mask:
+                command += ['-a', '3']
+            elif attack.ruleset:
+                command += ['-r', attack.ruleset]
+            if job.part:
+                skip, limit = self.part_range(job, attack)
+                if not limit:
+                    # More parts than candidates, this one has none to try
+                    job.proc = InProcessCrack(lambda cancelled: 1)
+                    job.status.state = 'exhausted'
+                    return
+                command += ['--skip', str(skip), '--limit', str(limit)]
+            command += ['-o', job.outfile, '--outfile-format', self.outfile_format, job.hashfile,
+                        attack.mask or attack.wordlist]
+        self.spawn(job, command)
+
+    def part_range(self, job, attack):
+        """(skip, limit) of job.part in the base words or mask positions hashcat counts its keyspace in"""
+        command = [self.hashcat, '--keyspace', '-m', job.mode]
+        if attack.mask:
+            command += ['-a', '3', attack.mask]
+        else:
+            if attack.ruleset:
+                command += ['-r', attack.ruleset]
+            command += [attack.wordlist]
+
+        with open(os.devnull, 'w') as devnull:
+            keyspace = int(subprocess.check_output(command, stderr=devnull).split()[-1])
+
+        index, count = job.part
+        skip = keyspace * index // count
+        return skip, keyspace * (index + 1) // count - skip
+
+class JohnBackend(CrackerBackend):
+    """
+    Crack with John the Ripper, writing to a pot file per job.
+
+    John writes hashes to its pot file in its own notation, such as
+    $NETNTLMv2$USERDOMAIN$challenge$proof$blob, so results are matched back
+    to the job's hashes by the field that identifies each of them.
+    """
+
+    name = 'john'
+
+    formats = {
+        '1000': 'nt',
+        '2100': 'mscash2',
+        '5500': 'netntlm',
+        '5600': 'netntlmv2',
+    }
+
+    def __init__(self, john, wordlist):
+        self.john = john
+        self.wordlist = wordlist
+        # session -> identifying field -> hash
+        self.lookups = {}
+
+    @staticmethod
+    def identity(hash):
+        """The part of a hash john keeps as-is: the NT response of a capture, else the digest"""
+        if ':' in hash:
+            return hash.split(':')[4].lower()
+        return hash.replace('#', '$').split('$')[-1].lower()
+
+    def start(self, job, restore_file):
+        lookup = {}
+        with open(job.hashfile, 'r') as f:
+            for line in f:
+                hash = line.strip()
+                if hash:
+                    lookup[self.identity(hash)] = hash
+        self.lookups[job.session] = lookup
+
+        # john adds .rec to the session name for its restore file
+        session = os.path.splitext(restore_file)[0]
+        attack = self.attack(job)
+        if job.restore and os.path.exists(session + '.rec'):
+            command = [self.john, '--restore={}'.format(session)]
+        else:
+            # hashcat rule files are not john rules, so rules are left out
+            if attack.mask:
+                candidates = '--mask={}'.format(attack.mask)
+            else:
+                candidates = '--wordlist={}'.format(attack.wordlist)
+            command = [self.john, '--format={}'.format(self.formats.get(job.mode, job.mode)),
+                       candidates, '--pot={}'.format(job.outfile),
+                       '--session={}'.format(session)]
+            if job.part:
+                command += ['--node={}/{}'.format(job.part[0] + 1, job.part[1])]
+            command += [job.hashfile]
+        self.spawn(job, command)
+        job.status.state = 'running'
+
+    def returncode(self, job):
+        # john exits 0 whether or not everything cracked
+        returncode = job.proc.returncode
+        if returncode == 0:
+            return 1
+        return 255 if returncode > 0 else returncode
+
+    def results(self, job, final=False):
+        lookup = self.lookups.get(job.session, {})
+        found = []
+        for line in job.results.read(job.outfile, final=final):
+            pot_hash, sep, password = line.partition(':')
+            for field in pot_hash.replace('#', '$').split('$'):
+                if field.lower() in lookup:
+                    found.append((lookup[field.lower()], password))
+                    break
+        return found
+
+    def cleanup(self, job, restore_file):
+        self.lookups.pop(job.session, None)
+        session = os.path.splitext(restore_file)[0]
+        for path in (session + '.rec', session + '.log'):
+            if os.path.exists(path):
+                os.remove(path)
+
+class InProcessCrack(object):
+    """A crack running in a thread of this process, with the parts of Popen the scheduler uses"""
+
+    def __init__(self, target):
+        self.returncode = None
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(target,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, target):
+        try:
+            returncode = target(self.cancelled)
+        except Exception as e:
+            error("In-process crack failed: {}".format(e))
+            returncode = 255
+        self.returncode = returncode
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.cancelled.set()
+
+class InProcessBackend(CrackerBackend):
+    """
+    Crack in this process by trying every word of a wordlist, without rules.
+
+    Needs no GPU or external cracker, so it suits short wordlists, hosts
+    without hashcat, and tests. Only the modes in nt_checkers are supported,
+    and the rules and masks of attack plans are not. The restore file holds
+    how many words were tried.
+    """
+
+    name = 'inprocess'
+    hashfile = False
+
+    def __init__(self, wordlist, checkers=nt_checkers):
+        self.wordlist = wordlist
+        self.checkers = checkers
+
+    def start(self, job, restore_file):
+        skip = 0
+        if job.restore and os.path.exists(restore_file):
+            with open(restore_file, 'r') as f:
+                skip = int(f.read().strip() or 0)
+        job.proc = InProcessCrack(lambda cancelled: self.crack(job, restore_file, skip, cancelled))
+
+    def crack(self, job, restore_file, skip, cancelled):
+        attack = self.attack(job)
+        if attack.mask:
+            error("The in-process cracker can not run masks")
+            return 255
+        wordlist = attack.wordlist
+
+        checkers = OrderedDict()
+        for hash in list(job.hashes):
+            try:
+                checkers[hash] = self.checkers[job.mode](hash)
+            except KeyError:
+                error("The in-process cracker does not support mode {}".format(job.mode))
+                return 255
+            except (ValueError, TypeError, IndexError):
+                warning("Skipping malformed hash: {}".format(hash))
+
+        total = len(checkers)
+        with open(wordlist, 'r') as f:
+            words = sum(1 for line in f)
+
+        # Only the words of this job's part of the wordlist
+        first, end = 0, words
+        if job.part:
+            index, count = job.part
+            first, end = words * index // count, words * (index + 1) // count
+        skip = max(skip, first)
+
+        status = job.status
+        status.state = 'running'
+        start = last = time.time()
+        done = skip
+        with open(wordlist, 'r') as f, open(job.outfile, 'a') as out:
+            for index, password in enumerate(f):
+                if index < skip:
+                    continue
+                if not checkers or index >= end:
+                    break
+                if cancelled.is_set():
+                    return -15
+
+                password = password.rstrip('\r\n')
+                nt = ntlm_hash(password)
+                for hash, check in checkers.items():
+                    if check(nt):
+                        out.write('{}:{}\n'.format(hash, password.encode('hex')))
+                        out.flush()
+                        del checkers[hash]
+                done = index + 1
+
+                now = time.time()
+                if now - last >= 1:
+                    status.speeds = [(done - skip) * len(checkers) / (now - start)]
+                    status.update_progress((done - first, end - first), now)
+                    status.recovered = (total - len(checkers), total)
+                    with open(restore_file, 'w') as restore:
+                        restore.write(str(done))
+                    last = now
+
+        status.update_progress((done - first, end - first))
+        status.recovered = (total - len(checkers), total)
+        status.state = 'exhausted' if checkers else 'cracked'
+        return 1 if checkers else 0
+
+class CrackScheduler(object):
+    """
+    Central queue for every crack job Gladius runs.
+
+    Hashes of the same mode submitted within `window` seconds of each other
+    are coalesced into a single job, so a burst of captures is one cracker
+    run instead of dozens. Jobs are started in priority order, with at most
+    `max_jobs` running at once.
+
+    Each job is handed to the cracker backend `routes` names for its mode,
+    hashcat unless configured otherwise. `plans` gives each mode a list of
+    attacks, tried in order. When an attack runs out, the hashes it did not
+    crack move on to a job for the next attack. Every job has a session name with
+    its files under `sessionpath`, and its progress is journaled, so that a
+    job cut short by a restart is resumed instead of starting over.
+
+    Cracked hashes are collected from the backend while the job runs and
+    delivered straight away.
+    """
+
+    def __init__(self, hashcat=None, ruleset=None, wordlist=None, max_jobs=1, window=5,
+                 sessionpath=os.path.join('engagement', 'sessions'), outfile_format='5',
+                 status_timer=10, backends=None, routes=None, plans=None, windows=None):
+        # backend name -> CrackerBackend
+        self.backends = backends or {
+            'hashcat': HashcatBackend(hashcat, ruleset, wordlist, outfile_format=outfile_format,
+                                      status_timer=status_timer),
+        }
+        # hash mode, or 'default' for the rest -> backend name
+        self.routes = routes or {}
+        # hash mode, or 'default' for the rest -> list of Attack
+        self.plans = plans or {'default': [Attack(wordlist, ruleset, None)]}
+        self.max_jobs = max_jobs
+        self.window = window
+        # hash mode -> batch window of its own, for slow modes worth collecting longer
+        self.windows = windows or {}
+        self.sessionpath = sessionpath
+
+        # mode -> job still collecting hashes
+        self.batches = OrderedDict()
+        # heap of (priority, sequence, job) waiting for a free slot
+        self.queue = []
+        self.running = []
+        self.counter = 0
+        # Results delivered while ticking can withdraw hashes, so the lock is reentrant
+        self.lock = threading.RLock()
+
+    def backend_for(self, mode):
+        return self.backends[self.routes.get(str(mode), self.routes.get('default', 'hashcat'))]
+
+    def backend(self, job):
+        return job.backend or self.backend_for(job.mode)
+
+    def plan_for(self, mode):
+        return self.plans.get(str(mode)) or self.plans['default']
+
+    def submit(self, mode, hashes, outpath):
+        """Add hashes to the batch for their mode"""
+        if not hashes:
+            return
+
+        mode = str(mode)
+        with self.lock:
+            job = self.batches.get(mode)
+            if job is None:
+                job = CrackJob(mode, outpath)
+                self.batches[mode] = job
+            job.add(hashes)
+
+        hashes_queued.inc(len(hashes), mode=mode)
+        verbose("Queued {} hashes for mode {}".format(len(hashes), mode))
+
+    def submit_attack(self, mode, hashes, outpath, attack):
+        """
+        Queue a job running one attack outside of the attack plan. Its
+        uncracked hashes do not move on to the plan's later tiers.
+
+        Returns:
+            The queued CrackJob
+        """
+        job = CrackJob(mode, outpath, attack=attack)
+        job.add(hashes)
+        with self.lock:
+            self.persist(job)
+            self.enqueue(job)
+
+        hashes_queued.inc(len(job.hashes), mode=job.mode)
+        verbose("Queued {} hashes for mode {} against {}".format(len(job.hashes), job.mode, describe_attack(attack)))
+        return job
+
+    def resume(self, records):
+        """Queue the unfinished jobs journaled by a previous run"""
+        with self.lock:
+            for record in records:
+                attack = Attack(*record['attack']) if record.get('attack') else None
+                job = CrackJob(record['mode'], record['outpath'], session=record['session'],
+                               tier=record.get('tier', 0), attack=attack)
+                job.hashfile = record['hashfile']
+                job.outfile = record['outfile']
+                job.restore = record['state'] != 'queued'
+                if record.get('hashes') is not None:
+                    # Journaled with the job, since its backend needs no hashfile
+                    job.add([curr_hash for curr_hash in record['hashes'] if not is_cracked(curr_hash)])
+                elif job.hashfile and os.path.exists(job.hashfile):
+                    with open(job.hashfile, 'r') as f:
+                        job.add([line.strip() for line in f if line.strip()])
+                info("Resuming crack session {}".format(job.session))
+                self.enqueue(job)
+
+            self.sweep(set(record['session'] for record in records))
+
+    def sweep(self, sessions):
+        """
+        Remove the files of sessions not being resumed, left behind by jobs
+        that were finished without cleaning up or by an older journal
+        """
+        if not os.path.isdir(self.sessionpath):
+            return
+
+        stale = 0
+        for name in os.listdir(self.sessionpath):
+            if os.path.splitext(name)[0] in sessions or not os.path.isfile(os.path.join(self.sessionpath, name)):
+                continue
+            os.remove(os.path.join(self.sessionpath, name))
+            stale += 1
+        if stale:
+            verbose("Removed {} stale session files".format(stale))
+
+    def enqueue(self, job):
+        heapq.heappush(self.queue, (job.priority, self.counter, job))
+        self.counter += 1
+
+    def cancel(self, job):
+        """Stop a running job, or drop a queued one, for good"""
+        with self.lock:
+            job.cancelled = True
+            for entry in self.queue:
+                if entry[2] is job:
+                    self.queue.remove(entry)
+                    heapq.heapify(self.queue)
+                    self.journal_job(job, 'cancelled')
+                    return
+
+        if job.proc is not None:
+            self.backend(job).cancel(job)
+
+    def withdraw(self, hashes):
+        """
+        Stop cracking hashes that no longer need it. They are dropped from
+        batches and queued jobs, and a running job is cancelled once none
+        of its hashes are left to crack.
+        """
+        hashes = set(hashes)
+        with self.lock:
+            for mode, job in self.batches.items():
+                job.remove(hashes)
+                if not job.hashes:
+                    del self.batches[mode]
+
+            for priority, counter, job in list(self.queue):
+                if not job.remove(hashes):
+                    continue
+                if not job.hashes:
+                    self.cancel(job)
+                elif job.hashfile:
+                    self.write_hashfile(job)
+                else:
+                    self.journal_job(job, 'queued')
+
+            for job in list(self.running):
+                if job.seen.isdisjoint(hashes):
+                    continue
+                if all(curr_hash in hashes or is_cracked(curr_hash) for curr_hash in job.hashes):
+                    verbose("Nothing left to crack in session {}".format(job.session))
+                    self.cancel(job)
+
+    def tick(self, now=None):
+        """Queue expired batches, reap finished jobs and fill free slots"""
+        now = now or time.time()
+
+        with self.lock:
+            for mode, job in self.batches.items():
+                if now - job.created >= self.windows.get(mode, self.window):
+                    del self.batches[mode]
+                    self.persist(job)
+                    self.enqueue(job)
+
+            for job in list(self.running):
+                finished = self.backend(job).poll(job) is not None
+                self.collect(job, final=finished)
+                if finished:
+                    self.finish_job(job)
+                    self.running.remove(job)
+
+            while self.queue and len(self.running) < self.max_jobs:
+                priority, counter, job = heapq.heappop(self.queue)
+                self.start_job(job)
+                self.running.append(job)
+
+    def persist(self, job):
+        """
+        Name a closed batch and journal the job. Its hashes are written to
+        disk only for a backend that reads them from a hashfile, otherwise
+        they go in the journal for a restart to pick up.
+        """
+        if not os.path.exists(self.sessionpath):
+            os.makedirs(self.sessionpath)
+
+        job.session = 'gladius_{}_{}_{}'.format(job.mode, int(job.created), self.counter)
+        if self.backend(job).hashfile:
+            job.hashfile = os.path.join(self.sessionpath, job.session + '.hashes')
+            self.write_hashfile(job)
+
+        job.outfile = os.path.join(self.sessionpath, job.session + '.out')
+        self.journal_job(job, 'queued')
+
+    def write_hashfile(self, job):
+        with open(job.hashfile, 'w') as f:
+            for curr_hash in job.hashes:
+                f.write(curr_hash + '\n')
+
+    def journal_job(self, job, state):
+        fields = {}
+        # Without a hashfile, a job to resume is rebuilt from the journal alone
+        if job.hashfile is None and state not in ('done', 'failed', 'cancelled'):
+            fields['hashes'] = job.hashes
+        journal.write('job', sync=True, session=job.session, mode=job.mode, state=state,
+                      hashfile=job.hashfile, outfile=job.outfile, outpath=job.outpath, tier=job.tier,
+                      attack=None if job.planned else list(job.attack), **fields)
+
+    def restore_file(self, job):
+        return os.path.join(self.sessionpath, job.session + '.restore')
+
+    def start_job(self, job):
+        if job.planned:
+            plan = self.plan_for(job.mode)
+            job.attack = plan[min(job.tier, len(plan) - 1)]
+        job.backend = self.backend_for(job.mode)
+        job.backend.start(job, self.restore_file(job))
+        job.status.state = 'started'
+        jobs_started.inc(mode=job.mode)
+        self.journal_job(job, 'running')
+
+    def jobs(self):
+        """Every running job, then every queued job in the order they will run"""
+        with self.lock:
+            return list(self.running) + [job for priority, counter, job in sorted(self.queue)]
+
+    def status(self):
+        """Return a (session, mode, JobStatus) for every running or queued job"""
+        return [(job.session, job.mode, job.status) for job in self.jobs()]
+
+    def status_lines(self):
+        """Return the status of every job as lines for the console"""
+        jobs = self.jobs()
+        if not jobs:
+            return ['No crack jobs running, the GPU is idle']
+
+        lines = []
+        for job in jobs:
+            if job.planned:
+                plan = self.plan_for(job.mode)
+                attack = job.attack or plan[min(job.tier, len(plan) - 1)]
+                tier = '{}/{} {}'.format(min(job.tier, len(plan) - 1) + 1, len(plan), describe_attack(attack))
+            else:
+                tier = describe_attack(job.attack)
+            lines.append('{:<32} {:<10} {:<32} {}'.format(job.session, hash_names.get(job.mode, job.mode),
+                                                          tier, job.status.format()))
+        return lines
+
+    def collect(self, job, final=False):
+        """Deliver the results the backend has found since the last collect"""
+        for hash, password in self.backend(job).results(job, final=final):
+            deliver_result(hash, password)
+
+    def finish_job(self, job):
+        backend = self.backend(job)
+        returncode = backend.returncode(job)
+        job.status.state = 'finished'
+
+        # 0 is all hashes cracked and 1 is the keyspace exhausted. Anything
+        # else was cut short and is left in the journal to be restored,
+        # unless it was cancelled.
+        if returncode in (0, 1) or job.cancelled:
+            state = 'cancelled' if job.cancelled else 'done'
+            verbose("Crack job for mode {} finished".format(job.mode))
+            if returncode == 1 and job.planned and not job.cancelled:
+                self.escalate(job)
+            self.remove_files(job)
+        elif returncode == 255:
+            # Failed jobs are not resumed, so nothing of theirs is kept
+            state = 'failed'
+            error("Crack session {} failed".format(job.session))
+            self.remove_files(job)
+        else:
+            state = 'interrupted'
+            warning("Crack session {} was interrupted ({})".format(job.session, returncode))
+
+        self.journal_job(job, state)
+
+    def remove_files(self, job):
+        """Remove the files of a job that will not be resumed"""
+        restore_file = self.restore_file(job)
+        for path in (job.hashfile, job.outfile, restore_file):
+            if path and os.path.exists(path):
+                os.remove(path)
+        self.backend(job).cleanup(job, restore_file)
+
+    def escalate(self, job):
+        """Queue the hashes an exhausted job did not crack for the next attack in the plan"""
+        remaining = [curr_hash for curr_hash in job.hashes if not is_cracked(curr_hash)]
+        if not remaining:
+            return
+
+        if job.tier + 1 >= len(self.plan_for(job.mode)):
+            # Accounts whose representative is left uncracked get another capture tried
+            promote_held(remaining)
+            return
+
+        next_job = CrackJob(job.mode, job.outpath, tier=job.tier + 1)
+        next_job.add(remaining)
+        self.persist(next_job)
+        self.enqueue(next_job)
+        verbose("{} {} hashes left for {}".format(len(remaining), hash_names.get(job.mode, job.mode),
+                describe_attack(self.plan_for(job.mode)[next_job.tier])))
+
+    def run(self, interval=0.25):
+        while True:
+            # One bad result must not stop every crack job after it
+            try:
+                self.tick()
+            except Exception as e:
+                error("Crack scheduler: {}".format(e))
+            time.sleep(interval)
+
+    def start(self):
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+scheduler = CrackScheduler()
+
+################################################################################
+# Distributed cracking
+################################################################################
+
+# Modes without a salt. Every candidate is hashed once and compared with all
+# of their hashes, so splitting the hashes between workers saves nothing and
+# the candidates are split instead.
+unsalted_modes = set(['1000'])
+
+def parse_address(address, host='0.0.0.0'):
+    """(host, port) of HOST:PORT, or of a bare PORT on host"""
+    name, sep, port = address.rpartition(':')
+    return name or host, int(port)
+
+def is_loopback(host):
+    """The host is only reachable from this box"""
+    return host == 'localhost' or host == '::1' or host.startswith('127.')
+
+def memory_dir():
+    """A memory-backed directory for files that need not outlive the process, if there is one"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return None
+
+def send_message(sock, message):
+    """Send a message of the worker protocol, a line of JSON"""
+    sock.sendall(json.dumps(message) + '\n')
+
+class Shard(object):
+    """
+    The part of a distributed crack job a single worker cracks
+
+    Attributes:
+        task: Name of the shard in the messages between coordinator and worker
+        job: CrackJob the shard is part of
+        hashes: Hashes to crack
+        part: (index, count) of the attack's candidates to try, or None for all of them
+        worker: WorkerConnection cracking the shard, None while it waits for one
+        returncode: Exit code of the worker's cracker once the shard is done
+        cracked: Hashes the worker has cracked
+        status: Progress last reported by the worker
+    """
+
+    def __init__(self, task, job, hashes, part=None, returncode=None):
+        self.task = task
+        self.job = job
+        self.hashes = hashes
+        self.part = part
+        self.worker = None
+        self.returncode = returncode
+        self.cracked = set()
+        self.status = JobStatus()
+
+    @property
+    def done(self):
+        return self.returncode is not None
+
+class WorkerConnection(SocketServer.StreamRequestHandler):
+    """A worker connected to the coordinator, read from on a thread of its own"""
+
+    def handle(self):
+        backend = self.server.backend
+        self.name = self.client_address[0]
+        self.shard = None
+        self.send_lock = threading.Lock()
+
+        # A worker pings while idle, so a silent one is gone
+        self.request.settimeout(backend.timeout)
+        try:
+            if not backend.welcome(self, json.loads(self.rfile.readline() or 'null')):
+                return
+            for line in iter(self.rfile.readline, ''):
+                backend.handle_message(self, json.loads(line))
+        except (socket.error, ValueError) as e:
+            warning("Lost worker {}: {}".format(self.name, e))
+        finally:
+            backend.lost(self)
+
+    def send(self, message):
+        with self.send_lock:
+            send_message(self.request, message)
+
+    def close(self):
+        """Hang up, which ends the reading thread and hands the worker's shard to another"""
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+class CoordinatorServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class DistributedBackend(CrackerBackend):
+    """
+    Crack on worker agents (gladius.py --worker) connected over TCP, on this
+    host or on other cracking boxes.
+
+    Each job is split into a shard per connected worker: its hashes for
+    salted modes, the candidates of its attack for unsalted ones. A worker
+    cracks one shard at a time with a backend of its own, and streams its
+    results and progress back. The shard of a worker that disconnects, or
+    says nothing for `timeout` seconds, goes to the next free worker.
+    Wordlists, rules and masks are passed by path, so workers need them in
+    the same place.
+
+    Every message is a line of JSON with an op and its fields:
+
+        worker to coordinator   hello   name, key
+                                status  task, state, progress, speeds
+                                result  task, hash, password (hex)
+                                done    task, returncode
+                                ping
+        coordinator to worker   task    task, mode, hashes, attack, part
+                                cancel  task
+
+    The restore file lists the shards and which are done, so a resumed job
+    only hands out the rest.
+    """
+
+    name = 'distributed'
+    hashfile = False
+
+    def __init__(self, address=('0.0.0.0', 6325), key=None, timeout=30):
+        self.address = address
+        self.key = key
+        self.timeout = timeout
+        self.server = None
+        # WorkerConnection of every worker, in the order they connected
+        self.workers = []
+        # task -> Shard of every job being cracked
+        self.shards = OrderedDict()
+        # session -> (restore file, shards of the job)
+        self.jobs = {}
+        self.lock = threading.RLock()
+
+    def listen(self):
+        """Accept workers on a background thread, returning the (host, port) listened on"""
+        self.server = CoordinatorServer(self.address, WorkerConnection)
+        self.server.backend = self
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.server.server_address
+
+    def welcome(self, connection, hello):
+        if not isinstance(hello, dict) or hello.get('op') != 'hello':
+            return False
+        if self.key and not hmac.compare_digest(unicode(hello.get('key') or '').encode('utf-8'),
+                                                unicode(self.key).encode('utf-8')):
+            warning("Worker at {} gave the wrong key".format(connection.name))
+            return False
+
+        connection.name = '{}@{}'.format(hello.get('name'), connection.client_address[0])
+        with self.lock:
+            self.workers.append(connection)
+            info("Worker {} connected, {} workers".format(connection.name, len(self.workers)))
+            self.assign()
+        return True
+
+    def lost(self, connection):
+        with self.lock:
+            if connection not in self.workers:
+                return
+            self.workers.remove(connection)
+
+            shard = connection.shard
+            if shard is not None:
+                warning("Worker {} is gone, its shard of {} goes to another".format(connection.name, shard.job.session))
+                shard.worker = None
+                connection.shard = None
+                shard.status = JobStatus()
+            else:
+                info("Worker {} disconnected".format(connection.name))
+            self.assign()
+
+    def handle_message(self, connection, message):
+        op = message.get('op')
+        with self.lock:
+            shard = self.shards.get(message.get('task'))
+            if shard is None:
+                # A ping, or word of a job that is over
+                return
+
+            if op == 'result':
+                # Cracks are kept whichever worker found them, even after a hand-over
+                self.record(shard, message.get('hash'), message.get('password', ''))
+            elif shard.worker is not connection:
+                return
+            elif op == 'status':
+                shard.status.state = message.get('state', shard.status.state)
+                shard.status.speeds = message.get('speeds', [])
+                if len(message.get('progress') or []) == 2:
+                    shard.status.update_progress(tuple(message['progress']))
+            elif op == 'done':
+                self.finish(shard, message.get('returncode', 255))
+
+    def record(self, shard, hash, password):
+        # hashcat writes NetNTLM and DCC2 back in lowercase
+        hash = shard.job.submitted.get((hash or '').lower())
+        if hash is None or hash in shard.cracked:
+            return
+        shard.cracked.add(hash)
+        # The outfile is read as CrackerBackend.results reads a cracker's
+        with open(shard.job.outfile, 'a') as f:
+            f.write('{}:{}\n'.format(hash, password))
+
+    def finish(self, shard, returncode):
+        shard.worker.shard = None
+        shard.worker = None
+        shard.returncode = returncode
+        verbose("Shard {} finished ({})".format(shard.task, returncode))
+
+        restore_file, shards = self.jobs[shard.job.session]
+        if returncode == 0 and shard.part:
+            # Every hash is cracked, the other parts have nothing left to find
+            for other in shards:
+                self.stop(other, 0)
+        self.save(restore_file, shards)
+        self.assign()
+
+    def stop(self, shard, returncode):
+        if shard.done:
+            return
+        if shard.worker is not None:
+            try:
+                shard.worker.send({'op': 'cancel', 'task': shard.task})
+            except socket.error:
+                shard.worker.close()
+            shard.worker.shard = None
+            shard.worker = None
+        shard.returncode = returncode
+
+    def assign(self):
+        """Hand waiting shards to idle workers"""
+        with self.lock:
+            idle = [worker for worker in self.workers if worker.shard is None]
+            for shard in self.shards.values():
+                if not idle:
+                    return
+                if shard.done or shard.worker is not None:
+                    continue
+
+                worker = idle.pop(0)
+                shard.worker = worker
+                worker.shard = shard
+                shard.status = JobStatus()
+                verbose("Handing shard {} to worker {}".format(shard.task, worker.name))
+                try:
+                    worker.send({'op': 'task', 'task': shard.task, 'mode': shard.job.mode, 'hashes': shard.hashes,
+                                 'attack': list(self.attack(shard.job)), 'part': shard.part})
+                except socket.error as e:
+                    # Its reading thread finds it gone and hands the shard on
+                    warning("Worker {} is unreachable: {}".format(worker.name, e))
+                    worker.close()
+
+    def split(self, job):
+        count = max(1, len(self.workers))
+        if job.mode in unsalted_modes:
+            if count == 1:
+                return [Shard('{}/0'.format(job.session), job, list(job.hashes))]
+            return [Shard('{}/{}'.format(job.session, index), job, list(job.hashes), part=(index, count))
+                    for index in range(count)]
+
+        count = max(1, min(count, len(job.hashes)))
+        return [Shard('{}/{}'.format(job.session, index), job, job.hashes[index::count])
+                for index in range(count)]
+
+    def save(self, restore_file, shards):
+        with open(restore_file, 'w') as f:
+            json.dump({'shards': [{'task': shard.task, 'hashes': shard.hashes, 'part': shard.part,
+                                   'returncode': shard.returncode} for shard in shards]}, f)
+
+    def start(self, job, restore_file):
+        shards = None
+        if job.restore and os.path.exists(restore_file):
+            with open(restore_file, 'r') as f:
+                shards = [Shard(saved['task'], job, saved['hashes'], tuple(saved['part']) if saved['part'] else None,
+                                saved['returncode']) for saved in json.load(f)['shards']]
+
+        with self.lock:
+            if shards is None:
+                shards = self.split(job)
+            self.jobs[job.session] = (restore_file, shards)
+            for shard in shards:
+                self.shards[shard.task] = shard
+            self.save(restore_file, shards)
+            self.assign()
+        job.status.state = 'waiting'
+
+    def poll(self, job):
+        with self.lock:
+            restore_file, shards = self.jobs[job.session]
+            self.update_status(job, shards)
+            if all(shard.done for shard in shards):
+                return self.returncode(job)
+            return None
+
+    def update_status(self, job, shards):
+        running = [shard for shard in shards if shard.worker is not None]
+        status = job.status
+        status.state = 'running' if running else 'waiting'
+        status.speeds = [speed for shard in running for speed in shard.status.speeds]
+        status.update_progress((sum(shard.status.progress[0] for shard in shards),
+                                sum(shard.status.progress[1] for shard in shards)))
+        cracked = set()
+        for shard in shards:
+            cracked.update(shard.cracked)
+        status.recovered = (len(cracked), len(job.hashes))
+
+    def returncode(self, job):
+        with self.lock:
+            restore_file, shards = self.jobs[job.session]
+            codes = [shard.returncode for shard in shards]
+
+        failed = [code for code in codes if code not in (0, 1)]
+        if failed:
+            return failed[0]
+        return 0 if all(code == 0 for code in codes) else 1
+
+    def cancel(self, job):
+        with self.lock:
+            restore_file, shards = self.jobs.get(job.session, (None, []))
+            for shard in shards:
+                self.stop(shard, -15)
+
+    def cleanup(self, job, restore_file):
+        with self.lock:
+            restore_file, shards = self.jobs.pop(job.session, (restore_file, []))
+            for shard in shards:
+                self.stop(shard, -15)
+                self.shards.pop(shard.task, None)
+        if os.path.exists(restore_file):
+            os.remove(restore_file)
+
+class WorkerAgent(object):
+    """
+    Crack the shards a coordinator (gladius.py --coordinator) hands out with
+    a local backend, reconnecting whenever the connection drops.
+
+    A shard whose connection dropped is abandoned, as the coordinator has
+    handed it to another worker by the time this one is back. Shards are
+    never resumed, so their files go in a memory-backed directory, and a
+    backend that needs no hashfile is given none.
+    """
+
+    def __init__(self, address, backend, key=None, name=None, workdir=None, interval=5, retry=5):
+        self.address = address
+        self.backend = backend
+        self.key = key
+        self.name = name or '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.workdir = workdir
+        # Seconds between progress reports, which double as a heartbeat
+        self.interval = interval
+        self.retry = retry
+        self.sock = None
+        self.stopped = threading.Event()
+        # task -> CrackJob cracking the shard
+        self.tasks = OrderedDict()
+        self.counter = 0
+
+    def run(self):
+        workdir = self.workdir
+        if workdir is None:
+            self.workdir = tempfile.mkdtemp(prefix='gladius-worker-', dir=memory_dir())
+
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.sock = socket.create_connection(self.address, timeout=self.retry)
+                    self.sock.settimeout(None)
+                    info("Connected to the coordinator at {}:{}".format(*self.address))
+                    self.serve()
+                except socket.error as e:
+                    if not self.stopped.is_set():
+                        warning("Coordinator at {}:{} unreachable: {}".format(self.address[0], self.address[1], e))
+                finally:
+                    self.abandon()
+                self.stopped.wait(self.retry)
+        finally:
+            if workdir is None:
+                shutil.rmtree(self.workdir, ignore_errors=True)
+                self.workdir = None
+
+    def stop(self):
+        self.stopped.set()
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def serve(self):
+        send_message(self.sock, {'op': 'hello', 'name': self.name, 'key': self.key})
+        messages = Queue.Queue()
+        reader = threading.Thread(target=self.read, args=(self.sock, messages))
+        reader.daemon = True
+        reader.start()
+
+        last_report = 0
+        while not self.stopped.is_set():
+            try:
+                message = messages.get(timeout=0.25)
+            except Queue.Empty:
+                message = {}
+            if message is None:
+                warning("The coordinator hung up")
+                return
+
+            op = message.get('op')
+            if op == 'task':
+                self.start_task(message)
+            elif op == 'cancel' and message.get('task') in self.tasks:
+                job = self.tasks[message['task']]
+                job.cancelled = True
+                self.backend.cancel(job)
+
+            now = time.time()
+            report = now - last_report >= self.interval
+            for task, job in self.tasks.items():
+                self.step(task, job, report)
+            if report:
+                if not self.tasks:
+                    send_message(self.sock, {'op': 'ping'})
+                last_report = now
+
+    def read(self, sock, messages):
+        try:
+            for line in iter(sock.makefile('r').readline, ''):
+                messages.put(json.loads(line))
+        except (socket.error, ValueError) as e:
+            verbose("Coordinator connection: {}".format(e))
+        messages.put(None)
+
+    def restore_file(self, job):
+        return os.path.join(self.workdir, job.session + '.restore')
+
+    def start_task(self, message):
+        self.counter += 1
+        attack = Attack(*message['attack']) if message.get('attack') else None
+        job = CrackJob(message['mode'], self.workdir, session='gladius_worker_{}'.format(self.counter), attack=attack)
+        job.part = tuple(message['part']) if message.get('part') else None
+        job.add(message['hashes'])
+        job.outfile = os.path.join(self.workdir, job.session + '.out')
+        if self.backend.hashfile:
+            job.hashfile = os.path.join(self.workdir, job.session + '.hashes')
+            with open(job.hashfile, 'w') as f:
+                for curr_hash in job.hashes:
+                    f.write(curr_hash + '\n')
+
+        info("Cracking {} {} hashes of {}".format(len(job.hashes), hash_names.get(job.mode, job.mode), message['task']))
+        try:
+            self.backend.start(job, self.restore_file(job))
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            error("Could not start {}: {}".format(self.backend.name, e))
+            send_message(self.sock, {'op': 'done', 'task': message['task'], 'returncode': 255})
+            self.remove(job)
+            return
+        self.tasks[message['task']] = job
+
+    def step(self, task, job, report):
+        """Send what the backend found, and the outcome once it is done"""
+        finished = self.backend.poll(job) is not None
+        for hash, password in self.backend.results(job, final=finished):
+            send_message(self.sock, {'op': 'result', 'task': task, 'hash': hash, 'password': password.encode('hex')})
+
+        if finished:
+            returncode = -15 if job.cancelled else self.backend.returncode(job)
+            send_message(self.sock, {'op': 'done', 'task': task, 'returncode': returncode})
+            del self.tasks[task]
+            self.remove(job)
+        elif report:
+            send_message(self.sock, {'op': 'status', 'task': task, 'state': job.status.state,
+                                     'progress': list(job.status.progress), 'speeds': job.status.speeds})
+
+    def abandon(self):
+        for task, job in self.tasks.items():
+            job.cancelled = True
+            if job.proc is not None:
+                self.backend.cancel(job)
+            self.remove(job)
+        self.tasks.clear()
+
+    def remove(self, job):
+        restore_file = self.restore_file(job)
+        for path in (job.hashfile, job.outfile, restore_file):
+            if path and os.path.exists(path):
+                os.remove(path)
+        self.backend.cleanup(job, restore_file)
+
+################################################################################
+# Quick pass
+################################################################################
+
+# (password, NTLM hash) of the top passwords, set in each quick pass worker
+quick_candidates = []
+
+def quick_init(words):
+    global quick_candidates
+    quick_candidates = [(word, ntlm_hash(word)) for word in words]
+
+def quick_check(job):
+    """
+    Try the top passwords against a capture in a quick pass worker.
+
+    Args:
+        job (tuple): (mode, capture)
+
+    Returns:
+        (capture, password or None)
+    """
+    mode, capture = job
+    try:
+        check = nt_checkers[mode](capture)
+    except (KeyError, ValueError, TypeError, IndexError):
+        return capture, None
+
+    for password, nt in quick_candidates:
+        if check(nt):
+            return capture, password
+    return capture, None
+
+class QuickPass(object):
+    """
+    Try new NetNTLMv1/v2 captures against the most common passwords on every
+    core before they are queued for the GPU.
+
+    Most captures fall to a short list of top passwords, which takes
+    milliseconds here instead of a full hashcat start-up with a large
+    wordlist and rules. Only the captures that survive are passed on to
+    the crack scheduler.
+    """
+
+    def __init__(self, words=(), processes=None, modes=('5500', '5600')):
+        self.words = list(words)
+        self.processes = processes
+        # NetNTLMv1 needs DES from pycrypto
+        self.modes = set(mode for mode in modes if mode in nt_checkers)
+        self.pool = None
+
+    @staticmethod
+    def top_words(path, count):
+        """The first count distinct words of a wordlist, most common first in rockyou and the like"""
+        words = OrderedDict()
+        with open(path, 'r') as f:
+            for line in f:
+                words[line.rstrip('\r\n')] = None
+                if len(words) >= count:
+                    break
+        return list(words)
+
+    def start(self):
+        self.pool = multiprocessing.Pool(self.processes, initializer=quick_init, initargs=(self.words,))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def handles(self, mode):
+        return self.pool is not None and str(mode) in self.modes
+
+    def submit(self, mode, hashes, outpath):
+        """Check hashes in the background, then queue the ones left for cracking"""
+        if not hashes:
+            return
+
+        mode = str(mode)
+        start = time.time()
+        chunksize = max(1, len(hashes) // (len(self.pool._pool) * 4))
+
+        def done(results):
+            try:
+                self.finish(mode, results, outpath, start)
+            except Exception as e:
+                error("Quick pass failed: {}".format(e))
+                scheduler.submit(mode, hashes, outpath)
+
+        self.pool.map_async(quick_check, [(mode, hash) for hash in hashes], chunksize, callback=done)
+
+    def finish(self, mode, results, outpath, start):
+        """
+        Deliver the quick pass results and queue the misses for cracking.
+
+        This runs on the pool's result thread, so it holds the scheduler's
+        lock as tick does while it delivers results and releases held
+        captures.
+        """
+        misses = []
+        with scheduler.lock:
+            for capture, password in results:
+                if password is None:
+                    misses.append(capture)
+                    continue
+                deliver_result(capture, password)
+
+            scheduler.submit(mode, misses, outpath)
+
+        quick_hashes.inc(len(results) - len(misses), mode=mode, result='cracked')
+        quick_hashes.inc(len(misses), mode=mode, result='escalated')
+        verbose("Quick pass cracked {} of {} {} hashes in {:.0f} ms".format(
+                len(results) - len(misses), len(results), hash_names.get(mode, mode), (time.time() - start) * 1000))
+
+quickpass = QuickPass()
+
+################################################################################
+# Feedback wordlist
+################################################################################
+
+seasons = ['Spring', 'Summer', 'Fall', 'Autumn', 'Winter']
+
+def split_password(password):
+    """
+    Split a password such as Company2016! into its root, trailing digits and
+    trailing symbols.
+
+    Returns:
+        (root, digits, symbols)
+    """
+    end = len(password)
+    while end and not password[end - 1].isalnum():
+        end -= 1
+    rest, symbols = password[:end], password[end:]
+
+    end = len(rest)
+    while end and rest[end - 1].isdigit():
+        end -= 1
+    return rest[:end], rest[end:], symbols
+
+def password_variants(password, year=None):
+    """
+    Candidates derived from a cracked password: the password, its root, and
+    the root with other casing, seasons, years and common suffixes, the way
+    users rotate their passwords.
+
+    Returns:
+        set of candidate passwords
+    """
+    year = year or datetime.date.today().year
+    root, digits, symbols = split_password(password)
+    variants = set([password])
+    if not root:
+        return variants
+
+    roots = set([root, root.lower(), root.capitalize()])
+    if root.capitalize() in seasons:
+        roots.update(seasons)
+        roots.update(season.lower() for season in seasons)
+
+    years = set([year - 1, year, year + 1])
+    if len(digits) == 4 and digits[:2] in ('19', '20'):
+        years.update([int(digits) - 1, int(digits) + 1])
+
+    numbers = set(['', '1', '12', '123', digits])
+    for curr_year in years:
+        numbers.update([str(curr_year), str(curr_year)[2:]])
+
+    for curr_root in roots:
+        for number in numbers:
+            for suffix in set(['', '!', symbols]):
+                variants.add(curr_root + number + suffix)
+    return variants
+
+def uncracked_hashes():
+    """
+    Every tracked hash still to crack.
+
+    Returns:
+        dict of hash mode to hashes
+    """
+    pending = defaultdict(list)
+    for hash, entry in ntlm_hashes.items():
+        if 'users' in entry and not entry['password']:
+            pending['1000'].append(hash)
+    for entry in captures.values():
+        if not entry['password']:
+            pending[entry['mode']].append(entry['hash'])
+    for entry in cached_logons.values():
+        if not entry['password']:
+            pending['2100'].append(entry['hash'])
+    return pending
+
+class FeedbackWordlist(object):
+    """
+    Engagement wordlist of cracked passwords and their variants.
+
+    Passwords within an organization follow the same few patterns, so the
+    list is run against every uncracked hash each time it grows. A run
+    waits for delay seconds of quiet, so a burst of cracks makes one run.
+
+    Attributes:
+        path: Wordlist file, None to disable the feedback loop
+        delay: Seconds to wait after the list grows before running it
+        outpath: Output directory of its crack jobs
+        words: Every word in the list
+        jobs: Hash mode to the last crack job running the list
+    """
+
+    def __init__(self, path=None, delay=30, outpath=os.path.join('engagement', 'feedback_out')):
+        self.path = path
+        self.delay = delay
+        self.outpath = outpath
+        self.words = set()
+        self.grown = None
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Read the words of a previous run, which need not be run again"""
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            self.words.update(line.rstrip('\r\n') for line in f)
+        self.words.discard('')
+
+    def add(self, password):
+        """Add a cracked password and its variants to the list"""
+        if self.path is None or not password:
+            return
+
+        with self.lock:
+            new = password_variants(password) - self.words
+            if not new:
+                return
+            self.words.update(new)
+            self.grown = time.time()
+        verbose("Feedback wordlist grew by {} words".format(len(new)))
+
+    def tick(self, now=None):
+        """Run the list against every uncracked hash once it has stopped growing"""
+        now = now or time.time()
+        with self.lock:
+            if self.grown is None or now - self.grown < self.delay:
+                return
+            self.grown = None
+            self.write()
+
+        attack = Attack(self.path, None, None)
+        for mode, hashes in uncracked_hashes().items():
+            # The new run covers everything the last one was still trying
+            previous = self.jobs.get(mode)
+            if previous is not None:
+                scheduler.cancel(previous)
+            self.jobs[mode] = scheduler.submit_attack(mode, hashes, self.outpath, attack)
+        info("Running the feedback wordlist of {} words against the uncracked hashes".format(len(self.words)))
+
+    def write(self):
+        """Replace the wordlist file, leaving crackers reading the old one undisturbed"""
+        if not os.path.exists(self.outpath):
+            os.makedirs(self.outpath)
+
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            for word in sorted(self.words):
+                f.write(word + '\n')
+        os.rename(temp, self.path)
+
+feedback = FeedbackWordlist()
+
+################################################################################
+# Parsers
+################################################################################
+
+# Add to this list to add new hashcat crack types, and a parser for their
+# lines to responder_parsers
+# NOTE: If the type isn't NTLM, be sure to add a regex pattern to ResponderHandler.patterns
+responder_types = [
+    ('ntlmv1', '5500'),
+    ('ntlmv2', '5600'),
+    ('hashes', '1000'),
+]
+
+def parse_hashdump_line(line):
+    """Parse a line of smart_hashdump output, user:rid:lmhash:nthash:::"""
+    # Check for hashdump output
+    if line.count(':') != 3 and line.count(':') != 6:
+        return None
+
+    # Ignore service accounts
+    if '$' in line:
+        return None
+
+    # If we receive spooled output, remove the color
+    line = line.replace('\x1b[1m\x1b[32m[+]\x1b[0m \t', '')
+    fields = line.split(':')
+    return Parsed('hash', '1000', fields[3], fields[0])
+
+# Hash mode -> parser of one line of a file of that type
+responder_parsers = {
+    '5500': lambda line: Parsed('capture', '5500', line, None),
+    '5600': lambda line: Parsed('capture', '5600', line, None),
+    '1000': parse_hashdump_line,
+}
+
+def responder_mode(path):
+    """
+    Resolve the hash type of a Responder or smart_hashdump file from its name.
+
+    Returns:
+        Hash mode, or None if the name does not tell
+    """
+    name = os.path.basename(path).lower()
+    for signature, mode in responder_types:
+        if signature in name:
+            return mode
+    return None
+
+def sniff_responder_mode(line):
+    """
+    Resolve the hash type of a file from one of its lines.
+
+    Returns:
+        Hash mode, or None if the line is none of them
+    """
+    fields = line.split(':')
+    # user:rid:lmhash:nthash:::
+    if len(fields) == 7 and len(fields[3]) == 32:
+        return '1000'
+
+    # user::domain:LM response:NT response:challenge for NetNTLMv1, with a
+    # 24 byte NT response, or user::domain:challenge:NTProofStr:blob for v2
+    if len(fields) == 6 and not fields[1]:
+        return '5500' if len(fields[4]) == 48 else '5600'
+    return None
+
+class ResponderParser(object):
+    """
+    Single pass parser of a Responder capture log or smart_hashdump output.
+
+    The file's hash type is resolved once, from its name or else from its
+    first line, and every line goes straight to that type's parser in
+    responder_parsers. One parser follows one file across reads.
+
+    Attributes:
+        mode: Hash mode of the file, None until it is known
+        lines: Number of lines fed
+    """
+
+    def __init__(self, path):
+        self.mode = responder_mode(path)
+        self.lines = 0
+
+    def parse(self, lines):
+        """
+        Parse lines from any iterable, such as an open file.
+
+        Returns:
+            list of Parsed hashes and captures
+        """
+        parsed = []
+        for line in lines:
+            self.lines += 1
+            line = line.rstrip('\r\n')
+            if verbosity:
+                verbose("Responder: {}".format(line))
+
+            # Ignore blank lines
+            if not line:
+                continue
+
+            if self.mode is None:
+                self.mode = sniff_responder_mode(line)
+                if self.mode is None:
+                    continue
+
+            item = responder_parsers[self.mode](line)
+            if item is not None:
+                parsed.append(item)
+        return parsed
+
+def parse_responder(path, lines):
+    """
+    Parse Responder captures or smart_hashdump output.
+
+    Returns:
+        List of Parsed hashes and captures
+    """
+    return ResponderParser(path).parse(lines)
+
+class SecretsdumpParser(object):
+    """
+    Streaming parser of secretsdump.py output, against a host's SAM and LSA
+    secrets or a domain controller's NTDS.dit.
+
+    Lines are fed one at a time and the parser keeps only the section it is
+    in and the few secrets it has already reported, so a dump is parsed in
+    one pass however large it is. One parser follows one file across reads.
+
+    Attributes:
+        section: Section of the dump the last line was in
+        lines: Number of lines fed
+    """
+
+    # Section headers, in the order they are checked for
+    headers = [
+        ('Dumping local SAM hashes', 'ntlm'),
+        ('Dumping Domain Credentials', 'ntlm'),
+        ('Dumping cached domain logon', 'mscash'),
+        ('Dumping LSA Secrets', ''),
+        ('_SC_', 'sc'),
+        ('DefaultPassword', 'default'),
+        ('Kerberos keys', ''),
+        ('ClearText password', ''),
+        ('Cleaning up', ''),
+    ]
+
+    def __init__(self, section=''):
+        self.section = section
+        self.lines = 0
+        # Cached logons and LSA secrets already reported
+        self.seen = set()
+
+    def parse(self, lines):
+        """
+        Parse lines from any iterable, such as an open file.
+
+        Returns:
+            list of Parsed
+        """
+        parsed = []
+        for line in lines:
+            item = self.feed(line.rstrip('\r\n'))
+            if item is not None:
+                parsed.append(item)
+        return parsed
+
+    def feed(self, line):
+        """
+        Parse one line.
+
+        Returns:
+            Parsed, or None if the line holds nothing to report
+        """
+        self.lines += 1
+        if verbosity:
+            verbose("Secretsdump: {}".format(line))
+
+        # Ignore blank lines
+        if not line:
+            return None
+
+        if line.startswith('[*]'):
+            for header, section in self.headers:
+                if header in line:
+                    self.section = section
+                    break
+            # Other status lines, such as the NTDS.DIT method, keep the section
+            return None
+
+        section = self.section
+        if section == 'ntlm':
+            # uid:rid:lmhash:nthash::: or domain\uid:rid:lmhash:nthash::: on a domain
+            # controller, optionally followed by the account status
+            fields = line.split(':')
+            if len(fields) == 7 and len(fields[3]) == 32 and not fields[0].endswith('$'):
+                return Parsed('hash', '1000', fields[3], fields[0])
+            return None
+
+        if section == 'mscash':
+            fields = line.split(':')
+            if len(fields) != 7:
+                return None
+            # uid:encryptedHash:longDomain:domain:::
+            curr_hash = '$DCC2$10240#{}#{}'.format(fields[0], fields[1])
+            username = '{}\\{}'.format(fields[3], fields[0]) if fields[3] else fields[0]
+            return self.once(Parsed('cached', '2100', curr_hash, username))
+
+        if section == 'default':
+            self.section = ''
+            return self.once(Parsed('default', None, line, None))
+
+        if section == 'sc':
+            # Catch the '[*]' if it accidently goes by
+            if '[' in line:
+                return None
+            self.section = ''
+            return self.once(Parsed('service', None, line, None))
+
+        return None
+
+    def once(self, item):
+        if item.hash in self.seen:
+            return None
+        self.seen.add(item.hash)
+        return item
+
+def parse_secretsdump(lines, mode=''):
+    """
+    Parse secretsdump.py output.
+
+    Args:
+        lines (iterable): Lines to parse
+        mode (str): Section the previous lines of the same file ended in
+
+    Returns:
+        (list of Parsed, section the lines ended in)
+    """
+    parser = SecretsdumpParser(mode)
+    parsed = parser.parse(lines)
+    return parsed, parser.section
+
+################################################################################
+# Watchdog Handler classes
+################################################################################
+
+class GladiusHandler(PatternMatchingEventHandler):
+    """
+    Base Class for Handlers in Gladius
+
+    Attributes:
+        outpath: Output directory of the handler and its crack jobs
+    """
+
+    # Most bytes of a file read and processed at once
+    chunk_size = 64 * 1024 * 1024
+
+    def __init__(self):
+        self.tail = FileTail()
+        self.pending = {}
+        self.outpath = os.path.join('engagement', "{}_out".format(self.__class__.__name__.lower()))
+
+        if not os.path.exists(self.outpath):
+            os.makedirs(self.outpath)
+
+        super(GladiusHandler, self).__init__()
+
+    def process(self, event):
+        pass
+
+    def state(self, path):
+        """
+        Return what parsing path needs to carry on from where it stopped,
+        kept in the fingerprint index with the offset. None if nothing.
+        """
+        return None
+
+    def resume(self, path, state):
+        """Carry on parsing path from a state returned by state() before a restart"""
+        pass
+
+    def call_hashcat(self, hash_num, hashes):
+        """Queue a list of hashes to be cracked by the backend configured for hash_num"""
+
+        if str(hash_num) == '1000':
+            hashes = resolve_cached(hashes)
+
+        # Captures get a quick pass against the top passwords first
+        if quickpass.handles(hash_num):
+            quickpass.submit(hash_num, hashes, self.outpath)
+            return
+
+        scheduler.submit(hash_num, hashes, self.outpath)
+
+    def get_lines(self, event):
+        """Given an event, return the lines added to the event file since it was last read"""
+        lines = self.pending.pop(event.src_path, None)
+        if lines is None:
+            lines = self.tail.read(event.src_path)
+        return lines
+
+    def on_modified(self, event):
+        self.on_created(event)
+
+    def on_created(self, event):
+        # Ignore events that flag on the directory itself
+        if os.path.isdir(event.src_path):
+            return
+
+        events_received.inc(handler=self.__class__.__name__)
+
+        # Wait for the file to settle instead of reading it on every write
+        debouncer.touch(self, event)
+
+    def on_closed(self, event):
+        # The writer is done, so a trailing line without a newline is whole
+        debouncer.touch(self, event, closed=True)
+
+    def handle_event(self, event, final=False):
+        """
+        Read what was appended to a settled file and process it.
+        With final, the writer is done, so take a trailing unterminated line too.
+        """
+        read_settled(self.tail, [self], event, final=final, chunk_size=self.chunk_size)
+
+    def receive(self, event, lines, md5sum):
+        """
+        Process lines read from the file of event, unless this handler has
+        processed the same data before.
+
+        Returns:
+            True if the lines were processed
+        """
+        # A rewritten or copied file can hand us data we have already processed.
+        # Check the md5 of the new data. If seen, ignore
+        name = self.__class__.__name__
+        if fingerprints.seen('{}:{}'.format(name, md5sum)):
+            return False
+
+        verbose("New data in {} path".format(name))
+        self.pending[event.src_path] = lines
+
+        start = time.time()
+        self.process(event)
+        parse_seconds.observe(time.time() - start, handler=name)
+        lines_parsed.inc(len(lines), handler=name)
+        return True
+
+def read_settled(tail, handlers, event, final=False, chunk_size=GladiusHandler.chunk_size):
+    """
+    Read what was appended to a settled file once and hand it to every
+    handler in handlers, a chunk at a time so that a dump of several GB is
+    never held in memory whole.
+    """
+    try:
+        stat = os.stat(event.src_path)
+    except OSError:
+        return
+
+    # Fingerprints are kept per handler, since handlers watching the same
+    # directory each need their own view of a file
+    keys = ['{}:{}'.format(handler.__class__.__name__, event.src_path) for handler in handlers]
+
+    # Created and modified events for a file we have already read up to
+    # its current size stop here without opening it
+    if all(fingerprints.unchanged(key, stat) for key in keys):
+        return
+
+    # Pick up where we left off before a restart, from where the handler
+    # furthest behind got to, and in the state each handler's parser was in
+    if event.src_path not in tail.positions:
+        positions = [fingerprints.position(key) for key in keys]
+        if all(positions):
+            tail.positions[event.src_path] = min(positions, key=lambda position: position[1])
+            for key, handler in zip(keys, handlers):
+                handler.resume(event.src_path, fingerprints.state(key))
+
+    parsed = set()
+    while True:
+        lines = tail.read(event.src_path, stat, final=final, limit=chunk_size)
+        inode, offset = tail.positions.get(event.src_path, (stat.st_ino, 0))
+        if lines:
+            md5sum = md5.new('\n'.join(lines)).hexdigest()
+            for handler in handlers:
+                if handler.receive(event, lines, md5sum):
+                    parsed.add(handler.__class__.__name__)
+
+        # Recorded once parsed, so the state goes with the offset
+        for key, handler in zip(keys, handlers):
+            fingerprints.record(key, stat, offset, state=handler.state(event.src_path))
+
+        if not lines or not tail.unread(event.src_path, stat):
+            break
+
+    for name in parsed:
+        files_parsed.inc(handler=name)
+
+class Dispatcher(PatternMatchingEventHandler):
+    """
+    Route the files of one watched directory to every handler whose
+    patterns match.
+
+    With a handler per directory each would be told of every event, and
+    each would open, read and hash the same file. The dispatcher matches
+    a path against the compiled patterns of its handlers once and
+    remembers the result, then reads a settled file once and hands the
+    lines to every handler it routes to.
+    """
+
+    def __init__(self, handlers, max_routed=10000):
+        self.handlers = handlers
+        # (compiled patterns, handler) in the order the handlers were given. Like
+        # watchdog's own filter, file names match whatever their case
+        self.routes = [(re.compile('|'.join(fnmatch.translate(pattern) for pattern in handler.patterns),
+                                   re.IGNORECASE), handler)
+                       for handler in handlers]
+        # path -> handlers it is routed to, the least recently used dropped first
+        self.routed = OrderedDict()
+        self.max_routed = max_routed
+        self.lock = threading.Lock()
+        self.tail = FileTail()
+        patterns = sorted(set(pattern for handler in handlers for pattern in handler.patterns))
+        super(Dispatcher, self).__init__(patterns=patterns)
+
+    def route(self, path):
+        with self.lock:
+            handlers = self.routed.pop(path, None)
+            if handlers is None:
+                handlers = [handler for regex, handler in self.routes if regex.match(path)]
+            self.routed[path] = handlers
+            while len(self.routed) > self.max_routed:
+                self.routed.popitem(last=False)
+        return handlers
+
+    def on_modified(self, event):
+        self.on_created(event)
+
+    def on_created(self, event):
+        # Ignore events that flag on the directory itself
+        if os.path.isdir(event.src_path):
+            return
+
+        handlers = self.route(event.src_path)
+        for handler in handlers:
+            events_received.inc(handler=handler.__class__.__name__)
+
+        # Wait for the file to settle instead of reading it on every write
+        if handlers:
+            debouncer.touch(self, event)
+
+    def on_closed(self, event):
+        # The writer is done, so a trailing line without a newline is whole
+        if self.route(event.src_path):
+            debouncer.touch(self, event, closed=True)
+
+    def handle_event(self, event, final=False):
+        handlers = self.route(event.src_path)
+        if handlers:
+            read_settled(self.tail, handlers, event, final=final,
+                         chunk_size=min(handler.chunk_size for handler in handlers))
+
+class ResponderHandler(GladiusHandler):
+    """
+    Watch for new hash files and queue them for cracking
+    """
+
+    patterns = ["*NTLM*.txt", "*hashes*"]
+
+    types = responder_types
+
+    def __init__(self):
+        # path -> parser following that file across reads
+        self.parsers = {}
+        super(ResponderHandler, self).__init__()
+
+    def apply(self, path, parsed):
+        """
+        Register parsed hashes and captures from path.
+
+        Returns:
+            OrderedDict of hash mode to the hashes to crack
+        """
+        new_hashes = OrderedDict()
+        for item in parsed:
+            if item.kind == 'hash':
+                if register_hash(item.hash, item.username, source=path):
+                    info("New hash to crack: {}:{}".format(item.username, item.hash))
+            elif item.kind == 'capture':
+                if not register_capture(item.hash, item.mode, source=path):
+                    continue
+                if not should_crack_capture(item.hash, self.outpath):
+                    verbose("Not cracking another capture of an account: {}".format(item.hash))
+                    continue
+                info("New hash to crack: {}".format(item.hash))
+
+            hashes = new_hashes.get(item.mode)
+            if hashes is None:
+                hashes = new_hashes[item.mode] = OrderedDict()
+            hashes[item.hash] = None
+
+        return OrderedDict((mode, list(hashes)) for mode, hashes in new_hashes.items())
+
+    def process(self, event):
+        data = self.get_lines(event)
+
+        # Nothing but blank lines
+        if not any(data):
+            return
+
+        # A file may be read in several pieces, keep the type resolved from the first
+        parser = self.parsers.get(event.src_path)
+        if parser is None:
+            parser = self.parsers[event.src_path] = ResponderParser(event.src_path)
+        parsed = parser.parse(data)
+        for hash_type, new_hashes in self.apply(event.src_path, parsed).items():
+            self.call_hashcat(hash_type, new_hashes)
+
+class SecretsdumpHandler(GladiusHandler):
+    """
+    Watch for new secretsdump files and queue their hashes for cracking
+    """
+
+    patterns = ["*secretsdump*"]
+
+    def __init__(self):
+        # path -> parser following that file across reads
+        self.parsers = {}
+        super(SecretsdumpHandler, self).__init__()
+
+    def apply(self, path, parsed):
+        """
+        Register and report what was parsed from path.
+
+        Returns:
+            OrderedDict of hash mode to the hashes to crack
+        """
+        new_hashes = OrderedDict()
+        for item in parsed:
+            if item.kind == 'hash':
+                # An OrderedDict per mode dedupes in constant time and keeps the dump's order
+                hashes = new_hashes.get(item.mode)
+                if hashes is None:
+                    hashes = new_hashes[item.mode] = OrderedDict()
+                hashes[item.hash] = None
+
+                if register_hash(item.hash, item.username, source=path):
+                    info("New hash to crack: {}:{}".format(item.username, item.hash))
+
+            elif item.kind == 'cached':
+                # The same logon dumped from several hosts is cracked once
+                if register_cached(item.hash, item.username, source=path):
+                    info("New cached logon to crack: {}".format(item.hash))
+                    hashes = new_hashes.get(item.mode)
+                    if hashes is None:
+                        hashes = new_hashes[item.mode] = OrderedDict()
+                    hashes[item.hash] = None
+
+            elif item.kind == 'default':
+                success("Default password: {}".format(item.hash))
+                ledger.add('', '', item.hash, mode='default', source=path)
+
+            elif item.kind == 'service':
+                success(item.hash)
+                # DOMAIN\user:password of the account the service runs as
+                account, sep, password = item.hash.partition(':')
+                if sep:
+                    ledger.record(account, password, mode='service', source=path)
+
+        return OrderedDict((mode, list(hashes)) for mode, hashes in new_hashes.items())
+
+    def process(self, event):
+        data = self.get_lines(event)
+
+        # A file may be read in several pieces, continue in the section
+        # the previous piece ended in
+        parser = self.parsers.setdefault(event.src_path, SecretsdumpParser())
+        parsed = parser.parse(data)
+
+        for hash_type, new_hashes in self.apply(event.src_path, parsed).items():
+            self.call_hashcat(hash_num=hash_type, hashes=new_hashes)
+
+    def state(self, path):
+        # The section the dump was in, lines after the offset belong to it
+        parser = self.parsers.get(path)
+        return parser.section if parser is not None else None
+
+    def resume(self, path, state):
+        if state is not None and path not in self.parsers:
+            self.parsers[path] = SecretsdumpParser(state)
+
+################################################################################
+# Backfill
+################################################################################
+
+FileStat = namedtuple('FileStat', ['st_ino', 'st_size', 'st_mtime'])
+
+# Handlers whose parsing can run in a backfill worker process
+backfill_handlers = ['ResponderHandler', 'SecretsdumpHandler']
+
+def backfill_route(path):
+    """Return the name of the handler whose patterns match path, if any"""
+    for name in backfill_handlers:
+        handler = globals()[name]
+        if any(fnmatch.fnmatch(path.lower(), pattern.lower()) for pattern in handler.patterns):
+            return name
+    return None
+
+def backfill_parse(job):
+    """
+    Parse a whole file in a backfill worker process.
+
+    Args:
+        job (tuple): (path, handler name)
+
+    Returns:
+        (path, handler name, list of Parsed, number of lines, parser state)
+        or None if unreadable
+    """
+    path, name = job
+    parser = ResponderParser(path) if name == 'ResponderHandler' else SecretsdumpParser()
+    try:
+        # Stream the file, it can be large
+        with open(path, 'r') as f:
+            parsed = parser.parse(f)
+    except IOError:
+        return None
+    return path, name, parsed, parser.lines, getattr(parser, 'section', None)
+
+def backfill(directories, processes=None, handlers=None):
+    """
+    Ingest the files already sitting in directories.
+
+    Every file a handler would watch for is parsed across a process pool.
+    The results are registered in this process and merged into one
+    deduplicated set of hashes per hash type, which is submitted as a
+    single crack job each. Files are recorded in the fingerprint index by
+    absolute path, as watchdog reports them, so neither a later event nor
+    the next backfill parses them again.
+
+    Args:
+        handlers (dict): Handler name -> the handler instance that goes on
+            watching the files, so that it carries on parsing where the
+            backfill stopped. New instances if not given
+
+    Returns:
+        dict of throughput figures
+    """
+    start = time.time()
+    handlers = handlers or dict((name, globals()[name]()) for name in backfill_handlers)
+
+    jobs = []
+    stats_by_path = {}
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for filename in files:
+                path = os.path.abspath(os.path.join(root, filename))
+                name = backfill_route(path)
+                if name is None:
+                    continue
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                stat = FileStat(stat.st_ino, stat.st_size, stat.st_mtime)
+                if fingerprints.unchanged('{}:{}'.format(name, path), stat):
+                    continue
+
+                stats_by_path[path] = stat
+                jobs.append((path, name))
+
+    info("Backfilling {} files from {}".format(len(jobs), ', '.join(directories)))
+
+    new_hashes = OrderedDict()
+    files = lines = size = 0
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(backfill_parse, jobs, chunksize=8):
+            if result is None:
+                continue
+
+            path, name, parsed, count, state = result
+            handler = handlers[name]
+            for mode, hashes in handler.apply(path, parsed).items():
+                new_hashes.setdefault(mode, OrderedDict()).update((hash, None) for hash in hashes)
+
+            # Lines appended later are parsed in the state the file ended in
+            handler.resume(path, state)
+            stat = stats_by_path[path]
+            fingerprints.record('{}:{}'.format(name, path), stat, stat.st_size, state=handler.state(path))
+            files += 1
+            lines += count
+            size += stat.st_size
+    finally:
+        pool.close()
+        pool.join()
+
+    for mode, hashes in new_hashes.items():
+        info("Submitting {} unique {} hashes".format(len(hashes), hash_names.get(mode, mode)))
+        handlers['ResponderHandler'].call_hashcat(mode, list(hashes))
+
+    elapsed = max(time.time() - start, 0.001)
+    result = {
+        'files': files,
+        'lines': lines,
+        'bytes': size,
+        'seconds': elapsed,
+        'hashes': dict((mode, len(hashes)) for mode, hashes in new_hashes.items()),
+    }
+    info("Backfilled {} files, {} lines ({:.2f} MB) in {:.2f}s: {:.0f} files/s, {:.0f} lines/s, {:.2f} MB/s".format(
+         files, lines, size / 1048576.0, elapsed, files / elapsed, lines / elapsed, size / 1048576.0 / elapsed))
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-v', '--verbose', action="store_true", default=False, help="Increased output verbosity")
+    parser.add_argument('--responder-dir', default="/usr/share/responder", help="Directory to watch for Responder output")
+    parser.add_argument('--hashcat', default="/usr/share/hashcat/hashcat.bin", help="Path to hashcat binary")
+    parser.add_argument('--john', default="john", help="Path to John the Ripper binary")
+    parser.add_argument('--cracker', action='append', default=[], metavar='MODE=BACKEND', help="Crack a hash mode with another backend than hashcat: john, inprocess, or distributed with --coordinator. Repeat for more modes, e.g. --cracker 5600=inprocess")
+    parser.add_argument('--coordinator', default=None, metavar='[HOST:]PORT', help="Listen for crack workers on this address and crack every hash mode not given to another backend with --cracker on them. Needs --worker-key unless HOST is loopback")
+    parser.add_argument('--worker', default=None, metavar='HOST:PORT', help="Run as a crack worker of the coordinator at HOST:PORT instead of watching for files")
+    parser.add_argument('--worker-backend', default='hashcat', choices=['hashcat', 'john', 'inprocess'], help="Backend a worker cracks its shards with")
+    parser.add_argument('--worker-key', default=None, help="Shared key workers present to the coordinator")
+    parser.add_argument('--worker-timeout', type=float, default=30, help="Seconds without a word from a worker before its shard goes to another")
+    parser.add_argument('-r', '--ruleset', default="hob064.rule", help="Ruleset to use with hashcat")
+    parser.add_argument('-w', '--wordlist', default="/usr/share/wordlists/rockyou.txt", help="Wordlist to use with hashcat")
+    parser.add_argument('--no-art', action="store_true", default=False, help="Disable the sword ascii art for displaying credentials and default to only text.")
+    parser.add_argument('--attack-plan', default=None, metavar='FILE', help="JSON file of attacks to try in turn per hash mode, each on the hashes the previous left uncracked. Defaults to --wordlist with --ruleset")
+    parser.add_argument('--quick-pass', type=int, default=1000, metavar='N', help="Try new NetNTLMv1/v2 captures against the top N passwords on every CPU before queueing them for cracking, 0 to disable")
+    parser.add_argument('--quick-wordlist', default=None, help="Wordlist to take the top passwords from, most common first. Defaults to --wordlist")
+    parser.add_argument('--verify-all-users', action="store_true", default=False, help="Check every cracked password against the outstanding hashes of all users, not only those of the same user")
+    parser.add_argument('--feedback-delay', type=float, default=30, help="Seconds to wait after cracked passwords grow the feedback wordlist before running it against the uncracked hashes, 0 to disable")
+    parser.add_argument('--max-jobs', type=int, default=1, help="Maximum number of hashcat processes to run at once")
+    parser.add_argument('--batch-window', type=float, default=5, help="Seconds to collect hashes of the same type into one hashcat job")
+    parser.add_argument('--cached-window', type=float, default=60, help="Seconds to collect DCC2 cached logons from every host into one job, as each job of them is slow")
+    parser.add_argument('--quiet-period', type=float, default=1, help="Seconds a file must go without changes before it is processed")
+    parser.add_argument('--max-latency', type=float, default=10, help="Maximum seconds to wait before processing a file that keeps changing")
+    parser.add_argument('--pot-cache', default=os.path.expanduser(os.path.join('~', '.gladius', 'gladius.pot')), help="Potfile of cracked NTLM hashes shared between engagements")
+    parser.add_argument('--import-pot', nargs='+', default=[], metavar='POTFILE', help="Add the NTLM hashes of existing hashcat potfiles to the pot cache")
+    parser.add_argument('--status-interval', type=float, default=60, help="Seconds between printing the progress of running hashcat jobs, 0 to disable")
+    parser.add_argument('--stats-interval', type=float, default=300, help="Seconds between printing crack statistics when they change, 0 to only print them on exit")
+    parser.add_argument('--metrics-port', type=int, default=0, help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics, 0 to disable")
+    parser.add_argument('--backfill', nargs='+', default=[], metavar='DIR', help="Parse every existing file under these directories, then keep watching as usual")
+    parser.add_argument('--processes', type=int, default=None, help="Number of processes to parse backfilled files and run the quick pass with, defaults to the number of CPUs")
+    parser.add_argument('--creds', nargs='*', default=None, metavar='FIELD=VALUE', help="Print the credentials of the engagement matching every FIELD=VALUE given, by user, domain, hash or source, then exit. A bare VALUE is a user")
+    parser.add_argument('--creds-format', default='text', choices=['text', 'csv', 'json'], help="Format --creds prints the credentials in")
+    parser.add_argument('--reprocess', action="store_true", default=False, help="Ignore the fingerprints of files processed by a previous run and process everything again.")
+    args = parser.parse_args()
+
+    ledger_path = os.path.join('engagement', 'credentials.jsonl')
+    if args.creds is not None:
+        filters = {}
+        for term in args.creds:
+            field, sep, value = term.partition('=')
+            # A bare term is a user
+            if not sep:
+                field, value = 'user', term
+            filters[field] = value
+        ledger.load(ledger_path)
+        try:
+            ledger.export(ledger.query(**filters), sys.stdout, format=args.creds_format)
+        except ValueError as e:
+            warning(str(e))
+            exit(1)
+        exit(0)
+
+    for curr_arg in [args.hashcat, args.ruleset, args.wordlist]:
+        if not os.path.exists(curr_arg):
+            warning("Argument not found: {}. Ensure the file exists.".format(curr_arg))
+            exit(1)
+
+    verbosity = args.verbose
+    verify_all_users = args.verify_all_users
+    if args.no_art:
+        print color('Awe, no swords? Okay, fine..', color='yellow')
+        art = False
+
+    print_banner()
+
+    backends = {
+        'hashcat': HashcatBackend(args.hashcat, args.ruleset, args.wordlist, outfile_format=hashcat_outfile_format()),
+        'john': JohnBackend(args.john, args.wordlist),
+        'inprocess': InProcessBackend(args.wordlist),
+    }
+
+    # A worker cracks what its coordinator hands it and nothing else
+    if args.worker:
+        worker = WorkerAgent(parse_address(args.worker), backends[args.worker_backend], key=args.worker_key)
+        info("Cracking with {} for the coordinator at {}".format(args.worker_backend, args.worker))
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            worker.stop()
+        exit(0)
+
+    potcache.open(args.pot_cache)
+    for potfile in args.import_pot:
+        if not os.path.exists(potfile):
+            warning("Potfile not found: {}".format(potfile))
+            continue
+        info("Imported {} hashes from {}".format(potcache.import_potfile(potfile), potfile))
+
+    # Pick the engagement back up where a previous run left off
+    if not os.path.exists('engagement'):
+        os.makedirs('engagement')
+    # Before the journal is replayed, so the credentials it restores are not added again
+    ledger.open(ledger_path)
+
+    journal_path = os.path.join('engagement', 'state.journal')
+    unfinished = journal.restore(journal_path)
+    journal.open(journal_path)
+
+    debouncer = Debouncer(quiet=args.quiet_period, max_latency=args.max_latency)
+    routes = {}
+    if args.coordinator:
+        address = parse_address(args.coordinator)
+        # Workers are handed the hashes, so only known ones may connect from elsewhere
+        if not args.worker_key and not is_loopback(address[0]):
+            warning("--coordinator on {} needs a --worker-key, or listen on 127.0.0.1 only".format(address[0]))
+            exit(1)
+        backends['distributed'] = DistributedBackend(address, key=args.worker_key,
+                                                     timeout=args.worker_timeout)
+        routes['default'] = 'distributed'
+        info("Waiting for crack workers on {}:{}".format(*backends['distributed'].listen()))
+
+    for route in args.cracker:
+        mode, sep, name = route.partition('=')
+        if not sep or name not in backends:
+            warning("Unknown cracker: {}. Use MODE=BACKEND with one of {}".format(route, ', '.join(sorted(backends))))
+            exit(1)
+        routes[mode] = name
+
+    plans = {'default': [Attack(args.wordlist, args.ruleset, None)]}
+    if args.attack_plan:
+        try:
+            plans.update(load_attack_plan(args.attack_plan))
+        except (IOError, ValueError) as e:
+            warning("Unusable attack plan {}: {}".format(args.attack_plan, e))
+            exit(1)
+
+        for plan in plans.values():
+            for attack in plan:
+                for path in (attack.wordlist, attack.ruleset):
+                    if path and not os.path.exists(path):
+                        warning("Attack plan file not found: {}. Ensure the file exists.".format(path))
+                        exit(1)
+
+    scheduler = CrackScheduler(max_jobs=args.max_jobs, window=args.batch_window,
+                               backends=backends, routes=routes, plans=plans,
+                               windows={'2100': args.cached_window})
+    scheduler.resume(unfinished)
+
+    if args.feedback_delay:
+        feedback = FeedbackWordlist(os.path.join('engagement', 'feedback.dict'), delay=args.feedback_delay)
+        feedback.load()
+
+    # Skip files already processed by a previous run
+    fingerprint_path = os.path.join('engagement', 'fingerprints.json')
+    if not args.reprocess:
+        fingerprints.load(fingerprint_path)
 
     if outdated_hashcat():
         print color('''Current hashcat binary is out of date. 
@@ -541,35 +4121,84 @@ Please install the latest version: https://hashcat.net/hashcat/
 Add --hashcat to select the new binary.''', color='red')
         exit(1)
 
+    quick_wordlist = args.quick_wordlist or args.wordlist
+    if args.quick_pass and os.path.exists(quick_wordlist):
+        quickpass = QuickPass(QuickPass.top_words(quick_wordlist, args.quick_pass), processes=args.processes)
+        quickpass.start()
+        if DES is None:
+            info("Install pycrypto for the quick pass to check NetNTLMv1 captures too")
+    elif args.quick_pass:
+        warning("Quick pass wordlist not found: {}".format(quick_wordlist))
+
+    # One of each handler, shared by every directory it watches
+    responder = ResponderHandler()
+    secretsdump = SecretsdumpHandler()
+
+    if args.backfill:
+        backfill(args.backfill, processes=args.processes,
+                 handlers={'ResponderHandler': responder, 'SecretsdumpHandler': secretsdump})
+
     # Add more handlers to this list.
     # (Handler, watch directory)
-    handlers = [(ResponderHandler, args.responder_dir),
-                (CredsHandler, ResponderHandler().outpath),
-                (SecretsdumpHandler, args.responder_dir),
-                (CashCredsHandler, SecretsdumpHandler().outpath),
-                (CredsHandler, SecretsdumpHandler().outpath)]
+    handlers = [(responder, args.responder_dir),
+                (secretsdump, args.responder_dir)]
 
     # Listen for all .msf folders - .msf4 and .msf5
     for msf in [name for name in os.listdir('/root') if 'msf' in name]:
-        handlers.append((ResponderHandler, os.path.join('/root', msf, 'loot')))
+        handlers.append((responder, os.path.join('/root', msf, 'loot')))
+
+    # A single dispatcher per directory reads each file once for all of its handlers
+    watched = OrderedDict()
+    for handler, path in handlers:
+        watched.setdefault(os.path.abspath(path), []).append(handler)
 
     observer = Observer()
-    observers = []
 
-    for handler, path in handlers:
+    for path, routed in watched.items():
         if not os.path.exists(path):
             os.makedirs(path)
 
-        info("Watching ({}) for files with ({})".format(path, ', '.join(handler.patterns)))
-        observer.schedule(handler(), path=path, recursive=False)
+        for handler in routed:
+            info("Watching ({}) for files with ({})".format(path, ', '.join(handler.patterns)))
+        observer.schedule(Dispatcher(routed), path=path, recursive=False)
 
     observer.start()
+    debouncer.start()
+    scheduler.start()
+
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+        info("Serving metrics on http://127.0.0.1:{}/metrics".format(args.metrics_port))
 
+    last_save = last_stats = last_status = time.time()
     try:
         while True:
             time.sleep(1)
+            if fingerprints.dirty and time.time() - last_save > 30:
+                fingerprints.save(fingerprint_path)
+                last_save = time.time()
+
+            feedback.tick()
+
+            if args.status_interval and time.time() - last_status > args.status_interval:
+                for line in scheduler.status_lines():
+                    info(line)
+                last_status = time.time()
+
+            if args.stats_interval and stats.changed and time.time() - last_stats > args.stats_interval:
+                for line in stats.summary():
+                    info(line)
+                last_stats = time.time()
     except KeyboardInterrupt:
         observer.unschedule_all()
         observer.stop()
 
     observer.join()
+    fingerprints.save(fingerprint_path)
+    quickpass.close()
+    journal.close()
+    potcache.close()
+    ledger.close()
+
+    for line in stats.summary():
+        info(line)
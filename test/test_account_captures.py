@@ -0,0 +1,308 @@
+from collections import defaultdict
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import (CrackJob, CrackScheduler, Journal, deliver_result, ntlm_hash, register_capture, register_hash,
+                     should_crack_capture, widen)
+
+
+def netntlmv2(user, domain, password, challenge):
+    """Build a NetNTLMv2 capture of user with password"""
+    blob = '0101000000000000' + challenge * 2 + '00000000'
+    key = hmac.new(ntlm_hash(password), widen(user.upper() + domain), hashlib.md5).digest()
+    proof = hmac.new(key, (challenge + blob).decode('hex'), hashlib.md5).hexdigest()
+    return '{}::{}:{}:{}:{}'.format(user, domain, challenge, proof, blob)
+
+class Unscanned(dict):
+    """Captures that fail a test looking through all of them"""
+
+    def values(self):
+        raise AssertionError("Every capture was scanned")
+
+    itervalues = values
+
+
+FIRST = netntlmv2('bob', 'CORP', 'Winter2016!', '1122334455667788')
+RETRY = netntlmv2('bob', 'CORP', 'Winter2016!', '8877665544332211')
+CHANGED = netntlmv2('bob', 'CORP', 'Spring2017!', 'aabbccddeeff0011')
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.art', False)
+class TestAccountCaptures(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.patches = [patch('gladius.captures', {}),
+                        patch('gladius.capture_accounts', defaultdict(list)),
+                        patch('gladius.representatives', {}),
+                        patch('gladius.held_captures', defaultdict(list)),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.scheduler', Mock())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def capture(self, capture):
+        register_capture(capture, '5600')
+        return should_crack_capture(capture, self.directory)
+
+    def test_retries_are_held_back(self):
+        self.assertTrue(self.capture(FIRST))
+        self.assertFalse(self.capture(RETRY))
+        self.assertTrue(self.capture(FIRST.replace('bob', 'alice')))
+
+    def test_crack_settles_the_account(self):
+        self.capture(FIRST)
+        self.capture(RETRY)
+        self.capture(CHANGED)
+
+        deliver_result(FIRST, 'Winter2016!')
+
+        self.assertEqual(gladius.captures[RETRY.lower()]['password'], 'Winter2016!')
+        self.assertEqual(gladius.captures[CHANGED.lower()]['password'], '')
+        gladius.scheduler.withdraw.assert_called_once_with([RETRY])
+        gladius.scheduler.submit.assert_called_once_with('5600', [CHANGED], self.directory)
+
+    def test_captures_after_the_crack_are_verified(self):
+        self.capture(FIRST)
+        deliver_result(FIRST, 'Winter2016!')
+
+        self.assertFalse(self.capture(RETRY))
+        self.assertEqual(gladius.captures[RETRY.lower()]['password'], 'Winter2016!')
+        self.assertTrue(self.capture(CHANGED))
+
+
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+class TestExhaustedRepresentative(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist', window=0,
+                                        sessionpath=os.path.join(self.directory, 'sessions'))
+        self.patches = [patch('gladius.captures', {}),
+                        patch('gladius.capture_accounts', defaultdict(list)),
+                        patch('gladius.representatives', {}),
+                        patch('gladius.held_captures', defaultdict(list)),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.scheduler', self.scheduler)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def exhaust(self, capture):
+        job = CrackJob('5600', self.directory, session='gladius_5600')
+        job.add([capture])
+        job.proc = Mock(returncode=1)
+        self.scheduler.finish_job(job)
+
+    def test_next_held_capture_is_cracked_once_the_plan_runs_out(self):
+        for capture in (FIRST, RETRY, CHANGED):
+            register_capture(capture, '5600')
+            should_crack_capture(capture, self.directory)
+
+        self.exhaust(FIRST)
+        self.assertEqual(self.scheduler.batches['5600'].hashes, [RETRY])
+        self.assertIs(gladius.representatives[('corp', 'bob')], gladius.captures[RETRY.lower()])
+
+        self.exhaust(RETRY)
+        self.assertEqual(self.scheduler.batches['5600'].hashes, [RETRY, CHANGED])
+        self.assertNotIn(('corp', 'bob'), gladius.held_captures)
+
+    def test_earlier_tiers_do_not_promote(self):
+        self.scheduler.plans['5600'] = [gladius.Attack('wordlist', None, None), gladius.Attack('wordlist', 'rules', None)]
+        for capture in (FIRST, RETRY):
+            register_capture(capture, '5600')
+            should_crack_capture(capture, self.directory)
+
+        self.exhaust(FIRST)
+        self.assertEqual(self.scheduler.batches, {})
+        self.assertEqual(gladius.held_captures[('corp', 'bob')], [(RETRY, self.directory)])
+
+
+@patch('gladius.verbose', Mock())
+class TestHeldCapturesJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'state.journal')
+        self.journal = Journal()
+        self.patches = [patch('gladius.journal', self.journal),
+                        patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.cached_logons', {}),
+                        patch('gladius.captures', {}),
+                        patch('gladius.capture_accounts', defaultdict(list)),
+                        patch('gladius.representatives', {}),
+                        patch('gladius.held_captures', defaultdict(list)),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.scheduler', Mock())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def restore(self):
+        for state in (gladius.captures, gladius.capture_accounts, gladius.representatives, gladius.held_captures):
+            state.clear()
+        self.journal.restore(self.path)
+
+    def test_held_captures_survive_a_restart(self):
+        self.journal.open(self.path)
+        for capture in (FIRST, RETRY, CHANGED):
+            register_capture(capture, '5600')
+            should_crack_capture(capture, self.directory)
+        gladius.promote_held([FIRST])
+        self.journal.close()
+
+        # Once from the journal as written, once from the compacted journal
+        for restore in range(2):
+            self.restore()
+            self.assertIs(gladius.representatives[('corp', 'bob')], gladius.captures[RETRY.lower()])
+            self.assertEqual(gladius.held_captures[('corp', 'bob')], [(CHANGED, self.directory)])
+
+    def test_cracked_account_holds_nothing_after_a_restart(self):
+        self.journal.open(self.path)
+        for capture in (FIRST, RETRY):
+            register_capture(capture, '5600')
+            should_crack_capture(capture, self.directory)
+        with patch('gladius.success', Mock()), patch('gladius.art', False), patch('gladius.ledger', Mock()):
+            deliver_result(FIRST, 'Winter2016!')
+        self.journal.close()
+
+        with patch('gladius.ledger', Mock()):
+            self.restore()
+        self.assertEqual(dict(gladius.held_captures), {})
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.info', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+@patch('gladius.art', False)
+class TestSettlePassword(unittest.TestCase):
+    def setUp(self):
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.capture_accounts', defaultdict(list)),
+                        patch('gladius.capture_users', defaultdict(list)),
+                        patch('gladius.representatives', {}),
+                        patch('gladius.held_captures', defaultdict(list)),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.scheduler', Mock())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_ntlm_crack_opens_captures_of_the_user(self):
+        nthash = ntlm_hash('Winter2016!').encode('hex')
+        register_hash(nthash, 'CORP.LOCAL\\Bob')
+        register_capture(FIRST, '5600')
+        alice = netntlmv2('alice', 'CORP', 'Winter2016!', '1122334455667788')
+        register_capture(alice, '5600')
+
+        deliver_result(nthash, 'Winter2016!')
+
+        self.assertEqual(gladius.captures[FIRST.lower()]['password'], 'Winter2016!')
+        self.assertEqual(gladius.captures[alice.lower()]['password'], '')
+        gladius.scheduler.withdraw.assert_called_once_with([FIRST])
+
+    @patch('gladius.captures', Unscanned())
+    def test_only_the_users_captures_are_checked(self):
+        nthash = ntlm_hash('Winter2016!').encode('hex')
+        register_hash(nthash, 'CORP.LOCAL\\Bob')
+        register_capture(FIRST, '5600')
+        for user in ('alice', 'carol', 'dave'):
+            register_capture(netntlmv2(user, 'CORP', 'Winter2016!', '1122334455667788'), '5600')
+
+        with patch('gladius.verify_capture', wraps=gladius.verify_capture) as check:
+            deliver_result(nthash, 'Winter2016!')
+
+        self.assertEqual(set(call[0][0]['user'] for call in check.call_args_list), set(['bob']))
+        self.assertEqual(gladius.captures[FIRST.lower()]['password'], 'Winter2016!')
+
+    def test_all_users(self):
+        alice = netntlmv2('alice', 'CORP', 'Winter2016!', '1122334455667788')
+        register_capture(FIRST, '5600')
+        register_capture(alice, '5600')
+
+        with patch('gladius.verify_all_users', True):
+            deliver_result(FIRST, 'Winter2016!')
+
+        self.assertEqual(gladius.captures[alice.lower()]['password'], 'Winter2016!')
+
+    def test_capture_crack_opens_ntlm_hash(self):
+        nthash = ntlm_hash('Winter2016!').encode('hex')
+        register_hash(nthash, 'Administrator')
+        register_capture(FIRST, '5600')
+
+        deliver_result(FIRST, 'Winter2016!')
+
+        self.assertEqual(gladius.ntlm_hashes[nthash]['password'], 'Winter2016!')
+        gladius.scheduler.withdraw.assert_called_once_with([nthash])
+
+
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+class TestWithdraw(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist', window=0,
+                                        sessionpath=os.path.join(self.directory, 'sessions'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_withdraw_from_batches_and_queue(self):
+        self.scheduler.max_jobs = 0
+        self.scheduler.submit('5600', [FIRST, RETRY], self.directory)
+        self.scheduler.tick()
+        self.scheduler.submit('5600', [CHANGED], self.directory)
+
+        self.scheduler.withdraw([RETRY, CHANGED])
+
+        self.assertEqual(self.scheduler.batches, {})
+        job = self.scheduler.queue[0][2]
+        self.assertEqual(job.hashes, [FIRST])
+        with open(job.hashfile) as f:
+            self.assertEqual(f.read(), FIRST + '\n')
+
+        self.scheduler.withdraw([FIRST])
+        self.assertEqual(self.scheduler.queue, [])
+
+    def test_withdraw_cancels_running_job(self):
+        job = CrackJob('5600', self.directory, session='gladius_5600')
+        job.add([FIRST, RETRY])
+        job.proc = Mock()
+        backend = job.backend = Mock()
+        self.scheduler.running.append(job)
+
+        with patch('gladius.is_cracked', lambda hash: hash == FIRST):
+            self.scheduler.withdraw([CHANGED])
+            self.assertFalse(backend.cancel.called)
+
+            self.scheduler.withdraw([RETRY])
+            backend.cancel.assert_called_once_with(job)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+from StringIO import StringIO
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import (CrackJob, CrackScheduler, InProcessBackend, JohnBackend, dcc2_checker, md4, netntlmv2_checker,
+                     ntlm_hash, register_capture, register_hash)
+
+# Example NetNTLMv2 hash from the hashcat wiki, the password is hashcat
+NETNTLMV2 = ('admin::N46iSNekpT:08ca45b7d7ea58ee:88dcbe4446168966a153a0064958dac6:5c7830315c783031000000000000'
+             '0b45c67103d07d7b95acd12ffa11230e0000000052920b85f78d013c31cdb3b92f5d765c783030')
+NTLM = '8846f7eaee8fb117ad06bdd830b7586c'
+# Example DCC2 hash from the hashcat wiki, the password is hashcat
+DCC2 = '$DCC2$10240#tom#e4e938d12fe5974dc42a90120bd9c90f'
+
+
+class TestHashes(unittest.TestCase):
+    def test_md4(self):
+        self.assertEqual(md4('').encode('hex'), '31d6cfe0d16ae931b73c59d7e0c089c0')
+        self.assertEqual(md4('abc').encode('hex'), 'a448017aaf21d8525fc10ae87aa6729d')
+        self.assertEqual(md4('a' * 100).encode('hex'), 'a2a3c7c3ee6088bad252bfbbae229bb6')
+
+    def test_ntlm_hash(self):
+        self.assertEqual(ntlm_hash('password').encode('hex'), NTLM)
+
+    def test_netntlmv2_checker(self):
+        check = netntlmv2_checker(NETNTLMV2)
+        self.assertTrue(check(ntlm_hash('hashcat')))
+        self.assertFalse(check(ntlm_hash('password')))
+
+    def test_dcc2_checker(self):
+        check = dcc2_checker(DCC2)
+        self.assertTrue(check(ntlm_hash('hashcat')))
+        self.assertFalse(check(ntlm_hash('password')))
+
+
+class TestJohnBackend(unittest.TestCase):
+    def test_john_results_match_pot_notation(self):
+        directory = tempfile.mkdtemp()
+        try:
+            job = CrackJob('5600', directory, session='gladius_5600')
+            job.hashfile = os.path.join(directory, 'hashes')
+            job.outfile = os.path.join(directory, 'pot')
+            with open(job.hashfile, 'w') as f:
+                f.write(NETNTLMV2 + '\n')
+            with open(job.outfile, 'w') as f:
+                f.write('$NETNTLMv2$ADMINN46iSNekpT$08ca45b7d7ea58ee$88dcbe4446168966a153a0064958dac6$5c78:pass:word\n')
+
+            backend = JohnBackend('john', 'wordlist')
+            with patch('gladius.subprocess') as mock_subprocess:
+                mock_subprocess.Popen.return_value.stdout = StringIO('')
+                backend.start(job, os.path.join(directory, 'gladius_5600.restore'))
+
+            self.assertEqual(backend.results(job), [(NETNTLMV2, 'pass:word')])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_john_identity(self):
+        self.assertEqual(JohnBackend.identity(NTLM.upper()), NTLM)
+        self.assertEqual(JohnBackend.identity('$DCC2$10240#bob#0123456789abcdef0123456789abcdef'),
+                         '0123456789abcdef0123456789abcdef')
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+@patch('gladius.art', False)
+class TestInProcessBackend(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        wordlist = os.path.join(self.directory, 'wordlist')
+        with open(wordlist, 'w') as f:
+            f.write('123456\npassword\nhashcat\n')
+
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.stats', gladius.CrackStats())]
+        for p in self.patches:
+            p.start()
+
+        backend = InProcessBackend(wordlist)
+        self.scheduler = CrackScheduler(window=0, sessionpath=os.path.join(self.directory, 'sessions'),
+                                        backends={'inprocess': backend},
+                                        routes={'1000': 'inprocess', '5600': 'inprocess'})
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def run_jobs(self, timeout=30):
+        deadline = time.time() + timeout
+        self.scheduler.tick()
+        while self.scheduler.running and time.time() < deadline:
+            time.sleep(0.05)
+            self.scheduler.tick()
+
+    def test_inprocess_cracks_routed_modes(self):
+        register_capture(NETNTLMV2, '5600')
+        register_hash(NTLM, 'Administrator')
+
+        self.scheduler.submit('5600', [NETNTLMV2], self.directory)
+        self.scheduler.submit('1000', [NTLM, '31d6cfe0d16ae931b73c59d7e0c089c1'], self.directory)
+        self.run_jobs()
+
+        self.assertEqual(gladius.captures[NETNTLMV2.lower()]['password'], 'hashcat')
+        self.assertEqual(gladius.ntlm_hashes[NTLM]['password'], 'password')
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'sessions')), [])
+
+    def test_queued_job_is_journaled_without_a_hashfile(self):
+        self.scheduler.max_jobs = 0
+        self.scheduler.submit('1000', [NTLM, '31d6cfe0d16ae931b73c59d7e0c089c0'], self.directory)
+        self.scheduler.tick()
+
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'sessions')), [])
+        record = dict(gladius.journal.write.call_args[1], state='running')
+        self.assertEqual(record['hashfile'], None)
+
+        # Withdrawn hashes leave the journaled job too
+        self.scheduler.withdraw([NTLM])
+        record = dict(gladius.journal.write.call_args[1], state='running')
+        self.assertEqual(record['hashes'], ['31d6cfe0d16ae931b73c59d7e0c089c0'])
+
+        resumed = CrackScheduler(window=0, sessionpath=os.path.join(self.directory, 'sessions'),
+                                 backends=self.scheduler.backends, routes=self.scheduler.routes)
+        resumed.resume([record])
+        self.assertEqual(resumed.queue[0][2].hashes, ['31d6cfe0d16ae931b73c59d7e0c089c0'])
+
+    def test_cancel_queued_job(self):
+        self.scheduler.max_jobs = 0
+        self.scheduler.submit('1000', [NTLM], self.directory)
+        self.scheduler.tick()
+        job = self.scheduler.queue[0][2]
+
+        self.scheduler.cancel(job)
+
+        self.assertEqual(self.scheduler.queue, [])
+        self.assertEqual(gladius.journal.write.call_args[1]['state'], 'cancelled')
+
+if __name__ == '__main__':
+    unittest.main()
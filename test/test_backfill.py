@@ -0,0 +1,152 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import FingerprintIndex, backfill, backfill_route, parse_responder, parse_secretsdump, responder_mode
+
+SECRETSDUMP = '''[*] Service RemoteRegistry is in stopped state
+[*] Dumping local SAM hashes (uid:rid:lmhash:nthash)
+Administrator:500:aad3b435b51404eeaad3b435b51404ee:8846f7eaee8fb117ad06bdd830b7586c:::
+Guest:501:aad3b435b51404eeaad3b435b51404ee:31d6cfe0d16ae931b73c59d7e0c089c0:::
+[*] Dumping cached domain logon information (uid:encryptedHash:longDomain:domain)
+bob:0123456789abcdef0123456789abcdef:CORP.LOCAL:CORP:::
+[*] Dumping LSA Secrets
+[*] DefaultPassword
+Winter2016!
+'''
+
+CAPTURE = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+
+
+class TestParsers(unittest.TestCase):
+    def test_parse_secretsdump(self):
+        parsed, mode = parse_secretsdump(SECRETSDUMP.split('\n'))
+
+        self.assertEqual([(item.kind, item.hash) for item in parsed], [
+            ('hash', '8846f7eaee8fb117ad06bdd830b7586c'),
+            ('hash', '31d6cfe0d16ae931b73c59d7e0c089c0'),
+            ('cached', '$DCC2$10240#bob#0123456789abcdef0123456789abcdef'),
+            ('default', 'Winter2016!'),
+        ])
+        self.assertEqual(mode, '')
+
+    def test_parse_secretsdump_ntds(self):
+        parsed, mode = parse_secretsdump([
+            '[*] Dumping Domain Credentials (domain\\uid:rid:lmhash:nthash)',
+            '[*] Using the DRSUAPI method to get NTDS.DIT secrets',
+            'CORP.LOCAL\\alice:1104:aad3b435b51404eeaad3b435b51404ee:8846f7eaee8fb117ad06bdd830b7586c::: (status=Enabled)',
+            'DC01$:1000:aad3b435b51404eeaad3b435b51404ee:0123456789abcdef0123456789abcdef:::',
+            '[*] Kerberos keys grabbed',
+            'CORP.LOCAL\\alice:aes256-cts-hmac-sha1-96:00112233',
+        ])
+
+        self.assertEqual(parsed, [gladius.Parsed('hash', '1000', '8846f7eaee8fb117ad06bdd830b7586c', 'CORP.LOCAL\\alice')])
+        self.assertEqual(mode, '')
+
+    def test_responder_mode_from_file_name(self):
+        self.assertEqual(responder_mode('/loot/hashes/SMB-NTLMv2-SSP-10.0.0.1.txt'), '5600')
+        self.assertEqual(responder_mode('/loot/SMB-NTLMv1-SSP-10.0.0.1.txt'), '5500')
+        self.assertEqual(responder_mode('/loot/10.0.0.5_hashes.txt'), '1000')
+        self.assertEqual(responder_mode('/loot/HTTP-NTLM-10.0.0.1.txt'), None)
+
+    def test_parse_responder_sniffs_unnamed_files(self):
+        v1 = 'bob::CORP:' + '11' * 24 + ':' + '22' * 24 + ':1122334455667788'
+        self.assertEqual(parse_responder('HTTP-NTLM-10.0.0.1.txt', ['', CAPTURE + '\r\n', CAPTURE]),
+                         [gladius.Parsed('capture', '5600', CAPTURE, None)] * 2)
+        self.assertEqual(parse_responder('HTTP-NTLM-10.0.0.2.txt', [v1]), [gladius.Parsed('capture', '5500', v1, None)])
+
+    def test_parse_responder_hashdump(self):
+        lines = ['Administrator:500:aad3b435b51404eeaad3b435b51404ee:8846f7eaee8fb117ad06bdd830b7586c:::',
+                 'HOST$:1000:aad3b435b51404eeaad3b435b51404ee:31d6cfe0d16ae931b73c59d7e0c089c0:::',
+                 'garbage']
+        self.assertEqual(parse_responder('10.0.0.5_hashes.txt', lines),
+                         [gladius.Parsed('hash', '1000', '8846f7eaee8fb117ad06bdd830b7586c', 'Administrator')])
+
+    def test_backfill_route(self):
+        self.assertEqual(backfill_route('/loot/SMB-NTLMv2-SSP-10.0.0.1.txt'), 'ResponderHandler')
+        self.assertEqual(backfill_route('/loot/secretsdump_10.0.0.1'), 'SecretsdumpHandler')
+        self.assertEqual(backfill_route('/loot/Responder-Session.log'), None)
+
+
+@patch('gladius.info', Mock())
+@patch('gladius.success', Mock())
+@patch('gladius.journal', Mock())
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write('secretsdump_10.0.0.1', SECRETSDUMP)
+        self.write(os.path.join('host2', 'secretsdump_10.0.0.2'), SECRETSDUMP)
+        self.write('SMB-NTLMv2-SSP-10.0.0.3.txt', '\n'.join([CAPTURE, CAPTURE]) + '\n')
+        self.write('Responder-Session.log', 'nothing to see\n')
+
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.cached_logons', {}),
+                        patch('gladius.representatives', {}),
+                        patch('gladius.held_captures', defaultdict(list)),
+                        patch('gladius.capture_users', defaultdict(list)),
+                        patch('gladius.cached_users', defaultdict(list)),
+                        patch('gladius.fingerprints', FingerprintIndex()),
+                        patch('gladius.resolve_cached', lambda hashes: hashes),
+                        patch('gladius.scheduler')]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(data)
+
+    def test_backfill_merges_and_submits_once_per_type(self):
+        result = backfill([self.directory], processes=2)
+
+        self.assertEqual(result['files'], 3)
+        self.assertEqual(result['hashes'], {'1000': 2, '2100': 1, '5600': 1})
+
+        submitted = dict((call[0][0], call[0][1]) for call in gladius.scheduler.submit.call_args_list)
+        self.assertEqual(sorted(submitted['1000']), ['31d6cfe0d16ae931b73c59d7e0c089c0', '8846f7eaee8fb117ad06bdd830b7586c'])
+        self.assertEqual(submitted['5600'], [CAPTURE])
+        self.assertEqual(submitted['2100'], ['$DCC2$10240#bob#0123456789abcdef0123456789abcdef'])
+        self.assertEqual(gladius.ntlm_hashes['8846f7eaee8fb117ad06bdd830b7586c']['users'], ['Administrator'])
+
+    def test_backfill_skips_files_already_processed(self):
+        backfill([self.directory], processes=1)
+        result = backfill([self.directory], processes=1)
+
+        self.assertEqual(result['files'], 0)
+
+    def test_backfill_records_absolute_paths(self):
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            backfill(['.'], processes=1)
+        finally:
+            os.chdir(cwd)
+
+        path = os.path.join(os.path.realpath(self.directory), 'secretsdump_10.0.0.1')
+        self.assertIn('SecretsdumpHandler:' + path, gladius.fingerprints.files)
+
+    def test_backfill_hands_parser_state_to_the_live_handler(self):
+        self.write('secretsdump_10.0.0.4', SECRETSDUMP.split('[*] Dumping cached')[0])
+        secretsdump = gladius.SecretsdumpHandler()
+
+        backfill([self.directory], processes=1,
+                 handlers={'ResponderHandler': gladius.ResponderHandler(), 'SecretsdumpHandler': secretsdump})
+
+        path = os.path.join(self.directory, 'secretsdump_10.0.0.4')
+        self.assertEqual(secretsdump.state(path), 'ntlm')
+        self.assertEqual(gladius.fingerprints.state('SecretsdumpHandler:' + path), 'ntlm')
+
+if __name__ == '__main__':
+    unittest.main()
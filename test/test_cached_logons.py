@@ -0,0 +1,85 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import CrackScheduler, SecretsdumpHandler, deliver_result, ntlm_hash, parse_secretsdump, register_hash
+
+# Example DCC2 hash from the hashcat wiki, the password is hashcat
+DCC2 = '$DCC2$10240#tom#e4e938d12fe5974dc42a90120bd9c90f'
+
+SECRETSDUMP = '''[*] Dumping cached domain logon information (uid:encryptedHash:longDomain:domain)
+tom:e4e938d12fe5974dc42a90120bd9c90f:CORP.LOCAL:CORP:::
+'''
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.info', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+@patch('gladius.art', False)
+class TestCachedLogons(unittest.TestCase):
+    def setUp(self):
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.cached_logons', {}),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.scheduler', Mock(submit=Mock(), withdraw=Mock()))]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_same_logon_from_several_hosts_is_cracked_once(self):
+        handler = SecretsdumpHandler()
+        parsed, mode = parse_secretsdump(SECRETSDUMP.split('\n'))
+
+        self.assertEqual(handler.apply('secretsdump_10.0.0.1', parsed), {'2100': [DCC2]})
+        self.assertEqual(handler.apply('secretsdump_10.0.0.2', parsed), {})
+        self.assertEqual(gladius.cached_logons[DCC2.lower()]['user'], 'CORP\\tom')
+
+    def test_crack_is_delivered_with_the_domain(self):
+        gladius.register_cached(DCC2, 'CORP\\tom')
+
+        self.assertEqual(deliver_result(DCC2, 'hashcat'), 'CORP tom hashcat')
+        self.assertTrue(gladius.is_cracked(DCC2))
+        self.assertEqual(deliver_result(DCC2, 'hashcat'), None)
+
+    def test_ntlm_crack_opens_cached_logon_of_the_user(self):
+        gladius.register_cached(DCC2, 'CORP\\tom')
+        nthash = ntlm_hash('hashcat').encode('hex')
+        register_hash(nthash, 'CORP.LOCAL\\tom')
+
+        deliver_result(nthash, 'hashcat')
+
+        self.assertEqual(gladius.cached_logons[DCC2.lower()]['password'], 'hashcat')
+        gladius.scheduler.withdraw.assert_called_once_with([DCC2])
+
+
+@patch('gladius.journal', Mock())
+class TestModeWindows(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_slow_mode_collects_longer(self):
+        scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist', window=0, windows={'2100': 60},
+                                   sessionpath=os.path.join(self.directory, 'sessions'))
+        scheduler.max_jobs = 0
+        scheduler.submit('1000', ['8846f7eaee8fb117ad06bdd830b7586c'], '.')
+        scheduler.submit('2100', [DCC2], '.')
+        scheduler.tick()
+
+        self.assertEqual(list(scheduler.batches), ['2100'])
+        self.assertEqual(len(scheduler.queue), 1)
+
+if __name__ == '__main__':
+    unittest.main()
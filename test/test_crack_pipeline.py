@@ -0,0 +1,88 @@
+from collections import defaultdict
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import CrackScheduler, register_capture, register_hash
+
+FAKE_CRACKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench', 'fake_cracker.py')
+
+CAPTURE = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+NTLM = '8846f7eaee8fb117ad06bdd830b7586c'
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+@patch('gladius.art', False)
+class TestCrackPipeline(unittest.TestCase):
+    """Run crack jobs through bench/fake_cracker.py in place of hashcat"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.answers = os.path.join(self.directory, 'answers')
+        with open(self.answers, 'w') as f:
+            f.write('{}\tWinter2016!\n'.format(CAPTURE))
+            f.write('{}\tP@ss:word\n'.format(NTLM))
+
+        # Run the fake cracker with this interpreter, whatever python is on the PATH
+        self.hashcat = os.path.join(self.directory, 'hashcat')
+        with open(self.hashcat, 'w') as f:
+            f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, FAKE_CRACKER))
+        os.chmod(self.hashcat, 0755)
+
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.ledger', gladius.CredentialLedger()),
+                        patch.dict(os.environ, {'FAKE_CRACKER_ANSWERS': self.answers})]
+        for p in self.patches:
+            p.start()
+
+        self.scheduler = CrackScheduler(self.hashcat, 'ruleset', 'wordlist', window=0,
+                                        sessionpath=os.path.join(self.directory, 'sessions'))
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def run_jobs(self, timeout=30):
+        deadline = time.time() + timeout
+        self.scheduler.tick()
+        while self.scheduler.running and time.time() < deadline:
+            time.sleep(0.05)
+            self.scheduler.tick()
+
+    def test_cracked_hashes_are_delivered(self):
+        register_capture(CAPTURE, '5600')
+        register_capture(CAPTURE.replace('bob', 'alice'), '5600')
+        register_hash(NTLM, 'Administrator')
+
+        self.scheduler.submit('5600', [CAPTURE, CAPTURE.replace('bob', 'alice')], self.directory)
+        self.scheduler.submit('1000', [NTLM], self.directory)
+        self.run_jobs()
+
+        self.assertEqual(gladius.captures[CAPTURE.lower()]['password'], 'Winter2016!')
+        self.assertEqual(gladius.captures[CAPTURE.replace('bob', 'alice').lower()]['password'], '')
+        self.assertEqual(gladius.ntlm_hashes[NTLM]['password'], 'P@ss:word')
+        self.assertEqual(gladius.stats.cracked, 2)
+
+    def test_finished_job_cleans_up(self):
+        register_capture(CAPTURE, '5600')
+        self.scheduler.submit('5600', [CAPTURE], self.directory)
+        self.run_jobs()
+
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'sessions')), [])
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith('.creds')], [])
+        self.assertEqual([(entry['domain'], entry['user'], entry['password']) for entry in gladius.ledger.query()],
+                         [('CORP', 'bob', 'Winter2016!')])
+
+if __name__ == '__main__':
+    unittest.main()
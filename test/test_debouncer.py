@@ -0,0 +1,134 @@
+from collections import defaultdict, namedtuple
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import Debouncer, FingerprintIndex, SecretsdumpHandler
+
+Event = namedtuple('Event', ['src_path'])
+
+
+class TestDebouncer(unittest.TestCase):
+    def setUp(self):
+        self.debouncer = Debouncer(quiet=1, max_latency=10)
+        self.handler = Mock()
+        self.event = Event('secretsdump_10.0.0.1')
+
+    def test_debouncer_holds_until_quiet(self):
+        self.debouncer.touch(self.handler, self.event, now=100)
+        self.debouncer.touch(self.handler, self.event, now=100.5)
+
+        self.assertEqual(self.debouncer.due(now=101), [])
+        self.assertEqual(self.debouncer.due(now=101.5), [(self.handler, self.event, False)])
+        self.assertEqual(self.debouncer.due(now=102), [])
+
+    def test_debouncer_final_once_closed(self):
+        self.debouncer.touch(self.handler, self.event, now=100)
+        self.debouncer.touch(self.handler, self.event, now=100.5, closed=True)
+        self.assertEqual(self.debouncer.due(now=101.5), [(self.handler, self.event, True)])
+
+        # Written to again after closing
+        self.debouncer.touch(self.handler, self.event, now=102, closed=True)
+        self.debouncer.touch(self.handler, self.event, now=102.5)
+        self.assertEqual(self.debouncer.due(now=103.5), [(self.handler, self.event, False)])
+
+    def test_debouncer_coalesces_events(self):
+        for now in range(5):
+            self.debouncer.touch(self.handler, self.event, now=100 + now * 0.1)
+        self.debouncer.tick(now=110)
+
+        self.handler.handle_event.assert_called_once_with(self.event, final=False)
+
+    def test_debouncer_max_latency(self):
+        for now in range(0, 20):
+            self.debouncer.touch(self.handler, self.event, now=100 + now * 0.5)
+
+        self.assertEqual(self.debouncer.due(now=110), [(self.handler, self.event, False)])
+
+    def test_debouncer_separate_paths(self):
+        other = Event('secretsdump_10.0.0.2')
+        self.debouncer.touch(self.handler, self.event, now=100)
+        self.debouncer.touch(self.handler, other, now=100.9)
+
+        self.assertEqual(self.debouncer.due(now=101.5), [(self.handler, self.event, False)])
+
+    @patch('gladius.debouncer')
+    @patch('gladius.os')
+    def test_handler_on_created_is_debounced(self, mock_os, mock_debouncer):
+        mock_os.path.isdir.return_value = False
+        handler = SecretsdumpHandler()
+        handler.process = Mock()
+
+        handler.on_created(self.event)
+        mock_debouncer.touch.assert_called_with(handler, self.event)
+        handler.process.assert_not_called()
+
+
+class TestSecretsdumpPieces(unittest.TestCase):
+    @patch('gladius.info')
+    def test_secretsdump_section_continues_across_reads(self, mock_info):
+        handler = SecretsdumpHandler()
+        handler.call_hashcat = Mock()
+        event = Event('secretsdump_10.0.0.3')
+
+        handler.get_lines = Mock(return_value=['[*] Dumping local SAM hashes (uid:rid:lmhash:nthash)'])
+        handler.process(event)
+
+        line = 'Administrator:500:aad3b435b51404eeaad3b435b51404ee:31d6cfe0d16ae931b73c59d7e0c089c0:::'
+        handler.get_lines = Mock(return_value=[line])
+        handler.process(event)
+
+        handler.call_hashcat.assert_called_with(hash_num='1000', hashes=['31d6cfe0d16ae931b73c59d7e0c089c0'])
+
+
+@patch('gladius.info', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.stats', Mock())
+class TestSplitWrites(unittest.TestCase):
+    LINE = 'Administrator:500:aad3b435b51404eeaad3b435b51404ee:31d6cfe0d16ae931b73c59d7e0c089c0:::'
+
+    def setUp(self):
+        self.patches = [patch('gladius.fingerprints', FingerprintIndex()),
+                        patch('gladius.ntlm_hashes', defaultdict(dict))]
+        for p in self.patches:
+            p.start()
+
+        self.directory = tempfile.mkdtemp()
+        self.event = Event(os.path.join(self.directory, 'secretsdump_10.0.0.4'))
+        self.debouncer = Debouncer(quiet=1, max_latency=10)
+        self.handler = SecretsdumpHandler()
+        self.handler.call_hashcat = Mock()
+        self.write('[*] Dumping local SAM hashes (uid:rid:lmhash:nthash)\n' + self.LINE[:40])
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        with open(self.event.src_path, 'a') as f:
+            f.write(data)
+
+    def settle(self, now, closed=False):
+        self.debouncer.touch(self.handler, self.event, now=now, closed=closed)
+        self.debouncer.tick(now=now + 2)
+
+    def test_quiet_writer_keeps_the_half_written_line(self):
+        self.settle(100)
+        self.assertFalse(self.handler.call_hashcat.called)
+        self.assertEqual(dict(gladius.ntlm_hashes), {})
+
+        self.write(self.LINE[40:] + '\n')
+        self.settle(110)
+        self.handler.call_hashcat.assert_called_once_with(hash_num='1000', hashes=['31d6cfe0d16ae931b73c59d7e0c089c0'])
+
+    def test_closed_file_takes_the_last_line(self):
+        self.write(self.LINE[40:])
+        self.settle(100, closed=True)
+        self.handler.call_hashcat.assert_called_once_with(hash_num='1000', hashes=['31d6cfe0d16ae931b73c59d7e0c089c0'])
+
+if __name__ == '__main__':
+    unittest.main()
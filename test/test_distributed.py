@@ -0,0 +1,193 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import (CrackJob, CrackScheduler, CrackerBackend, DistributedBackend, InProcessBackend, InProcessCrack,
+                     WorkerAgent, is_loopback, ntlm_hash, parse_address, register_capture, register_hash)
+
+# Example NetNTLMv2 hash from the hashcat wiki, the password is hashcat
+NETNTLMV2 = ('admin::N46iSNekpT:08ca45b7d7ea58ee:88dcbe4446168966a153a0064958dac6:5c7830315c783031000000000000'
+             '0b45c67103d07d7b95acd12ffa11230e0000000052920b85f78d013c31cdb3b92f5d765c783030')
+NTLM = ntlm_hash('password').encode('hex')
+WORDS = ['123456', 'letmein', 'qwerty', 'dragon', 'monkey', 'hashcat', 'shadow', 'password']
+
+
+class StallingBackend(CrackerBackend):
+    """Cracks nothing until cancelled, like a worker that went quiet"""
+
+    name = 'stalling'
+
+    def start(self, job, restore_file):
+        def stall(cancelled):
+            cancelled.wait()
+            return -15
+        job.proc = InProcessCrack(stall)
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.info', Mock())
+@patch('gladius.warning', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+@patch('gladius.art', False)
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.wordlist = os.path.join(self.directory, 'wordlist')
+        with open(self.wordlist, 'w') as f:
+            f.write('\n'.join(WORDS) + '\n')
+
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.stats', gladius.CrackStats())]
+        for p in self.patches:
+            p.start()
+
+        self.coordinator = DistributedBackend(('127.0.0.1', 0), key='secret', timeout=5)
+        self.address = self.coordinator.listen()
+        self.scheduler = CrackScheduler(window=0, sessionpath=os.path.join(self.directory, 'sessions'),
+                                        backends={'distributed': self.coordinator},
+                                        routes={'default': 'distributed'})
+        self.agents = []
+
+    def tearDown(self):
+        for agent in self.agents:
+            agent.stop()
+        self.coordinator.server.shutdown()
+        self.coordinator.server.server_close()
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def worker(self, backend=None, key='secret'):
+        agent = WorkerAgent(self.address, backend or InProcessBackend(self.wordlist), key=key,
+                            workdir=tempfile.mkdtemp(dir=self.directory), interval=0.2, retry=0.2)
+        thread = threading.Thread(target=agent.run)
+        thread.daemon = True
+        thread.start()
+        self.agents.append(agent)
+        return agent
+
+    def wait_for(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(condition())
+
+    def run_jobs(self, timeout=30):
+        deadline = time.time() + timeout
+        self.scheduler.tick()
+        while (self.scheduler.running or self.scheduler.queue) and time.time() < deadline:
+            time.sleep(0.05)
+            self.scheduler.tick()
+
+    def test_jobs_are_split_across_workers(self):
+        self.worker()
+        self.worker()
+        self.wait_for(lambda: len(self.coordinator.workers) == 2)
+
+        register_capture(NETNTLMV2, '5600')
+        register_capture(NETNTLMV2.replace('admin', 'bob'), '5600')
+        register_hash(NTLM, 'Administrator')
+        self.scheduler.max_jobs = 2
+        self.scheduler.submit('5600', [NETNTLMV2, NETNTLMV2.replace('admin', 'bob')], self.directory)
+        self.scheduler.submit('1000', [NTLM], self.directory)
+        self.run_jobs()
+
+        self.assertEqual(gladius.captures[NETNTLMV2.lower()]['password'], 'hashcat')
+        self.assertEqual(gladius.ntlm_hashes[NTLM]['password'], 'password')
+        self.assertEqual(self.coordinator.shards, {})
+        self.assertEqual(os.listdir(os.path.join(self.directory, 'sessions')), [])
+
+    def test_split(self):
+        self.coordinator.workers = [Mock(), Mock(), Mock()]
+        job = CrackJob('5600', self.directory, session='s')
+        job.add(['a', 'b'])
+        self.assertEqual([(shard.hashes, shard.part) for shard in self.coordinator.split(job)],
+                         [(['a'], None), (['b'], None)])
+
+        job = CrackJob('1000', self.directory, session='s')
+        job.add(['a', 'b'])
+        self.assertEqual([(shard.hashes, shard.part) for shard in self.coordinator.split(job)],
+                         [(['a', 'b'], (0, 3)), (['a', 'b'], (1, 3)), (['a', 'b'], (2, 3))])
+
+    def test_shard_of_a_lost_worker_is_reassigned(self):
+        stalling = self.worker(StallingBackend())
+        self.wait_for(lambda: len(self.coordinator.workers) == 1)
+
+        register_hash(NTLM, 'Administrator')
+        self.scheduler.submit('1000', [NTLM], self.directory)
+        self.scheduler.tick()
+        self.wait_for(lambda: self.coordinator.workers[0].shard is not None)
+
+        stalling.stop()
+        self.wait_for(lambda: not self.coordinator.workers)
+        self.worker()
+        self.run_jobs()
+
+        self.assertEqual(gladius.ntlm_hashes[NTLM]['password'], 'password')
+
+    def test_result_in_another_case_is_recorded_as_submitted(self):
+        capture = NETNTLMV2.replace('admin', 'Admin')
+        job = CrackJob('5600', self.directory, session='s')
+        job.add([capture])
+        job.outfile = os.path.join(self.directory, 's.out')
+        shard = gladius.Shard('s/0', job, [capture])
+
+        self.coordinator.record(shard, capture.lower(), 'hashcat')
+        self.coordinator.record(shard, 'unknown', 'hashcat')
+
+        with open(job.outfile, 'r') as f:
+            self.assertEqual(f.read(), '{}:hashcat\n'.format(capture))
+        self.assertEqual(shard.cracked, set([capture]))
+
+    def test_wrong_key_is_turned_away(self):
+        agent = self.worker(key='guess')
+        time.sleep(0.5)
+        self.assertEqual(self.coordinator.workers, [])
+        agent.stop()
+
+
+class TestInProcessPart(unittest.TestCase):
+    def test_only_the_part_is_tried(self):
+        directory = tempfile.mkdtemp()
+        try:
+            wordlist = os.path.join(directory, 'wordlist')
+            with open(wordlist, 'w') as f:
+                f.write('\n'.join(WORDS) + '\n')
+
+            results = []
+            for index in range(2):
+                job = CrackJob('1000', directory, session='part{}'.format(index))
+                job.part = (index, 2)
+                job.add([NTLM])
+                job.outfile = os.path.join(directory, job.session + '.out')
+
+                backend = InProcessBackend(wordlist)
+                returncode = backend.crack(job, os.path.join(directory, 'restore'), 0, threading.Event())
+                results.append((returncode, backend.results(job, final=True), job.status.progress))
+
+            self.assertEqual(results, [(1, [], (4, 4)), (0, [(NTLM, 'password')], (4, 4))])
+        finally:
+            shutil.rmtree(directory)
+
+class TestAddress(unittest.TestCase):
+    def test_bare_port_listens_everywhere(self):
+        self.assertEqual(parse_address('6325'), ('0.0.0.0', 6325))
+        self.assertFalse(is_loopback(parse_address('6325')[0]))
+
+    def test_is_loopback(self):
+        self.assertTrue(is_loopback(parse_address('127.0.0.1:6325')[0]))
+        self.assertTrue(is_loopback(parse_address('localhost:6325')[0]))
+        self.assertTrue(is_loopback(parse_address('::1:6325')[0]))
+        self.assertFalse(is_loopback(parse_address('10.0.0.5:6325')[0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import (Attack, CrackScheduler, FeedbackWordlist, password_variants, register_capture,
+                     register_hash, split_password)
+
+CAPTURE = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+NTLM = '8846f7eaee8fb117ad06bdd830b7586c'
+
+
+class TestPasswordVariants(unittest.TestCase):
+    def test_split_password(self):
+        self.assertEqual(split_password('Company2016!'), ('Company', '2016', '!'))
+        self.assertEqual(split_password('letmein'), ('letmein', '', ''))
+        self.assertEqual(split_password('123456'), ('', '123456', ''))
+
+    def test_variants(self):
+        variants = password_variants('Company2016!', year=2018)
+        for word in ('Company2016!', 'Company', 'company2016', 'Company2017!', 'Company2015!', 'Company2019', 'Company1!'):
+            self.assertIn(word, variants)
+
+    def test_season_rotation(self):
+        variants = password_variants('Spring2016', year=2016)
+        self.assertIn('Summer2016', variants)
+        self.assertIn('Winter2017', variants)
+
+    def test_digits_only(self):
+        self.assertEqual(password_variants('123456'), set(['123456']))
+
+
+@patch('gladius.info', Mock())
+@patch('gladius.verbose', Mock())
+class TestFeedbackWordlist(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'feedback.dict')
+        self.feedback = FeedbackWordlist(self.path, delay=30, outpath=os.path.join(self.directory, 'out'))
+
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.cached_logons', {}),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.journal', Mock()),
+                        patch('gladius.scheduler', Mock(submit_attack=Mock(), cancel=Mock()))]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def test_runs_against_uncracked_hashes_once_quiet(self):
+        register_hash(NTLM, 'Administrator')
+        register_capture(CAPTURE, '5600')
+        self.feedback.add('Company2016!')
+        grown = self.feedback.grown
+
+        self.feedback.tick(now=grown + 10)
+        self.assertFalse(gladius.scheduler.submit_attack.called)
+
+        self.feedback.tick(now=grown + 30)
+        calls = sorted(call[0] for call in gladius.scheduler.submit_attack.call_args_list)
+        attack = Attack(self.path, None, None)
+        self.assertEqual(calls, [('1000', [NTLM], self.feedback.outpath, attack),
+                                 ('5600', [CAPTURE], self.feedback.outpath, attack)])
+        with open(self.path) as f:
+            self.assertIn('Company2017!\n', f.read())
+
+    def test_only_new_words_trigger_a_run(self):
+        self.feedback.add('Company2016!')
+        self.feedback.tick(now=self.feedback.grown + 30)
+
+        self.feedback.add('Company2016!')
+        self.assertEqual(self.feedback.grown, None)
+
+        loaded = FeedbackWordlist(self.path)
+        loaded.load()
+        self.assertEqual(loaded.words, self.feedback.words)
+
+    def test_new_run_replaces_the_last(self):
+        register_capture(CAPTURE, '5600')
+        self.feedback.add('Company2016!')
+        self.feedback.tick(now=self.feedback.grown + 30)
+        previous = self.feedback.jobs['5600']
+
+        self.feedback.add('Winter2017')
+        self.feedback.tick(now=self.feedback.grown + 30)
+        gladius.scheduler.cancel.assert_called_once_with(previous)
+
+
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal')
+class TestSubmitAttack(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist',
+                                        plans={'default': [Attack('top1000.txt', None, None),
+                                                           Attack('rockyou.txt', None, None)]},
+                                        sessionpath=os.path.join(self.directory, 'sessions'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_attack_outside_the_plan_does_not_escalate(self, mock_journal):
+        attack = Attack('feedback.dict', None, None)
+        job = self.scheduler.submit_attack('1000', ['a'], self.directory, attack)
+        self.assertEqual(self.scheduler.queue[0][2], job)
+        self.assertEqual(mock_journal.write.call_args[1]['attack'], ['feedback.dict', None, None])
+
+        job.proc = Mock()
+        job.proc.returncode = 1
+        self.scheduler.queue = []
+        self.scheduler.finish_job(job)
+        self.assertEqual(self.scheduler.queue, [])
+
+    def test_resume_keeps_the_attack(self, mock_journal):
+        self.scheduler.resume([{'mode': '1000', 'outpath': self.directory, 'session': 'gladius_1000',
+                                'hashfile': 'missing', 'outfile': 'missing', 'state': 'running',
+                                'attack': ['feedback.dict', None, None]}])
+        job = self.scheduler.queue[0][2]
+        self.assertFalse(job.planned)
+        self.assertEqual(job.attack, Attack('feedback.dict', None, None))
+
+if __name__ == '__main__':
+    unittest.main()
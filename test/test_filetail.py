@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from gladius import FileTail
+
+
+class TestFileTail(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'SMB-NTLMv2-SSP-127.0.0.1.txt')
+        self.tail = FileTail()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, data, mode='a'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def test_filetail_reads_only_appended_lines(self):
+        self.write('a\nb\n')
+        self.assertEqual(self.tail.read(self.path), ['a', 'b'])
+
+        self.write('c\n')
+        self.assertEqual(self.tail.read(self.path), ['c'])
+
+    def test_filetail_nothing_new(self):
+        self.write('a\n')
+        self.tail.read(self.path)
+        self.assertEqual(self.tail.read(self.path), [])
+
+    def test_filetail_holds_partial_line(self):
+        self.write('a\nb')
+        self.assertEqual(self.tail.read(self.path), ['a'])
+
+        self.write('c\n')
+        self.assertEqual(self.tail.read(self.path), ['bc'])
+
+    def test_filetail_final_read_takes_partial_line(self):
+        self.write('a\nb')
+        self.assertEqual(self.tail.read(self.path, final=True), ['a', 'b'])
+        self.assertEqual(self.tail.read(self.path, final=True), [])
+
+    def test_filetail_limit_reads_whole_lines(self):
+        self.write('aaa\nbbb\nccc\n')
+        stat = os.stat(self.path)
+        self.assertEqual(self.tail.read(self.path, stat, limit=5), ['aaa', 'bbb'])
+        self.assertTrue(self.tail.unread(self.path, stat))
+
+        self.assertEqual(self.tail.read(self.path, stat, limit=5), ['ccc'])
+        self.assertFalse(self.tail.unread(self.path, stat))
+
+    def test_filetail_truncated_file_reads_from_start(self):
+        self.write('aaaa\nbbbb\n')
+        self.tail.read(self.path)
+
+        self.write('c\n', mode='w')
+        self.assertEqual(self.tail.read(self.path), ['c'])
+
+    def test_filetail_rotated_file_reads_from_start(self):
+        self.write('a\n')
+        self.tail.read(self.path)
+
+        os.rename(self.path, self.path + '.1')
+        self.write('a\nb\n')
+        self.assertEqual(self.tail.read(self.path), ['a', 'b'])
+
+    def test_filetail_missing_file(self):
+        self.assertEqual(self.tail.read(self.path), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+from collections import defaultdict, namedtuple
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import Dispatcher, FileTail, FingerprintIndex, GladiusHandler, SecretsdumpHandler
+
+Stat = namedtuple('Stat', ['st_ino', 'st_size', 'st_mtime'])
+
+
+class TestFingerprintIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = FingerprintIndex(max_files=2, max_digests=2)
+
+    def test_fingerprint_unknown_file_is_changed(self):
+        self.assertFalse(self.index.unchanged('a', Stat(1, 10, 1.0)))
+
+    def test_fingerprint_unchanged_file(self):
+        self.index.record('a', Stat(1, 10, 1.0), 10)
+        self.assertTrue(self.index.unchanged('a', Stat(1, 10, 1.0)))
+        self.assertFalse(self.index.unchanged('a', Stat(1, 12, 2.0)))
+        self.assertEqual(self.index.position('a'), (1, 10))
+
+    def test_fingerprint_partially_read_file_is_changed(self):
+        self.index.record('a', Stat(1, 10, 1.0), 8)
+        self.assertFalse(self.index.unchanged('a', Stat(1, 10, 1.0)))
+
+    def test_fingerprint_files_evict_least_recently_used(self):
+        self.index.record('a', Stat(1, 10, 1.0), 10)
+        self.index.record('b', Stat(2, 10, 1.0), 10)
+        self.index.unchanged('a', Stat(1, 10, 1.0))
+        self.index.record('c', Stat(3, 10, 1.0), 10)
+        self.assertEqual(list(self.index.files), ['a', 'c'])
+
+    def test_fingerprint_digests(self):
+        self.assertFalse(self.index.seen('x'))
+        self.assertTrue(self.index.seen('x'))
+        self.index.seen('y')
+        self.index.seen('z')
+        self.assertFalse(self.index.seen('x'))
+
+    def test_fingerprint_snapshot_roundtrip(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'fingerprints.json')
+            self.index.record('a', Stat(1, 10, 1.5), 10)
+            self.index.seen('x')
+            self.index.save(path)
+            self.assertFalse(self.index.dirty)
+
+            restored = FingerprintIndex()
+            restored.load(path)
+            self.assertTrue(restored.unchanged('a', Stat(1, 10, 1.5)))
+            self.assertEqual(restored.position('a'), (1, 10))
+            self.assertTrue(restored.seen('x'))
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestHandlerFingerprints(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'hashes.txt')
+        with open(self.path, 'w') as f:
+            f.write('a\n')
+        self.handler = GladiusHandler()
+        self.handler.process = Mock()
+        Event = namedtuple('Event', ['src_path'])
+        self.event = Event(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch('gladius.fingerprints', FingerprintIndex())
+    def test_handler_skips_unchanged_file(self):
+        self.handler.handle_event(self.event)
+        self.handler.handle_event(self.event)
+        self.assertEqual(self.handler.process.call_count, 1)
+
+    @patch('gladius.fingerprints', FingerprintIndex())
+    def test_handler_resumes_after_restart(self):
+        self.handler.handle_event(self.event)
+        with open(self.path, 'a') as f:
+            f.write('b\n')
+
+        restarted = GladiusHandler()
+        restarted.process = Mock()
+        restarted.handle_event(self.event)
+        self.assertEqual(restarted.get_lines(self.event), ['b'])
+
+    @patch('gladius.fingerprints', FingerprintIndex())
+    def test_handler_reads_large_files_in_chunks(self):
+        with open(self.path, 'w') as f:
+            f.write('a\nb\nc\n')
+        chunks = []
+        self.handler.process = lambda event: chunks.append(self.handler.get_lines(event))
+        self.handler.chunk_size = 2
+
+        self.handler.handle_event(self.event)
+        self.assertEqual(chunks, [['a', 'b'], ['c']])
+
+
+class CountingTail(FileTail):
+    def __init__(self):
+        super(CountingTail, self).__init__()
+        self.reads = 0
+
+    def read(self, *args, **kwargs):
+        self.reads += 1
+        return super(CountingTail, self).read(*args, **kwargs)
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'SMB-NTLMv2-SSP-10.0.0.1.txt')
+        with open(self.path, 'w') as f:
+            f.write('a\nb\n')
+        Event = namedtuple('Event', ['src_path'])
+        self.event = Event(self.path)
+
+        self.received = []
+        self.handlers = [self.handler('Captures', ['*NTLM*.txt', '*hashes*']), self.handler('Dumps', ['*secretsdump*']),
+                         self.handler('Text', ['*.txt'])]
+        self.dispatcher = Dispatcher(self.handlers)
+        self.dispatcher.tail = CountingTail()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def handler(self, name, patterns):
+        # Fingerprints are kept by handler class name
+        handler = type(name, (GladiusHandler,), {'patterns': patterns})()
+        handler.process = lambda event: self.received.append((handler, handler.get_lines(event)))
+        return handler
+
+    def test_route(self):
+        self.assertEqual(self.dispatcher.route(self.path), [self.handlers[0], self.handlers[2]])
+        self.assertEqual(self.dispatcher.route('/loot/secretsdump_10.0.0.1'), [self.handlers[1]])
+        self.assertEqual(self.dispatcher.route('/loot/Responder-Session.log'), [])
+
+    def test_route_ignores_case(self):
+        self.assertEqual(self.dispatcher.route('/loot/Secretsdump_10.0.0.1.txt'), self.handlers[1:])
+        self.assertEqual(self.dispatcher.route('/loot/SECRETSDUMP.out'), [self.handlers[1]])
+        self.assertEqual(self.dispatcher.route('/loot/smb-ntlmv2-ssp-10.0.0.1.TXT'), [self.handlers[0], self.handlers[2]])
+
+    def test_routes_are_bounded(self):
+        self.dispatcher.max_routed = 2
+        for name in ('a.txt', 'b.txt', 'a.txt', 'c.txt'):
+            self.dispatcher.route(name)
+        self.assertEqual(list(self.dispatcher.routed), ['a.txt', 'c.txt'])
+
+    @patch('gladius.debouncer')
+    @patch('gladius.fingerprints', FingerprintIndex())
+    def test_file_is_read_once_for_every_handler(self, mock_debouncer):
+        self.dispatcher.on_created(self.event)
+        mock_debouncer.touch.assert_called_once_with(self.dispatcher, self.event)
+
+        self.dispatcher.handle_event(self.event, final=True)
+
+        self.assertEqual(self.received, [(self.handlers[0], ['a', 'b']), (self.handlers[2], ['a', 'b'])])
+        self.assertEqual(self.dispatcher.tail.reads, 1)
+
+    @patch('gladius.fingerprints', FingerprintIndex())
+    def test_resumes_from_the_handler_furthest_behind(self):
+        self.handlers[0].handle_event(self.event)
+        self.handlers[2].handle_event(self.event)
+        with open(self.path, 'a') as f:
+            f.write('c\n')
+        self.handlers[0].handle_event(self.event)
+        del self.received[:]
+
+        self.dispatcher.handle_event(self.event)
+        self.assertEqual(self.received, [(self.handlers[2], ['c'])])
+
+
+@patch('gladius.info', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.stats', Mock())
+class TestResumeParsing(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.directory, 'fingerprints.json')
+        self.path = os.path.join(self.directory, 'secretsdump_10.0.0.1')
+        Event = namedtuple('Event', ['src_path'])
+        self.event = Event(self.path)
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict))]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def dispatch(self, data, index):
+        with open(self.path, 'a') as f:
+            f.write(data)
+        handler = SecretsdumpHandler()
+        handler.call_hashcat = Mock()
+        with patch('gladius.fingerprints', index):
+            Dispatcher([handler]).handle_event(self.event)
+        return handler
+
+    def test_section_survives_a_restart(self):
+        index = FingerprintIndex()
+        self.dispatch('[*] Dumping local SAM hashes (uid:rid:lmhash:nthash)\n'
+                      'Administrator:500:aad3b435b51404eeaad3b435b51404ee:31d6cfe0d16ae931b73c59d7e0c089c0:::\n', index)
+        index.save(self.snapshot)
+
+        restored = FingerprintIndex()
+        restored.load(self.snapshot)
+        handler = self.dispatch('bob:1001:aad3b435b51404eeaad3b435b51404ee:8846f7eaee8fb117ad06bdd830b7586c:::\n',
+                                restored)
+
+        handler.call_hashcat.assert_called_once_with(hash_num='1000', hashes=['8846f7eaee8fb117ad06bdd830b7586c'])
+
+if __name__ == '__main__':
+    unittest.main()
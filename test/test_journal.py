@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+import gladius
+from collections import defaultdict
+from gladius import CredentialLedger, Journal, PotCache, register_hash, mark_cracked
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'state.journal')
+        self.journal = Journal()
+
+        self.patches = [patch('gladius.journal', self.journal),
+                        patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.cached_logons', {}),
+                        patch('gladius.captures', {}),
+                        patch('gladius.representatives', {}),
+                        patch('gladius.held_captures', defaultdict(list)),
+                        patch('gladius.potcache', PotCache()),
+                        patch('gladius.ledger', CredentialLedger())]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def test_journal_closed_is_noop(self):
+        self.journal.write('hash', hash='a', user='b', time=0)
+
+    def test_journal_restores_hashes_and_cracks(self):
+        self.journal.open(self.path)
+        register_hash('31d6cfe0d16ae931b73c59d7e0c089c0', 'Administrator')
+        register_hash('31d6cfe0d16ae931b73c59d7e0c089c0', 'Guest')
+        mark_cracked('31d6cfe0d16ae931b73c59d7e0c089c0', 'Password1')
+        self.journal.close()
+
+        gladius.ntlm_hashes.clear()
+        self.journal.restore(self.path)
+
+        entry = gladius.ntlm_hashes['31d6cfe0d16ae931b73c59d7e0c089c0']
+        self.assertEqual(entry['users'], ['Administrator', 'Guest'])
+        self.assertEqual(entry['password'], 'Password1')
+
+    def test_journal_keeps_byte_passwords(self):
+        self.journal.open(self.path)
+        register_hash('31d6cfe0d16ae931b73c59d7e0c089c0', 'Administrator')
+        mark_cracked('31d6cfe0d16ae931b73c59d7e0c089c0', '\xe9t\xe9')
+        register_hash('8846f7eaee8fb117ad06bdd830b7586c', 'Guest')
+        mark_cracked('8846f7eaee8fb117ad06bdd830b7586c', '$HEX[41]')
+        self.journal.close()
+
+        # Once from the journal as written, once from the compacted journal
+        for restore in range(2):
+            gladius.ntlm_hashes.clear()
+            self.journal.restore(self.path)
+            self.assertEqual(gladius.ntlm_hashes['31d6cfe0d16ae931b73c59d7e0c089c0']['password'], '\xe9t\xe9')
+            self.assertEqual(gladius.ntlm_hashes['8846f7eaee8fb117ad06bdd830b7586c']['password'], '$HEX[41]')
+
+    def test_journal_returns_unfinished_jobs(self):
+        self.journal.open(self.path)
+        for session, state in [('a', 'running'), ('b', 'queued'), ('b', 'done'), ('c', 'interrupted')]:
+            self.journal.write('job', session=session, state=state, mode='5600',
+                               hashfile='hashfile', outfile='outfile')
+        self.journal.close()
+
+        unfinished = self.journal.restore(self.path)
+        self.assertEqual([job['session'] for job in unfinished], ['a', 'c'])
+
+    def test_journal_skips_torn_record(self):
+        with open(self.path, 'w') as f:
+            f.write(json.dumps({'op': 'hash', 'hash': 'a', 'user': 'b', 'time': 0}) + '\n')
+            f.write('{"op": "cra')
+
+        with patch('gladius.warning'):
+            self.journal.restore(self.path)
+        self.assertEqual(gladius.ntlm_hashes['a']['users'], ['b'])
+
+    def test_journal_compacts(self):
+        self.journal.open(self.path)
+        register_hash('a', 'b')
+        self.journal.write('job', session='a', state='done', mode='1000',
+                           hashfile='hashfile', outfile='outfile')
+        self.journal.close()
+
+        self.journal.restore(self.path)
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([record['op'] for record in records], ['hash'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+from StringIO import StringIO
+from collections import defaultdict
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import CredentialLedger, deliver_result, register_capture, register_hash
+
+CAPTURE = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+NTLM = '8846f7eaee8fb117ad06bdd830b7586c'
+
+
+class TestCredentialLedger(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'credentials.jsonl')
+        self.ledger = CredentialLedger()
+
+    def tearDown(self):
+        self.ledger.close()
+        shutil.rmtree(self.directory)
+
+    def test_duplicates_are_kept_once(self):
+        self.ledger.open(self.path)
+        self.assertTrue(self.ledger.record('CORP\\bob', 'Winter2016!', hash=CAPTURE, mode='5600'))
+        self.assertFalse(self.ledger.record('corp\\BOB', 'Winter2016!', hash=CAPTURE.upper(), mode='5600'))
+        self.assertTrue(self.ledger.record('Administrator', 'password', hash=NTLM, mode='1000'))
+        self.ledger.close()
+
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+        ledger = CredentialLedger()
+        ledger.load(self.path)
+        self.assertFalse(ledger.record('CORP\\bob', 'Winter2016!', hash=CAPTURE, mode='5600'))
+        self.assertEqual(len(ledger.entries), 2)
+
+    def test_byte_passwords_round_trip(self):
+        self.ledger.open(self.path)
+        self.ledger.record('CORP\\bob', '\xe9t\xe9', hash=CAPTURE, mode='5600')
+        self.ledger.record('Administrator', 'pa:ss', hash=NTLM, mode='1000')
+        self.ledger.close()
+
+        ledger = CredentialLedger()
+        ledger.load(self.path)
+        self.assertEqual(ledger.query(user='bob')[0]['password'], '\xe9t\xe9')
+        self.assertEqual(ledger.query(user='administrator')[0]['password'], 'pa:ss')
+        self.assertFalse(ledger.record('CORP\\bob', '\xe9t\xe9', hash=CAPTURE, mode='5600'))
+
+        out = StringIO()
+        ledger.export(ledger.query(user='bob'), out, format='json')
+        self.assertEqual(json.loads(out.getvalue())['password'], '$HEX[e974e9]')
+
+    def test_query(self):
+        self.ledger.record('CORP\\bob', 'Winter2016!', hash=CAPTURE, mode='5600', source='SMB-NTLMv2-SSP-10.0.0.1.txt')
+        self.ledger.record('CORP.LOCAL\\bob', 'Winter2016!', hash=NTLM, mode='1000', source='secretsdump_10.0.0.2')
+        self.ledger.record('CORP\\alice', 'Spring2017!', mode='service', source='secretsdump_10.0.0.2')
+
+        users = lambda entries: sorted((entry['domain'], entry['user']) for entry in entries)
+        self.assertEqual(users(self.ledger.query(user='BOB')), [('CORP', 'bob'), ('CORP.LOCAL', 'bob')])
+        self.assertEqual(users(self.ledger.query(user='bob', domain='corp')), [('CORP', 'bob')])
+        self.assertEqual(users(self.ledger.query(hash=NTLM.upper())), [('CORP.LOCAL', 'bob')])
+        self.assertEqual(users(self.ledger.query(source='secretsdump_10.0.0.2')), [('CORP', 'alice'), ('CORP.LOCAL', 'bob')])
+        self.assertEqual(self.ledger.query(user='carol'), [])
+        self.assertEqual(len(self.ledger.query()), 3)
+        self.assertRaises(ValueError, self.ledger.query, password='Winter2016!')
+
+    def test_export(self):
+        self.ledger.record('CORP\\bob', 'Winter2016!', hash=CAPTURE, mode='5600', source='responder')
+
+        out = StringIO()
+        self.ledger.export(self.ledger.query(), out)
+        self.assertEqual(out.getvalue(), 'CORP bob Winter2016!\n')
+
+        out = StringIO()
+        self.ledger.export(self.ledger.query(), out, format='csv')
+        self.assertEqual(out.getvalue().splitlines()[0], 'domain,user,password,hash,mode,source,time')
+        self.assertTrue(out.getvalue().splitlines()[1].startswith('CORP,bob,Winter2016!,{},5600,responder,'.format(CAPTURE)))
+
+        out = StringIO()
+        self.ledger.export(self.ledger.query(), out, format='json')
+        self.assertEqual(json.loads(out.getvalue())['hash'], CAPTURE)
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.info', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+@patch('gladius.art', False)
+class TestLedgerDelivery(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.patches = [patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {}),
+                        patch('gladius.cached_logons', {}),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.ledger', CredentialLedger()),
+                        patch('gladius.scheduler', Mock(withdraw=Mock()))]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.directory)
+
+    def test_cracks_are_recorded_once(self):
+        register_hash(NTLM, 'CORP.LOCAL\\alice', source='secretsdump_10.0.0.1')
+        register_hash(NTLM, 'Administrator', source='secretsdump_10.0.0.2')
+        register_capture(CAPTURE, '5600', source='SMB-NTLMv2-SSP-10.0.0.3.txt')
+
+        deliver_result(NTLM, 'password')
+        deliver_result(NTLM, 'password')
+        deliver_result(CAPTURE, 'Winter2016!')
+
+        self.assertEqual([(entry['domain'], entry['user'], entry['source']) for entry in gladius.ledger.query(hash=NTLM)],
+                         [('CORP.LOCAL', 'alice', 'secretsdump_10.0.0.1'), ('', 'Administrator', 'secretsdump_10.0.0.2')])
+        self.assertEqual(gladius.ledger.query(user='bob')[0]['password'], 'Winter2016!')
+        self.assertEqual(len(gladius.ledger.entries), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import urllib2
+
+from gladius import Metrics, serve_metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_metrics_counter(self):
+        counter = self.metrics.counter('gladius_events_total', 'Filesystem events received', ['handler'])
+        counter.inc(handler='ResponderHandler')
+        counter.inc(2, handler='ResponderHandler')
+
+        self.assertEqual(self.metrics.render().splitlines(), [
+            '# HELP gladius_events_total Filesystem events received',
+            '# TYPE gladius_events_total counter',
+            'gladius_events_total{handler="ResponderHandler"} 3.0',
+        ])
+
+    def test_metrics_histogram(self):
+        histogram = self.metrics.histogram('gladius_parse_seconds', 'Parse time', [0.1, 1], ['handler'])
+        histogram.observe(0.05, handler='a')
+        histogram.observe(0.5, handler='a')
+        histogram.observe(5, handler='a')
+
+        lines = self.metrics.render().splitlines()
+        self.assertEqual(lines[2:], [
+            'gladius_parse_seconds_bucket{handler="a",le="0.1"} 1',
+            'gladius_parse_seconds_bucket{handler="a",le="1"} 2',
+            'gladius_parse_seconds_bucket{handler="a",le="+Inf"} 3',
+            'gladius_parse_seconds_sum{handler="a"} 5.55',
+            'gladius_parse_seconds_count{handler="a"} 3',
+        ])
+
+    def test_metrics_callback_gauge(self):
+        running = {(): 2}
+        self.metrics.gauge('gladius_cracker_processes', 'Cracker processes running', [], lambda: running)
+        self.assertIn('gladius_cracker_processes 2.0', self.metrics.render())
+
+        running[()] = 0
+        self.assertIn('gladius_cracker_processes 0.0', self.metrics.render())
+
+    def test_metrics_label_escaping(self):
+        counter = self.metrics.counter('gladius_test_total', 'Test', ['path'])
+        counter.inc(path='a"b')
+        self.assertIn('gladius_test_total{path="a\\"b"} 1.0', self.metrics.render())
+
+    def test_metrics_endpoint(self):
+        server = serve_metrics(0)
+        try:
+            response = urllib2.urlopen('http://127.0.0.1:{}/metrics'.format(server.server_address[1]))
+            self.assertIn('# TYPE gladius_events_total counter', response.read())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
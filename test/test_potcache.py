@@ -0,0 +1,98 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import PotCache, ResponderHandler, resolve_cached
+
+
+class TestPotCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache', 'gladius.pot')
+        self.potcache = PotCache()
+
+    def tearDown(self):
+        self.potcache.close()
+        shutil.rmtree(self.directory)
+
+    def write_potfile(self, lines):
+        path = os.path.join(self.directory, 'hashcat.pot')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def test_potcache_add_and_get(self):
+        self.assertTrue(self.potcache.add('8846F7EAEE8FB117AD06BDD830B7586C', 'password'))
+        self.assertFalse(self.potcache.add('8846f7eaee8fb117ad06bdd830b7586c', 'password'))
+        self.assertEqual(self.potcache.get('8846f7eaee8fb117ad06bdd830b7586c'), 'password')
+        self.assertEqual(self.potcache.get('31d6cfe0d16ae931b73c59d7e0c089c0'), None)
+
+    def test_potcache_persists(self):
+        self.potcache.open(self.path)
+        self.potcache.add('8846f7eaee8fb117ad06bdd830b7586c', 'password')
+        self.potcache.close()
+
+        restored = PotCache()
+        restored.open(self.path)
+        self.assertEqual(restored.get('8846f7eaee8fb117ad06bdd830b7586c'), 'password')
+        restored.close()
+
+    def test_potcache_persists_special_passwords(self):
+        passwords = {'8846f7eaee8fb117ad06bdd830b7586c': 'pa:ss', '31d6cfe0d16ae931b73c59d7e0c089c0': 'two\nlines',
+                     'a4f49c406510bdcab6824ee7c30fd852': '\xe9t\xe9', '0123456789abcdef0123456789abcdef': '$HEX[41]'}
+        self.potcache.open(self.path)
+        for hash, password in passwords.items():
+            self.potcache.add(hash, password)
+        self.potcache.close()
+
+        with open(self.path) as f:
+            self.assertIn('8846f7eaee8fb117ad06bdd830b7586c:$HEX[70613a7373]\n', f.read())
+
+        restored = PotCache()
+        restored.open(self.path)
+        self.assertEqual(restored.passwords, passwords)
+        restored.close()
+
+    def test_potcache_import_skips_other_types(self):
+        potfile = self.write_potfile([
+            '8846f7eaee8fb117ad06bdd830b7586c:password',
+            '31d6cfe0d16ae931b73c59d7e0c089c0:',
+            'a4f49c406510bdcab6824ee7c30fd852:$HEX[70613a7373]',
+            'ADMIN::CORP:1122334455667788:0011223344556677:0101000000:Summer2016',
+            '$DCC2$10240#user#0123456789abcdef0123456789abcdef:letmein',
+        ])
+        self.assertEqual(self.potcache.import_potfile(potfile), 2)
+        self.assertEqual(self.potcache.get('a4f49c406510bdcab6824ee7c30fd852'), 'pa:ss')
+        self.assertEqual(self.potcache.get('31d6cfe0d16ae931b73c59d7e0c089c0'), None)
+
+
+class TestResolveCached(unittest.TestCase):
+    @patch('gladius.journal', Mock())
+    @patch('gladius.success', Mock())
+    @patch('gladius.ntlm_hashes', defaultdict(dict))
+    @patch('gladius.potcache', PotCache())
+    def test_resolve_cached_skips_known_hashes(self):
+        gladius.register_hash('8846f7eaee8fb117ad06bdd830b7586c', 'Administrator')
+        gladius.potcache.add('8846f7eaee8fb117ad06bdd830b7586c', 'password')
+
+        remaining = resolve_cached(['8846f7eaee8fb117ad06bdd830b7586c', '31d6cfe0d16ae931b73c59d7e0c089c0'])
+
+        self.assertEqual(remaining, ['31d6cfe0d16ae931b73c59d7e0c089c0'])
+        self.assertEqual(gladius.ntlm_hashes['8846f7eaee8fb117ad06bdd830b7586c']['password'], 'password')
+
+    @patch('gladius.scheduler')
+    @patch('gladius.resolve_cached')
+    def test_responder_checks_cache_for_ntlm(self, mock_resolve, mock_scheduler):
+        mock_resolve.return_value = ['b']
+        handler = ResponderHandler()
+        handler.call_hashcat('1000', ['a', 'b'])
+
+        mock_resolve.assert_called_with(['a', 'b'])
+        mock_scheduler.submit.assert_called_with('1000', ['b'], handler.outpath)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+from collections import defaultdict
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import QuickPass, ResponderHandler, quick_check, quick_init, register_capture
+
+# Example NetNTLMv1/v2 hashes from the hashcat wiki, the password is hashcat
+NETNTLMV1 = ('u4-netntlm::kNS:338d08f8e26de93300000000000000000000000000000000:'
+             '9526fb8c23a90751cdd619b6cea564742e1e4bf33006ba41:cb8086049ec4736c')
+NETNTLMV2 = ('admin::N46iSNekpT:08ca45b7d7ea58ee:88dcbe4446168966a153a0064958dac6:5c7830315c783031000000000000'
+             '0b45c67103d07d7b95acd12ffa11230e0000000052920b85f78d013c31cdb3b92f5d765c783030')
+MISS = NETNTLMV2.replace('admin', 'bob')
+
+
+class TestQuickCheck(unittest.TestCase):
+    def setUp(self):
+        quick_init(['123456', 'password', 'hashcat'])
+
+    def test_quick_check_hit(self):
+        self.assertEqual(quick_check(('5600', NETNTLMV2)), (NETNTLMV2, 'hashcat'))
+
+    def test_quick_check_miss(self):
+        self.assertEqual(quick_check(('5600', MISS)), (MISS, None))
+
+    def test_quick_check_malformed(self):
+        self.assertEqual(quick_check(('5600', 'admin::N46iSNekpT:zz')), ('admin::N46iSNekpT:zz', None))
+
+    @unittest.skipIf(gladius.DES is None, "pycrypto is not installed")
+    def test_quick_check_netntlmv1(self):
+        self.assertEqual(quick_check(('5500', NETNTLMV1)), (NETNTLMV1, 'hashcat'))
+
+    def test_top_words(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'wordlist')
+            with open(path, 'w') as f:
+                f.write('123456\r\npassword\n123456\nhashcat\nletmein\n')
+            self.assertEqual(QuickPass.top_words(path, 3), ['123456', 'password', 'hashcat'])
+        finally:
+            shutil.rmtree(directory)
+
+
+@patch('gladius.success', Mock())
+@patch('gladius.verbose', Mock())
+@patch('gladius.journal', Mock())
+@patch('gladius.art', False)
+class TestQuickPass(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.quickpass = QuickPass(['password', 'hashcat'], processes=2)
+        self.quickpass.start()
+
+        # submit is set up front, the pool's callback thread would race the test to create it
+        self.patches = [patch('gladius.captures', {}),
+                        patch('gladius.stats', gladius.CrackStats()),
+                        patch('gladius.ledger', gladius.CredentialLedger()),
+                        patch('gladius.scheduler', Mock(submit=Mock(), lock=threading.RLock())),
+                        patch('gladius.quickpass', self.quickpass)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.quickpass.close()
+        shutil.rmtree(self.directory)
+
+    def test_quick_pass_cracks_and_escalates(self):
+        register_capture(NETNTLMV2, '5600')
+        register_capture(MISS, '5600')
+
+        self.quickpass.submit('5600', [NETNTLMV2, MISS], self.directory)
+
+        deadline = time.time() + 30
+        while not gladius.scheduler.submit.called and time.time() < deadline:
+            time.sleep(0.05)
+
+        gladius.scheduler.submit.assert_called_once_with('5600', [MISS], self.directory)
+        self.assertEqual(gladius.captures[NETNTLMV2.lower()]['password'], 'hashcat')
+        self.assertEqual([(entry['domain'], entry['user'], entry['password']) for entry in gladius.ledger.query()],
+                         [('N46iSNekpT', 'admin', 'hashcat')])
+
+    def test_results_wait_for_the_scheduler_lock(self):
+        register_capture(NETNTLMV2, '5600')
+
+        with gladius.scheduler.lock:
+            self.quickpass.submit('5600', [NETNTLMV2], self.directory)
+            time.sleep(0.5)
+            self.assertEqual(gladius.captures[NETNTLMV2.lower()]['password'], '')
+
+        deadline = time.time() + 30
+        while not gladius.scheduler.submit.called and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(gladius.captures[NETNTLMV2.lower()]['password'], 'hashcat')
+
+    def test_handler_sends_captures_to_quick_pass(self):
+        self.quickpass.submit = Mock()
+        handler = ResponderHandler()
+
+        handler.call_hashcat('5600', [NETNTLMV2])
+        handler.call_hashcat('1000', ['8846f7eaee8fb117ad06bdd830b7586c'])
+
+        self.quickpass.submit.assert_called_once_with('5600', [NETNTLMV2], handler.outpath)
+        self.assertEqual(gladius.scheduler.submit.call_args[0][0], '1000')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+from StringIO import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from gladius import Attack, CrackJob, CrackScheduler, JobStatus, load_attack_plan
+
+
+class TestCrackScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist', max_jobs=1, window=5)
+        self.scheduler.start_job = Mock()
+        self.scheduler.persist = Mock()
+        self.scheduler.collect = Mock()
+        self.scheduler.finish_job = Mock()
+
+    def test_scheduler_coalesces_same_mode(self):
+        self.scheduler.submit('5600', ['a', 'b'], 'out')
+        self.scheduler.submit('5600', ['b', 'c'], 'out')
+
+        self.assertEqual(list(self.scheduler.batches), ['5600'])
+        self.assertEqual(self.scheduler.batches['5600'].hashes, ['a', 'b', 'c'])
+
+    def test_scheduler_waits_for_window(self):
+        self.scheduler.submit('5600', ['a'], 'out')
+        created = self.scheduler.batches['5600'].created
+
+        self.scheduler.tick(now=created + 1)
+        self.scheduler.start_job.assert_not_called()
+
+        self.scheduler.tick(now=created + 5)
+        self.assertEqual(self.scheduler.start_job.call_count, 1)
+
+    def test_scheduler_limits_running_jobs(self):
+        self.scheduler.submit('5600', ['a'], 'out')
+        self.scheduler.submit('1000', ['b'], 'out')
+
+        self.scheduler.tick(now=self.scheduler.batches['1000'].created + 5)
+        self.assertEqual(self.scheduler.start_job.call_count, 1)
+        self.assertEqual(len(self.scheduler.queue), 1)
+
+    def test_scheduler_runs_ntlm_first(self):
+        self.scheduler.submit('5600', ['a'], 'out')
+        self.scheduler.submit('1000', ['b'], 'out')
+
+        self.scheduler.tick(now=self.scheduler.batches['1000'].created + 5)
+        job = self.scheduler.start_job.call_args[0][0]
+        self.assertEqual(job.mode, '1000')
+
+    def test_scheduler_reaps_finished_jobs(self):
+        self.scheduler.submit('5600', ['a'], 'out')
+        self.scheduler.tick(now=self.scheduler.batches['5600'].created + 5)
+
+        job = self.scheduler.running[0]
+        job.proc = Mock()
+        job.proc.poll.return_value = 0
+        self.scheduler.tick()
+        self.assertEqual(self.scheduler.running, [])
+
+    def test_scheduler_interrupted_job_stays_resumable(self):
+        job = CrackJob('5600', 'out', session='gladius_5600')
+        job.proc = Mock()
+        job.proc.returncode = -2
+
+        with patch('gladius.journal') as mock_journal:
+            CrackScheduler().finish_job(job)
+
+        self.assertEqual(mock_journal.write.call_args[1]['state'], 'interrupted')
+
+    @patch('gladius.time.sleep', Mock())
+    @patch('gladius.error')
+    def test_scheduler_keeps_running_after_a_failed_tick(self, mock_error):
+        # KeyboardInterrupt is not an Exception, so it ends the loop
+        self.scheduler.tick = Mock(side_effect=[UnicodeDecodeError('ascii', '\xe9', 0, 1, 'bad'), None,
+                                                KeyboardInterrupt])
+
+        self.assertRaises(KeyboardInterrupt, self.scheduler.run)
+        self.assertEqual(self.scheduler.tick.call_count, 3)
+        self.assertEqual(mock_error.call_count, 1)
+
+
+class TestCrackSessions(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist',
+                                        sessionpath=os.path.join(self.directory, 'sessions'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch('gladius.journal')
+    @patch('gladius.subprocess')
+    def test_scheduler_hashcat_command(self, mock_subprocess, mock_journal):
+        mock_subprocess.Popen.return_value.stdout = StringIO('')
+        self.scheduler.submit('5600', ['a'], self.directory)
+        self.scheduler.tick(now=self.scheduler.batches['5600'].created + 5)
+
+        job = self.scheduler.running[0]
+        restore_file = os.path.join(self.directory, 'sessions', job.session + '.restore')
+        self.assertEqual(['hashcat', '--session', job.session, '--restore-file-path', restore_file,
+                          '--status', '--status-timer', '10', '--machine-readable', '-m', '5600', '-r', 'ruleset', '-o', job.outfile,
+                          '--outfile-format', '5', job.hashfile, 'wordlist'],
+                         mock_subprocess.Popen.call_args[0][0])
+
+        with open(job.hashfile) as f:
+            self.assertEqual(f.read(), 'a\n')
+
+    @patch('gladius.journal')
+    @patch('gladius.subprocess')
+    def test_scheduler_restores_session(self, mock_subprocess, mock_journal):
+        mock_subprocess.Popen.return_value.stdout = StringIO('')
+        os.makedirs(self.scheduler.sessionpath)
+        restore_file = os.path.join(self.scheduler.sessionpath, 'gladius_1000.restore')
+        open(restore_file, 'w').close()
+
+        self.scheduler.resume([{'session': 'gladius_1000', 'mode': '1000', 'state': 'running',
+                                'hashfile': 'hashfile', 'outfile': 'outfile', 'outpath': 'out'}])
+        self.scheduler.tick()
+
+        self.assertEqual(['hashcat', '--session', 'gladius_1000', '--restore', '--restore-file-path', restore_file],
+                         mock_subprocess.Popen.call_args[0][0])
+
+    @patch('gladius.journal')
+    def test_resume_sweeps_stale_session_files(self, mock_journal):
+        os.makedirs(self.scheduler.sessionpath)
+        for name in ('gladius_1000.hashes', 'gladius_1000.restore', 'gladius_5600.hashes', 'gladius_5600.out'):
+            open(os.path.join(self.scheduler.sessionpath, name), 'w').close()
+
+        self.scheduler.resume([{'session': 'gladius_1000', 'mode': '1000', 'state': 'running', 'outpath': 'out',
+                                'hashfile': os.path.join(self.scheduler.sessionpath, 'gladius_1000.hashes'),
+                                'outfile': os.path.join(self.scheduler.sessionpath, 'gladius_1000.out')}])
+
+        self.assertEqual(sorted(os.listdir(self.scheduler.sessionpath)), ['gladius_1000.hashes', 'gladius_1000.restore'])
+
+    @patch('gladius.journal')
+    @patch('gladius.error', Mock())
+    def test_failed_job_leaves_no_files(self, mock_journal):
+        job = CrackJob('1000', self.directory)
+        job.add(['a'])
+        self.scheduler.persist(job)
+        job.proc = Mock(returncode=255)
+
+        self.scheduler.finish_job(job)
+
+        self.assertEqual(os.listdir(self.scheduler.sessionpath), [])
+        self.assertEqual(mock_journal.write.call_args[1]['state'], 'failed')
+
+    @patch('gladius.deliver_result')
+    def test_scheduler_streams_results(self, mock_deliver):
+        mock_deliver.side_effect = lambda hash, password: '{} {}'.format(hash, password)
+        job = CrackJob('5600', self.directory, session='gladius_5600')
+        job.outfile = os.path.join(self.directory, 'gladius_5600.out')
+
+        capture = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+        with open(job.outfile, 'w') as f:
+            f.write('{}:{}\n'.format(capture, 'pass:word'.encode('hex')))
+            f.write('8846f7eaee8fb117ad06bdd830b7586c:70617373')
+        self.scheduler.collect(job)
+        mock_deliver.assert_called_once_with(capture, 'pass:word')
+
+        self.scheduler.collect(job, final=True)
+        mock_deliver.assert_called_with('8846f7eaee8fb117ad06bdd830b7586c', 'pass')
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'gladius_5600.creds')))
+
+
+class TestJobStatus(unittest.TestCase):
+    line = ('STATUS\t3\tSPEED\t2000\t1000\t6000\t2000\tEXEC_RUNTIME\t12.5\t10.2\tCURKU\t40\t'
+            'PROGRESS\t{}\t1000\tRECHASH\t1\t4\tRECSALT\t1\t4\tTEMP\t60\t62\tREJECTED\t0\tUTIL\t99\t98\n')
+
+    def test_status_ignores_other_lines(self):
+        status = JobStatus()
+        self.assertFalse(status.update('hashcat (v3.6.0) starting...\n'))
+        self.assertEqual(status.state, 'queued')
+
+    def test_status_parses_machine_readable_line(self):
+        status = JobStatus()
+        self.assertTrue(status.update(self.line.format(100), now=100))
+
+        self.assertEqual(status.state, 'running')
+        self.assertEqual(status.speeds, [2000.0, 3000.0])
+        self.assertEqual(status.speed, 5000.0)
+        self.assertEqual(status.progress, (100, 1000))
+        self.assertEqual(status.recovered, (1, 4))
+        self.assertEqual(status.eta, None)
+
+    def test_status_eta(self):
+        status = JobStatus()
+        status.update(self.line.format(100), now=100)
+        status.update(self.line.format(200), now=110)
+
+        self.assertEqual(status.rate, 10)
+        self.assertEqual(status.eta, 80)
+        self.assertEqual(status.percent, 20.0)
+
+    def test_scheduler_status_lines_idle(self):
+        self.assertEqual(CrackScheduler().status_lines(), ['No crack jobs running, the GPU is idle'])
+
+
+class TestAttackPlans(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.plans = {'default': [Attack('top1000.txt', None, None), Attack('rockyou.txt', 'hob064.rule', None),
+                                  Attack(None, None, '?u?l?l?l?d?d')]}
+        self.scheduler = CrackScheduler('hashcat', 'ruleset', 'wordlist', plans=self.plans,
+                                        sessionpath=os.path.join(self.directory, 'sessions'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_attack_plan(self):
+        path = os.path.join(self.directory, 'plan.json')
+        with open(path, 'w') as f:
+            f.write('{"5600": [{"wordlist": "top1000.txt"}, {"mask": "?d?d?d?d"}]}')
+        self.assertEqual(load_attack_plan(path), {'5600': [Attack('top1000.txt', None, None),
+                                                           Attack(None, None, '?d?d?d?d')]})
+
+        with open(path, 'w') as f:
+            f.write('{"5600": [{"ruleset": "hob064.rule"}]}')
+        self.assertRaises(ValueError, load_attack_plan, path)
+
+    @patch('gladius.journal')
+    @patch('gladius.subprocess')
+    def test_hashcat_command_per_tier(self, mock_subprocess, mock_journal):
+        mock_subprocess.Popen.return_value.stdout = StringIO('')
+        job = CrackJob('1000', self.directory, tier=2)
+        self.scheduler.persist(job)
+        self.scheduler.start_job(job)
+
+        command = mock_subprocess.Popen.call_args[0][0]
+        self.assertEqual(command[command.index('-m'):], ['-m', '1000', '-a', '3', '-o', job.outfile,
+                                                         '--outfile-format', '5', job.hashfile, '?u?l?l?l?d?d'])
+
+    @patch('gladius.journal')
+    @patch('gladius.is_cracked', lambda hash: hash == 'a')
+    def test_exhausted_job_escalates_uncracked_hashes(self, mock_journal):
+        job = CrackJob('1000', self.directory)
+        job.add(['a', 'b', 'c'])
+        self.scheduler.persist(job)
+        job.proc = Mock()
+        job.proc.returncode = 1
+
+        self.scheduler.finish_job(job)
+
+        priority, counter, next_job = self.scheduler.queue[0]
+        self.assertEqual(next_job.tier, 1)
+        self.assertEqual(next_job.hashes, ['b', 'c'])
+        self.assertEqual(priority, (1, 0))
+
+    @patch('gladius.journal')
+    def test_last_tier_does_not_escalate(self, mock_journal):
+        job = CrackJob('1000', self.directory, tier=2)
+        job.add(['a'])
+        self.scheduler.persist(job)
+        job.proc = Mock()
+        job.proc.returncode = 1
+
+        self.scheduler.finish_job(job)
+        self.assertEqual(self.scheduler.queue, [])
+
+if __name__ == '__main__':
+    unittest.main()
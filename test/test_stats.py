@@ -0,0 +1,81 @@
+from collections import defaultdict
+import unittest
+
+from mock import Mock, patch
+import gladius
+from gladius import CrackStats
+
+
+class TestCrackStats(unittest.TestCase):
+    def setUp(self):
+        self.stats = CrackStats()
+
+    def test_stats_empty_does_not_divide_by_zero(self):
+        self.assertEqual(self.stats.format(), '(0/0 0.00%)')
+
+    def test_stats_breakdown(self):
+        self.stats.add('1000', '/loot/secretsdump_10.0.0.1', 0)
+        self.stats.add('5600', '/usr/share/responder/SMB-NTLMv2-SSP-10.0.0.2.txt', 0)
+        self.stats.crack('5600', '/usr/share/responder/SMB-NTLMv2-SSP-10.0.0.2.txt', 0)
+
+        snapshot = self.stats.snapshot()
+        self.assertEqual(self.stats.format(), '(1/2 50.00%)')
+        self.assertEqual(snapshot['types'], {'NTLM': (1, 0), 'NetNTLMv2': (1, 1)})
+        self.assertEqual(snapshot['sources']['secretsdump_10.0.0.1'], (1, 0))
+        self.assertEqual(sum(total for total, cracked in snapshot['hours'].values()), 2)
+
+
+@patch('gladius.journal', Mock())
+@patch('gladius.potcache', Mock())
+class TestStatsUpdates(unittest.TestCase):
+    def setUp(self):
+        self.patches = [patch('gladius.stats', CrackStats()),
+                        patch('gladius.ntlm_hashes', defaultdict(dict)),
+                        patch('gladius.captures', {})]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_stats_count_users_per_hash(self):
+        gladius.register_hash('a', 'Administrator', source='secretsdump_1')
+        gladius.register_hash('a', 'Administrator', source='secretsdump_1')
+        gladius.register_hash('a', 'Guest', source='secretsdump_2')
+        gladius.mark_cracked('a', 'password')
+        gladius.mark_cracked('a', 'password')
+
+        self.assertEqual(gladius.get_cracked_stats(), '(2/2 100.00%)')
+
+    def test_stats_user_added_to_cracked_hash(self):
+        gladius.register_hash('a', 'Administrator')
+        gladius.mark_cracked('a', 'password')
+        gladius.register_hash('a', 'Guest')
+
+        self.assertEqual(gladius.get_cracked_stats(), '(2/2 100.00%)')
+
+    def test_stats_captures(self):
+        capture = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+        self.assertTrue(gladius.register_capture(capture, '5600'))
+        self.assertFalse(gladius.register_capture(capture.upper(), '5600'))
+        self.assertTrue(gladius.mark_capture_cracked(capture, 'Summer2016'))
+        self.assertFalse(gladius.mark_capture_cracked(capture, 'Summer2016'))
+
+        self.assertEqual(gladius.stats.snapshot()['types'], {'NetNTLMv2': (1, 1)})
+
+    @patch('gladius.success', Mock())
+    @patch('gladius.art', False)
+    def test_deliver_result_once(self):
+        gladius.register_hash('a', 'Administrator')
+        capture = 'bob::CORP:1122334455667788:00112233445566778899aabbccddeeff:0101000000'
+        gladius.register_capture(capture, '5600')
+
+        self.assertTrue(gladius.deliver_result('a', 'password'))
+        self.assertEqual(gladius.deliver_result('a', 'password'), None)
+        self.assertEqual(gladius.deliver_result(capture, 'Summer2016'), 'CORP bob Summer2016')
+        self.assertEqual(gladius.deliver_result(capture, 'Summer2016'), None)
+        self.assertEqual(gladius.get_cracked_stats(), '(2/2 100.00%)')
+
+if __name__ == '__main__':
+    unittest.main()